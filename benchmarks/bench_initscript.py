@@ -0,0 +1,94 @@
+"""Benchmark per-command latency of service(8) versus direct init scripts.
+
+Time ``ServiceCommandRunner.run('status')`` both through service(8) and by
+running the init script directly (``init_script=``).
+
+By default, use a throwaway init script that exits immediately, and a fake
+service(8) that, like the real one, is a shell script that scrubs the
+environment and then runs the init script.  With ``--service NAME``, use the
+real service(8) and the real init script of the installed service *NAME*
+instead; its ``status`` verb must not need privileges.
+
+Usage::
+
+    python benchmarks/bench_initscript.py [-n NUMBER] [--service NAME]
+"""
+
+from argparse import ArgumentParser
+from asyncio import coroutine, get_event_loop
+from contextlib import closing
+import os
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from sig2srv.sig2srv import ServiceCommandRunner, find_init_script
+
+INIT_SCRIPT = """#!/bin/sh
+exit 0
+"""
+
+SERVICE = """#!/bin/sh
+cd /
+name="$1"
+shift
+exec env -i LANG="$LANG" PATH="/usr/sbin:/usr/bin:/sbin:/bin" TERM="$TERM" \\
+    "{init_d}/$name" "$@"
+"""
+
+
+def write_script(path, content):
+    """Write an executable script."""
+    with open(path, 'w') as f:
+        f.write(content)
+    os.chmod(path, 0o755)
+
+
+@coroutine
+def time_runs(runner, number):
+    """Return the per-command seconds of running ``status`` *number* times."""
+    yield from runner.run('status')  # warm up
+    start = perf_counter()
+    for i in range(number):
+        yield from runner.run('status')
+    return (perf_counter() - start) / number
+
+
+def main():
+    """Run the benchmark."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=200,
+                        help="commands per measurement (default: %(default)s)")
+    parser.add_argument('--service', metavar='NAME',
+                        help="benchmark this installed service")
+    args = parser.parse_args()
+    with TemporaryDirectory() as tmpdir, \
+            closing(get_event_loop()) as loop:
+        if args.service is None:
+            name = 'bench'
+            init_d = os.path.join(tmpdir, 'init.d')
+            bin_dir = os.path.join(tmpdir, 'bin')
+            os.mkdir(init_d)
+            os.mkdir(bin_dir)
+            write_script(os.path.join(init_d, name), INIT_SCRIPT)
+            write_script(os.path.join(bin_dir, 'service'),
+                         SERVICE.format(init_d=init_d))
+            os.environ['PATH'] = bin_dir + os.pathsep + os.environ['PATH']
+            init_script = find_init_script(name, [init_d])
+        else:
+            name = args.service
+            init_script = find_init_script(name)
+            if init_script is None:
+                parser.error("no init script found for {}".format(name))
+        via_service = loop.run_until_complete(time_runs(
+            ServiceCommandRunner(name=name, loop=loop), args.number))
+        direct = loop.run_until_complete(time_runs(
+            ServiceCommandRunner(name=name, init_script=init_script,
+                                 loop=loop),
+            args.number))
+    print("service(8):          {:8.3f} ms".format(via_service * 1e3))
+    print("init script:         {:8.3f} ms ({:.0%})"
+          .format(direct * 1e3, direct / via_service))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Benchmark the memory and time cost of log messages and their headers.
+
+Using `tracemalloc`, measure how many bytes each log message, and each log
+record as a whole, keeps allocated while it waits in a queue, e.g. that of
+``--log-queue``.  Compare `BraceMessage` with `PlainBraceMessage`, which
+has an instance dict and formats on every render, as `BraceMessage` used
+to.  Also time the `WithLog._debug()` calls of a `ServiceCommandRunner`
+whose log header is cached against ones whose header is rendered anew for
+every message.  Each record is rendered twice, as if by two handlers.
+
+Usage::
+
+    python benchmarks/bench_log_memory.py [-n NUMBER]
+"""
+
+from argparse import ArgumentParser
+from asyncio import get_event_loop
+from logging import DEBUG, Handler
+from time import perf_counter
+import tracemalloc
+from unittest.mock import patch
+
+from sig2srv.logging import BraceMessage, logger
+from sig2srv.sig2srv import ServiceCommandRunner
+
+
+class PlainBraceMessage(BraceMessage):
+    """A `BraceMessage` with an instance dict, formatting on every render."""
+
+    def __str__(self):
+        """Format the message anew."""
+        return self.fmt.format(*self.poargs, **self.kwargs)
+
+
+class KeepingHandler(Handler):
+    """A handler that renders each record twice and keeps it."""
+
+    def __init__(self):
+        """Initialize this instance."""
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        """Render *record* twice and keep it."""
+        record.getMessage()
+        record.getMessage()
+        self.records.append(record)
+
+
+def measure(fn, number):
+    """Return the retained bytes and seconds per call of *fn*."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        start = perf_counter()
+        kept = [fn(i) for i in range(number)]
+        elapsed = perf_counter() - start
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del kept
+    return retained / number, elapsed / number
+
+
+def render_twice(message):
+    """Render *message* twice, and return it."""
+    str(message)
+    str(message)
+    return message
+
+
+def main():
+    """Run the benchmark."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=100000,
+                        help="messages per measurement (default: %(default)s)")
+    args = parser.parse_args()
+    for cls in BraceMessage, PlainBraceMessage:
+        size, seconds = measure(
+            lambda i: render_twice(cls("{} returned {}", ('status',), i)),
+            args.number)
+        print("message {:17} {:6.0f} B/message {:7.3f} us/message"
+              .format(cls.__name__ + ':', size, seconds * 1e6))
+
+    loop = get_event_loop()
+    runner = ServiceCommandRunner(name='omg', loop=loop)
+    handler = KeepingHandler()
+    logger.addHandler(handler)
+    logger.setLevel(DEBUG)
+    logger.propagate = False
+
+    def log(i):
+        runner._debug("{} returned {}", ('status',), i)
+
+    def log_uncached(i):
+        runner._invalidate_log_header()
+        runner._debug("{} returned {}", ('status',), i)
+
+    for name, cls, fn in [
+            ('cached header:', BraceMessage, log),
+            ('plain message:', PlainBraceMessage, log),
+            ('uncached header:', BraceMessage, log_uncached)]:
+        with patch('sig2srv.logging.BraceMessage', cls):
+            size, seconds = measure(fn, args.number)
+        handler.records.clear()
+        print("record  {:17} {:6.0f} B/record  {:7.3f} us/call"
+              .format(name, size, seconds * 1e6))
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
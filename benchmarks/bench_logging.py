@@ -0,0 +1,57 @@
+"""Microbenchmark for `sig2srv.logging.WithLog`.
+
+Measure the per-call cost of ``_debug()`` while DEBUG is disabled, which is
+the common case for an idle supervisor, against an empty method call, and
+against ``_debug()`` with DEBUG enabled (records go to a `NullHandler`).
+
+Usage::
+
+    python benchmarks/bench_logging.py [-n NUMBER]
+"""
+
+from argparse import ArgumentParser
+from logging import DEBUG, INFO, NullHandler, getLogger
+from timeit import Timer
+
+from sig2srv.logging import WithLog
+
+
+class Subject(WithLog):
+    """A typical `WithLog` user."""
+
+    def noop(self):
+        """Do nothing; the baseline."""
+
+    def log(self):
+        """Log a typical debug message."""
+        self._debug("called at {!r}", 12345.678)
+
+
+def main():
+    """Run the benchmark."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=200000,
+                        help="calls per measurement (default: %(default)s)")
+    args = parser.parse_args()
+    logger = getLogger('sig2srv.bench')
+    logger.propagate = False
+    logger.addHandler(NullHandler())
+    subject = Subject(logger=logger)
+
+    def per_call(stmt):
+        timer = Timer(stmt)
+        return min(timer.repeat(repeat=5, number=args.number)) / args.number
+
+    logger.setLevel(INFO)
+    baseline = per_call(subject.noop)
+    disabled = per_call(subject.log)
+    logger.setLevel(DEBUG)
+    enabled = per_call(subject.log)
+    print("empty method call:   {:8.1f} ns".format(baseline * 1e9))
+    print("_debug(), disabled:  {:8.1f} ns ({:+.1f} ns)"
+          .format(disabled * 1e9, (disabled - baseline) * 1e9))
+    print("_debug(), enabled:   {:8.1f} ns".format(enabled * 1e9))
+
+
+if __name__ == '__main__':
+    main()
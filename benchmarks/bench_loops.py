@@ -0,0 +1,82 @@
+"""Benchmark spawn and timer latency on the asyncio and uvloop event loops.
+
+For each event loop implementation available (see `install_event_loop()`),
+time starting and reaping ``true`` with `asyncio.create_subprocess_exec()`,
+and measure how late the calls of many concurrent `PeriodicCaller`
+instances fire, as recorded in a shared `LogHistogram`.
+
+Usage::
+
+    python benchmarks/bench_loops.py [-n NUMBER] [--callers CALLERS]
+"""
+
+from argparse import ArgumentParser
+from asyncio import coroutine, create_subprocess_exec, sleep
+from contextlib import closing
+from random import Random
+from time import perf_counter
+
+from sig2srv.asynchelper import (EventLoopKind, PeriodicCaller,
+                                 install_event_loop, uvloop_supported)
+from sig2srv.histogram import LogHistogram
+
+
+@coroutine
+def time_spawns(number, loop):
+    """Return the per-command seconds of running ``true`` *number* times."""
+    proc = yield from create_subprocess_exec('true', loop=loop)  # warm up
+    yield from proc.wait()
+    start = perf_counter()
+    for i in range(number):
+        proc = yield from create_subprocess_exec('true', loop=loop)
+        yield from proc.wait()
+    return (perf_counter() - start) / number
+
+
+@coroutine
+def time_ticks(callers, period, duration, loop):
+    """Return the lateness histogram of *callers* periodic callers."""
+    lateness = LogHistogram()
+    rng = Random(0)
+    pcs = [PeriodicCaller(lambda ts: None, period, lateness=lateness,
+                          loop=loop) for i in range(callers)]
+    for pc in pcs:
+        pc.start(at=loop.time() + rng.uniform(0, period))
+    yield from sleep(duration, loop=loop)
+    for pc in pcs:
+        pc.stop()
+    return lateness
+
+
+def main():
+    """Run the benchmark."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=500,
+                        help="commands to spawn (default: %(default)s)")
+    parser.add_argument('--callers', type=int, default=1000,
+                        help="periodic callers (default: %(default)s)")
+    parser.add_argument('--period', type=float, default=0.1,
+                        help="period of each caller (default: %(default)s)")
+    parser.add_argument('--duration', type=float, default=5,
+                        help="seconds to run the callers "
+                             "(default: %(default)s)")
+    args = parser.parse_args()
+    kinds = [EventLoopKind.ASYNCIO]
+    if uvloop_supported():
+        kinds.append(EventLoopKind.UVLOOP)
+    else:
+        print("uvloop is not installed; benchmarking asyncio only")
+    for kind in kinds:
+        with closing(install_event_loop(kind)) as loop:
+            spawn = loop.run_until_complete(time_spawns(args.number, loop))
+            lateness = loop.run_until_complete(time_ticks(
+                args.callers, args.period, args.duration, loop))
+        p50, p99 = lateness.quantiles(0.5, 0.99)
+        print("{:8} spawn {:7.3f} ms, tick lateness {:.3f} ms p50, "
+              "{:.3f} ms p99, {:.3f} ms max ({} ticks)"
+              .format(kind.value + ':', spawn * 1e3, p50 * 1e3, p99 * 1e3,
+                      lateness.max * 1e3, lateness.count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Benchmark spawn latency of fork/exec versus posix_spawn.
+
+Time starting and reaping ``true`` with `asyncio.create_subprocess_exec()`
+and with `sig2srv.spawn.posix_spawn_exec()`, optionally after growing the
+heap of this process to emulate a supervisor of many services.
+
+Requires Python 3.8 or later for `os.posix_spawnp()`.
+
+Usage::
+
+    python benchmarks/bench_spawn.py [-n NUMBER] [--heap-mb MB]
+"""
+
+from argparse import ArgumentParser
+from asyncio import coroutine, create_subprocess_exec, get_event_loop
+from contextlib import closing
+from time import perf_counter
+
+from sig2srv.spawn import posix_spawn_exec, posix_spawn_supported
+
+
+@coroutine
+def time_spawns(launch, number, loop):
+    """Return the per-command seconds of running ``true`` *number* times."""
+    proc = yield from launch('true', loop=loop)  # warm up
+    yield from proc.wait()
+    start = perf_counter()
+    for i in range(number):
+        proc = yield from launch('true', loop=loop)
+        yield from proc.wait()
+    return (perf_counter() - start) / number
+
+
+def main():
+    """Run the benchmark."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=500,
+                        help="commands per measurement (default: %(default)s)")
+    parser.add_argument('--heap-mb', type=int, default=0,
+                        help="grow the heap by this many MiB of small objects "
+                             "first (default: %(default)s)")
+    args = parser.parse_args()
+    if not posix_spawn_supported():
+        parser.error("posix_spawn() is not supported")
+    # Many small objects, so that the pages are actually touched and mapped.
+    heap = [bytearray(1024) for i in range(args.heap_mb * 1024)]
+    with closing(get_event_loop()) as loop:
+        fork = loop.run_until_complete(
+            time_spawns(create_subprocess_exec, args.number, loop))
+        spawn = loop.run_until_complete(
+            time_spawns(posix_spawn_exec, args.number, loop))
+    print("heap grown by:       {:8d} MiB".format(len(heap) // 1024))
+    print("fork/exec:           {:8.3f} ms".format(fork * 1e3))
+    print("posix_spawn:         {:8.3f} ms ({:.0%})"
+          .format(spawn * 1e3, spawn / fork))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Benchmark the Sig2Srv state machine at scale, without forking.
+
+Supervise many services on one event loop, each with its own `Sig2Srv`
+bridge and an in-process `FakeBackend`, all sharing one `SignalFanOut`, and
+report:
+
+* how long it takes for all the bridges to start their services;
+* the CPU time spent per status check, and the rate of status checks, in
+  steady state;
+* the latency, from sending SIGHUP, until each bridge has restarted its
+  service;
+* how long it takes for all the bridges to stop upon SIGTERM.
+
+Usage::
+
+    python benchmarks/bench_statemachine.py [-n SERVICES] [--latency SECONDS]
+"""
+
+from argparse import ArgumentParser
+from asyncio import coroutine, gather, get_event_loop, sleep
+from contextlib import closing
+import os
+from signal import SIGHUP, SIGTERM
+from time import perf_counter, process_time
+
+from sig2srv.asynchelper import SignalFanOut
+from sig2srv.fake import FakeBackend
+from sig2srv.sig2srv import Sig2Srv
+
+
+class TimedBackend(FakeBackend):
+    """A `FakeBackend` that notes when each verb last completed."""
+
+    def __init__(self, *poargs, **kwargs):
+        """Initialize this instance."""
+        super().__init__(*poargs, **kwargs)
+        self.completed = {}
+
+    @coroutine
+    def run(self, *args):
+        """Run the command and note when it completed."""
+        result = yield from super().run(*args)
+        self.completed[args[0]] = perf_counter()
+        return result
+
+
+def quantiles(values):
+    """Return the median, 99th percentile, and maximum of *values*."""
+    values = sorted(values)
+    return (values[len(values) // 2],
+            values[min(len(values) - 1, int(len(values) * 0.99))],
+            values[-1])
+
+
+@coroutine
+def wait_for_all(backends, verb, after, loop):
+    """Wait until every backend has completed *verb* after *after*."""
+    while any(backend.completed.get(verb, 0) < after
+              for backend in backends):
+        yield from sleep(0.01, loop=loop)
+
+
+@coroutine
+def run(args, loop):
+    """Run all phases of the benchmark, printing the results."""
+    signals = SignalFanOut(loop=loop)
+    backends = [TimedBackend(name='svc{}'.format(i), latency=args.latency,
+                             jitter=args.jitter, seed=i, loop=loop)
+                for i in range(args.services)]
+    bridges = [Sig2Srv(runner=backend, signals=signals,
+                       status_period=args.status_period, status_spread=True)
+               for backend in backends]
+    start = perf_counter()
+    tasks = gather(*(bridge.run() for bridge in bridges), loop=loop)
+    yield from wait_for_all(backends, 'start', start, loop)
+    print("start all:    {:8.3f} s".format(perf_counter() - start))
+
+    checks = sum(backend.counts['status'] for backend in backends)
+    cpu, wall = process_time(), perf_counter()
+    yield from sleep(args.duration, loop=loop)
+    cpu, wall = process_time() - cpu, perf_counter() - wall
+    checks = sum(backend.counts['status'] for backend in backends) - checks
+    print("steady state: {:8.3f} us CPU/check, {:.0f} checks/s, {:.1%} CPU"
+          .format(cpu / checks * 1e6, checks / wall, cpu / wall))
+
+    sent = perf_counter()
+    os.kill(os.getpid(), SIGHUP)
+    yield from wait_for_all(backends, 'start', sent, loop)
+    p50, p99, worst = quantiles([backend.completed['start'] - sent
+                                 for backend in backends])
+    print("SIGHUP:       {:8.3f} ms p50, {:.3f} ms p99, {:.3f} ms max"
+          .format(p50 * 1e3, p99 * 1e3, worst * 1e3))
+
+    sent = perf_counter()
+    os.kill(os.getpid(), SIGTERM)
+    yield from tasks
+    print("stop all:     {:8.3f} s".format(perf_counter() - sent))
+
+
+def main():
+    """Run the benchmark."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--services', type=int, default=1000,
+                        help="number of services (default: %(default)s)")
+    parser.add_argument('--latency', type=float, default=0.001,
+                        help="seconds each fake command takes "
+                             "(default: %(default)s)")
+    parser.add_argument('--jitter', type=float, default=0.001,
+                        help="random extra seconds per fake command "
+                             "(default: %(default)s)")
+    parser.add_argument('--status-period', type=float, default=1,
+                        help="status period (default: %(default)s)")
+    parser.add_argument('--duration', type=float, default=5,
+                        help="seconds of steady state (default: %(default)s)")
+    args = parser.parse_args()
+    with closing(get_event_loop()) as loop:
+        loop.run_until_complete(run(args, loop))
+
+
+if __name__ == '__main__':
+    main()
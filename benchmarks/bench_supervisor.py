@@ -0,0 +1,332 @@
+"""Benchmark signal-to-command latency and supervisor overhead.
+
+Run sig2srv against a fake service(8) on ``PATH`` that exits immediately,
+and measure:
+
+* ``signal_latency``: the time from sending SIGHUP/SIGTERM to this process
+  to the launch of the first resulting command (``dispatch``), and to the
+  return of the launcher, by which time the command has been exec'd
+  (``exec``);
+* ``status_check``: the wall-clock time and CPU time, of sig2srv and of
+  its children, per status command, both forking a command each and through
+  the shell coprocess;
+* ``rss``: the steady-state resident set size of the sig2srv command-line
+  utility supervising one service and *SERVICES* services, and the
+  difference per additional service;
+* ``memory``: the Python memory, traced with `tracemalloc`, that each
+  additional service keeps allocated once running, checked against
+  ``--max-memory-per-service``;
+* ``tick_jitter``: how late `PeriodicCaller` calls fire on a real event
+  loop, as recorded in a `LogHistogram`.
+
+Print the results as JSON, so that releases can be compared.  Times are in
+milliseconds and sizes in KiB.  Exit with status 1 if a check fails.
+
+Usage::
+
+    python benchmarks/bench_supervisor.py [-o FILE] [BENCHMARK ...]
+"""
+
+from argparse import ArgumentParser
+from asyncio import (Future, coroutine, create_subprocess_exec, gather,
+                     get_event_loop, sleep)
+from contextlib import closing
+from datetime import datetime, timezone
+import json
+import os
+import platform
+from signal import SIGHUP, SIGTERM
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+import time
+from time import perf_counter
+import tracemalloc
+
+import sig2srv
+from sig2srv.asynchelper import PeriodicCaller, SignalFanOut
+from sig2srv.histogram import LogHistogram
+from sig2srv.sig2srv import Sig2Srv, ServiceCommandRunner
+
+NAME = 'bench'
+
+SERVICE = """#!/bin/sh
+exit 0
+"""
+
+BENCHMARKS = ('signal_latency', 'status_check', 'rss', 'memory',
+              'tick_jitter')
+
+
+def summarize(values):
+    """Return summary statistics of *values*, in milliseconds."""
+    values = sorted(value * 1e3 for value in values)
+
+    def pick(q):
+        return values[max(1, int(q * len(values) + 0.5)) - 1]
+
+    return dict(n=len(values), min=values[0], p50=pick(0.5), p90=pick(0.9),
+                p99=pick(0.99), max=values[-1],
+                mean=sum(values) / len(values))
+
+
+def summarize_histogram(histogram):
+    """Return summary statistics of *histogram*, in milliseconds."""
+    p50, p90, p99 = histogram.quantiles(0.5, 0.9, 0.99)
+    return dict(n=histogram.count, min=histogram.min * 1e3, p50=p50 * 1e3,
+                p90=p90 * 1e3, p99=p99 * 1e3, max=histogram.max * 1e3,
+                mean=histogram.mean * 1e3)
+
+
+@coroutine
+def wait_until_idle(sig2srv, loop, settle):
+    """Wait for *sig2srv* to be running, and for its commands to finish."""
+    while sig2srv.state != Sig2Srv.State.RUNNING:
+        yield from sleep(0.001, loop=loop)
+    yield from sleep(settle, loop=loop)
+
+
+@coroutine
+def signal_latency(loop, number, settle):
+    """Measure signal-to-command latency."""
+    launched = None
+
+    @coroutine
+    def launcher(*cmd, **kwargs):
+        called = perf_counter()
+        proc = yield from create_subprocess_exec(*cmd, **kwargs)
+        if launched is not None and not launched.done():
+            launched.set_result((called, perf_counter()))
+        return proc
+
+    runner = ServiceCommandRunner(name=NAME, launcher=launcher, loop=loop)
+    bridge = Sig2Srv(runner=runner, status_period=3600)
+    results = {}
+    for signum, name in ((SIGHUP, 'SIGHUP'), (SIGTERM, 'SIGTERM')):
+        dispatch, exec_ = [], []
+        task = None
+        for i in range(number):
+            if task is None:
+                task = loop.create_task(bridge.run())
+            yield from wait_until_idle(bridge, loop, settle)
+            launched = Future(loop=loop)
+            sent = perf_counter()
+            os.kill(os.getpid(), signum)
+            called, returned = yield from launched
+            dispatch.append(called - sent)
+            exec_.append(returned - sent)
+            if signum == SIGTERM:
+                yield from task
+                task = None
+        if task is not None:
+            yield from wait_until_idle(bridge, loop, settle)
+            os.kill(os.getpid(), SIGTERM)
+            yield from task
+        results[name] = dict(dispatch=summarize(dispatch),
+                             exec=summarize(exec_))
+    yield from runner.close()
+    return results
+
+
+@coroutine
+def status_check(loop, number):
+    """Measure the wall-clock and CPU cost of status commands."""
+    results = {}
+    for mode, coprocess in (('fork_exec', False), ('coprocess', True)):
+        latencies = {}
+        runner = ServiceCommandRunner(name=NAME, coprocess=coprocess,
+                                      latencies=latencies, loop=loop)
+        yield from runner.run('status')  # warm up
+        before = os.times()
+        start = perf_counter()
+        for i in range(number):
+            yield from runner.run('status')
+        wall = perf_counter() - start
+        yield from runner.close()
+        after = os.times()
+        results[mode] = dict(
+            wall=wall / number * 1e3,
+            cpu_self=((after.user - before.user) +
+                      (after.system - before.system)) / number * 1e3,
+            cpu_children=((after.children_user - before.children_user) +
+                          (after.children_system - before.children_system)) /
+            number * 1e3,
+            latency=summarize_histogram(latencies['status']))
+    return results
+
+
+def read_rss(pid):
+    """Return the resident set size of process *pid*, in KiB."""
+    with open('/proc/{}/status'.format(pid)) as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    raise ValueError("no VmRSS for process {}".format(pid))
+
+
+def cli_rss(services, settle):
+    """Return the steady-state RSS of the CLI supervising *services*."""
+    names = ['{}{}'.format(NAME, i) for i in range(services)]
+    env = dict(os.environ)
+    top = os.path.dirname(os.path.dirname(os.path.abspath(sig2srv.__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [top, env.get('PYTHONPATH')]))
+    proc = subprocess.Popen([sys.executable, '-m', 'sig2srv.cli',
+                             '--via-service', '--status-period', '1'] + names,
+                            env=env)
+    try:
+        time.sleep(settle)
+        return read_rss(proc.pid)
+    finally:
+        proc.send_signal(SIGTERM)
+        proc.wait()
+
+
+def rss(services, settle):
+    """Measure the steady-state RSS per supervised service."""
+    if not os.path.exists('/proc/self/status'):
+        return None
+    one = cli_rss(1, settle)
+    many = cli_rss(services, settle)
+    return dict(one_service=one, services=services, many_services=many,
+                per_service=(many - one) / (services - 1))
+
+
+@coroutine
+def run_bridges(services, loop, settle):
+    """Run *services* bridges, as the CLI does, until they are idle.
+
+    :return: the bridges, and the `gather()` of their runs.
+    """
+    signals = SignalFanOut(loop=loop)
+    bridges = [Sig2Srv(runner=ServiceCommandRunner(name='{}{}'.format(NAME, i),
+                                                   loop=loop),
+                       signals=signals, status_period=3600)
+               for i in range(services)]
+    tasks = gather(*(bridge.run() for bridge in bridges), loop=loop)
+    for bridge in bridges:
+        yield from wait_until_idle(bridge, loop, 0)
+    yield from sleep(settle, loop=loop)
+    return bridges, tasks
+
+
+@coroutine
+def stop_bridges(bridges, tasks, loop):
+    """Stop the bridges started by `run_bridges()`."""
+    os.kill(os.getpid(), SIGTERM)
+    yield from tasks
+    for bridge in bridges:
+        yield from bridge.runner.close()
+
+
+@coroutine
+def memory(loop, services, settle, budget):
+    """Measure the traced memory kept per running service."""
+    tracemalloc.start()
+    try:
+        # Warm up, so that one-time allocations do not count.
+        bridges, tasks = yield from run_bridges(1, loop, settle)
+        yield from stop_bridges(bridges, tasks, loop)
+        before = tracemalloc.get_traced_memory()[0]
+        bridges, tasks = yield from run_bridges(services, loop, settle)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    yield from stop_bridges(bridges, tasks, loop)
+    per_service = (after - before) / services / 1024
+    return dict(services=services, per_service=per_service,
+                max_per_service=budget, ok=per_service <= budget)
+
+
+@coroutine
+def tick_jitter(loop, period, duration):
+    """Measure how late `PeriodicCaller` calls fire."""
+    lateness = LogHistogram()
+    caller = PeriodicCaller(lambda ts: None, period, lateness=lateness,
+                            loop=loop)
+    caller.start()
+    yield from sleep(duration, loop=loop)
+    caller.stop()
+    return dict(period=period * 1e3, lateness=summarize_histogram(lateness))
+
+
+def main():
+    """Run the benchmark."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('benchmarks', metavar='BENCHMARK', nargs='*',
+                        help="benchmarks to run: {} (default: all)"
+                             .format(', '.join(BENCHMARKS)))
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help="write JSON results to FILE instead of stdout")
+    parser.add_argument('-n', '--signals', type=int, default=50,
+                        help="signals of each kind to send "
+                             "(default: %(default)s)")
+    parser.add_argument('--checks', type=int, default=500,
+                        help="status commands to run (default: %(default)s)")
+    parser.add_argument('--services', type=int, default=20,
+                        help="services to supervise for rss "
+                             "(default: %(default)s)")
+    parser.add_argument('--settle', type=float, default=0.1,
+                        help="seconds to let sig2srv settle before each "
+                             "signal (default: %(default)s)")
+    parser.add_argument('--rss-settle', type=float, default=3,
+                        help="seconds to let the CLI run before measuring "
+                             "rss (default: %(default)s)")
+    parser.add_argument('--max-memory-per-service', metavar='KIB',
+                        type=float, default=24,
+                        help="fail if each service keeps more traced memory "
+                             "than this (default: %(default)s)")
+    parser.add_argument('--period', type=float, default=0.01,
+                        help="tick_jitter period (default: %(default)s)")
+    parser.add_argument('--duration', type=float, default=5,
+                        help="seconds to run tick_jitter "
+                             "(default: %(default)s)")
+    args = parser.parse_args()
+    if args.services < 2:
+        parser.error("--services must be at least 2")
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark {!r}".format(name))
+    selected = args.benchmarks or BENCHMARKS
+    results = {}
+    with TemporaryDirectory() as tmpdir, \
+            closing(get_event_loop()) as loop:
+        path = os.path.join(tmpdir, 'service')
+        with open(path, 'w') as f:
+            f.write(SERVICE)
+        os.chmod(path, 0o755)
+        os.environ['PATH'] = tmpdir + os.pathsep + os.environ['PATH']
+        if 'signal_latency' in selected:
+            results['signal_latency'] = loop.run_until_complete(
+                signal_latency(loop, args.signals, args.settle))
+        if 'status_check' in selected:
+            results['status_check'] = loop.run_until_complete(
+                status_check(loop, args.checks))
+        if 'rss' in selected:
+            results['rss'] = rss(args.services, args.rss_settle)
+        if 'memory' in selected:
+            results['memory'] = loop.run_until_complete(
+                memory(loop, args.services, args.settle,
+                       args.max_memory_per_service))
+        if 'tick_jitter' in selected:
+            results['tick_jitter'] = loop.run_until_complete(
+                tick_jitter(loop, args.period, args.duration))
+    report = dict(
+        sig2srv=sig2srv.__version__,
+        python=platform.python_version(),
+        implementation=platform.python_implementation(),
+        platform=platform.platform(),
+        time=datetime.now(timezone.utc).isoformat(),
+        results=results)
+    text = json.dumps(report, indent=2, sort_keys=True) + '\n'
+    if args.output is None:
+        sys.stdout.write(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    if not results.get('memory', dict(ok=True))['ok']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
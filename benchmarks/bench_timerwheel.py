@@ -0,0 +1,99 @@
+"""Benchmark scheduling overhead of many `PeriodicCaller` instances.
+
+Run many `PeriodicCaller` instances with a trivial callback for a stretch of
+virtual time, scheduling their timers either directly with the event loop or
+with a shared `TimerWheel`, and report the wall-clock time spent per call.
+
+The event loop runs on a virtual clock that jumps straight to the next
+timer instead of sleeping, so that the measurement is all scheduling
+overhead.
+
+Usage::
+
+    python benchmarks/bench_timerwheel.py [-n CALLERS] [--duration SECONDS]
+"""
+
+from argparse import ArgumentParser
+from asyncio import SelectorEventLoop, sleep
+from contextlib import closing
+from random import Random
+from selectors import DefaultSelector
+from time import perf_counter
+
+from sig2srv.asynchelper import PeriodicCaller, TimerWheel
+
+
+class VirtualClockSelector(DefaultSelector):
+    """A selector that advances a virtual clock instead of blocking."""
+
+    def __init__(self):
+        """Initialize this instance."""
+        super().__init__()
+        self.now = 0.0
+
+    def select(self, timeout=None):
+        """Advance the clock by *timeout* and poll without blocking."""
+        if timeout is not None and timeout > 0:
+            self.now += timeout
+        return super().select(0)
+
+
+class VirtualTimeLoop(SelectorEventLoop):
+    """An event loop that runs on the virtual clock of its selector."""
+
+    def __init__(self):
+        """Initialize this instance."""
+        super().__init__(selector=VirtualClockSelector())
+
+    def time(self):
+        """Return the virtual time."""
+        return self._selector.now
+
+
+def run(callers, period, duration, wheel_resolution):
+    """Return (wall seconds, number of calls) for one configuration."""
+    calls = 0
+
+    def cb(ts):
+        nonlocal calls
+        calls += 1
+
+    rng = Random(0)
+    with closing(VirtualTimeLoop()) as loop:
+        scheduler = None
+        if wheel_resolution:
+            scheduler = TimerWheel(resolution=wheel_resolution, loop=loop)
+        pcs = [PeriodicCaller(cb, period, scheduler=scheduler, loop=loop)
+               for i in range(callers)]
+        for pc in pcs:
+            pc.start(at=rng.uniform(0, period))
+        start = perf_counter()
+        loop.run_until_complete(sleep(duration, loop=loop))
+        elapsed = perf_counter() - start
+        for pc in pcs:
+            pc.stop()
+    return elapsed, calls
+
+
+def main():
+    """Run the benchmark."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--callers', type=int, default=10000,
+                        help="number of callers (default: %(default)s)")
+    parser.add_argument('--period', type=float, default=5,
+                        help="period of each caller (default: %(default)s)")
+    parser.add_argument('--duration', type=float, default=60,
+                        help="virtual seconds to run (default: %(default)s)")
+    parser.add_argument('--resolution', type=float, default=0.1,
+                        help="timer wheel resolution (default: %(default)s)")
+    args = parser.parse_args()
+    for name, resolution in (('event loop', None),
+                             ('timer wheel', args.resolution)):
+        elapsed, calls = run(args.callers, args.period, args.duration,
+                             resolution)
+        print("{:12} {:8.3f} s for {} calls, {:6.2f} us/call"
+              .format(name + ':', elapsed, calls, elapsed / calls * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -38,6 +38,9 @@ setup(
     packages=find_packages(include=['sig2srv']),
     include_package_data=True,
     install_requires=requirements,
+    extras_require={
+        'uvloop': ['uvloop'],
+    },
     license="MIT license",
     zip_safe=False,
     keywords='sig2srv',
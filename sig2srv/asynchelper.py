@@ -1,7 +1,19 @@
 """`asyncio` utilities."""
 
-from asyncio import AbstractEventLoop, coroutine, get_event_loop, iscoroutine
+from asyncio import (AbstractEventLoop, CancelledError, DefaultEventLoopPolicy,
+                     Future, TimeoutError, coroutine, get_event_loop,
+                     iscoroutine, set_event_loop_policy, shield, wait_for)
+from collections import OrderedDict
 from contextlib import contextmanager
+from enum import Enum
+from errno import ENOSYS
+from heapq import heappop, heappush
+from itertools import count
+from math import ceil, floor
+import os
+from random import uniform
+from signal import SIGKILL, SIGTERM
+from zlib import crc32
 
 from ctorrepr import CtorRepr
 
@@ -36,6 +48,237 @@ class WithEventLoop(WithLog, CtorRepr):
         return self.__loop
 
 
+class EventLoopKind(Enum):
+    """Event loop implementations that `install_event_loop()` can create."""
+
+    ASYNCIO = 'asyncio'
+    """The stock `asyncio` event loop."""
+
+    UVLOOP = 'uvloop'
+    """The libuv-based event loop of the optional ``uvloop`` package.
+
+    Faster at spawning processes and at timers, but without the child
+    watcher API of `asyncio`, which `~sig2srv.spawn.posix_spawn_exec()`
+    needs.
+    """
+
+
+def uvloop_supported():
+    """Return whether the optional ``uvloop`` package is installed."""
+    try:
+        import uvloop  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def install_event_loop(kind=None):
+    """Install a new event loop as the current one, and return it.
+
+    Also install the matching event loop policy, so that everything that
+    defaults to `asyncio.get_event_loop()`, such as `WithEventLoop`, shares
+    the new loop.
+
+    :param kind: `EventLoopKind`, or its value; defaults to
+        `EventLoopKind.UVLOOP` if `uvloop_supported()`, and to
+        `EventLoopKind.ASYNCIO` otherwise.
+    :raise `ImportError`: if *kind* is `EventLoopKind.UVLOOP` but
+        ``uvloop`` is not installed.
+    """
+    if kind is None:
+        kind = (EventLoopKind.UVLOOP if uvloop_supported() else
+                EventLoopKind.ASYNCIO)
+    kind = EventLoopKind(kind)
+    if kind == EventLoopKind.UVLOOP:
+        import uvloop
+        policy = uvloop.EventLoopPolicy()
+    else:
+        policy = DefaultEventLoopPolicy()
+    set_event_loop_policy(policy)
+    loop = policy.new_event_loop()
+    policy.set_event_loop(loop)
+    logger.debug("installed %s event loop %r", kind.value, loop)
+    return loop
+
+
+class WheelTimer:
+    """A timer scheduled with a `TimerWheel`.
+
+    Compatible with the `asyncio.TimerHandle` methods used by sig2srv.
+    """
+
+    __slots__ = ('_bucket', '_when', '_callback', '_args')
+
+    def __init__(self, bucket, when, callback, args):
+        """Initialize this instance."""
+        self._bucket = bucket
+        self._when = when
+        self._callback = callback
+        self._args = args
+
+    def when(self):
+        """Return the requested (not the rounded) time of this timer."""
+        return self._when
+
+    def cancelled(self):
+        """Return whether this timer has been cancelled."""
+        return self._callback is None
+
+    def cancel(self):
+        """Cancel this timer.  Do nothing if already cancelled or fired."""
+        if self._callback is None:
+            return
+        self._callback = self._args = None
+        self._bucket._remove(self)
+
+
+class _Bucket:
+    __slots__ = ('wheel', 'index', 'timers', 'handle')
+
+    def __init__(self, wheel, index):
+        self.wheel = wheel
+        self.index = index
+        self.timers = OrderedDict()  # used as an ordered set
+        self.handle = None
+
+    def _remove(self, timer):
+        self.timers.pop(timer, None)  # gone if this bucket is firing
+        if not self.timers:
+            self.wheel._discard(self)
+
+
+class TimerWheel(WithEventLoop, WithLog, CtorRepr):
+    """A shared timer that schedules one loop timer per time bucket.
+
+    Round each timer up to the next multiple of *resolution*, and group all
+    timers rounded to the same time into one bucket, backed by one event loop
+    timer.  Adding and cancelling a timer are O(1), and the event loop timer
+    heap holds only one entry per bucket instead of one per timer, which
+    matters with thousands of `PeriodicCaller` instances sharing one event
+    loop (see its *scheduler* argument).
+
+    Run timers in the same bucket in the order in which they were added.
+
+    :param `float` resolution: width of a bucket in seconds; timers fire up
+        to this much later than requested.
+    :param `AbstractEventLoop` loop: optional event loop in which to
+        schedule bucket timers.
+    """
+
+    def __init__(self, *poargs, resolution=0.1, **kwargs):
+        """Initialize this instance."""
+        super().__init__(*poargs, **kwargs)
+        assert resolution > 0
+        self.__resolution = float(resolution)
+        self.__buckets = {}
+
+    def _collect_repr_args(self, poargs, kwargs):
+        super()._collect_repr_args(poargs, kwargs)
+        kwargs.update(resolution=self.__resolution)
+
+    @property
+    def resolution(self):
+        """Return the width of a bucket in seconds."""
+        return self.__resolution
+
+    def __len__(self):
+        """Return the number of pending timers."""
+        return sum(len(bucket.timers) for bucket in self.__buckets.values())
+
+    def time(self):
+        """Return the current time of the event loop."""
+        return self.loop.time()
+
+    def call_at(self, when, callback, *args):
+        """Schedule *callback* to be called with *args* at loop time *when*.
+
+        Like `AbstractEventLoop.call_at()`, except that the call happens when
+        the bucket of *when* fires, up to one resolution late.
+
+        :return: a handle with a ``cancel()`` method.
+        :rtype: `WheelTimer`
+        """
+        index = int(ceil(when / self.__resolution))
+        bucket = self.__buckets.get(index)
+        if bucket is None:
+            bucket = self.__buckets[index] = _Bucket(self, index)
+            bucket.handle = self.loop.call_at(index * self.__resolution,
+                                              self.__fire, bucket)
+        timer = WheelTimer(bucket, when, callback, args)
+        bucket.timers[timer] = None
+        return timer
+
+    def _discard(self, bucket):
+        if self.__buckets.get(bucket.index) is bucket:
+            del self.__buckets[bucket.index]
+            bucket.handle.cancel()
+
+    def __fire(self, bucket):
+        del self.__buckets[bucket.index]
+        timers, bucket.timers = bucket.timers, OrderedDict()
+        for timer in timers:
+            callback, args = timer._callback, timer._args
+            if callback is None:
+                continue  # cancelled by an earlier callback in this bucket
+            timer._callback = timer._args = None
+            try:
+                callback(*args)
+            except Exception as e:
+                self.loop.call_exception_handler({
+                    'message': 'Exception in timer wheel callback',
+                    'exception': e,
+                    'handle': timer,
+                })
+
+
+def stable_phase(key, period):
+    """Return a phase offset for periodic calls derived from a key.
+
+    Unlike `hash()`, the result is the same across processes and restarts,
+    so that e.g. supervisors of different services started at the same time
+    spread their periodic calls over the period in a repeatable way.
+
+    :param `str` key: key, such as a service name.
+    :param `float` period: period, in seconds.
+    :return: an offset in ``[0, period)``, in seconds.
+    """
+    return crc32(key.encode()) / 2 ** 32 * period
+
+
+class MissedTickPolicy(Enum):
+    """What `PeriodicCaller` does about calls missed during a stall.
+
+    A stall is when the next call turns out to be already overdue by one or
+    more whole periods at the time it is scheduled, e.g. because the event
+    loop was blocked, the process was stopped, or the host was suspended.
+    """
+
+    CATCH_UP = 'catch_up'
+    """Make all the missed calls, back to back."""
+
+    SKIP = 'skip'
+    """Drop all the missed calls, and resume at the next future slot."""
+
+    COALESCE = 'coalesce'
+    """Make one call right away for all the missed calls."""
+
+
+class OverflowPolicy(Enum):
+    """What `PeriodicCaller` does when too many background calls run."""
+
+    SKIP = 'skip'
+    """Skip the new call."""
+
+    QUEUE_ONE = 'queue_one'
+    """Defer the new call until a running one finishes.
+
+    Keep at most one deferred call, the latest one, and skip earlier ones.
+    """
+
+    CANCEL_OLDEST = 'cancel_oldest'
+    """Cancel the oldest running call to make room for the new call."""
+
+
 class PeriodicCaller(WithEventLoop, WithLog, CtorRepr):
     """A facility to run a callback periodically.
 
@@ -49,13 +292,38 @@ class PeriodicCaller(WithEventLoop, WithLog, CtorRepr):
         with any exception raised by the callback (see class description).
     :param `AbstractEventLoop` loop: optional event loop in which to
         schedule periodic timers and calls.
+    :param scheduler: optional `TimerWheel`, shared among many instances, in
+        which to schedule periodic timers instead of the event loop.
+    :param `MissedTickPolicy` missed: what to do about calls missed during a
+        stall (see `MissedTickPolicy`); also accepts the policy values, such
+        as ``'skip'``.
+    :param `float` phase: optional phase offset, in seconds, such as one
+        returned by `stable_phase()` (see class description).
+    :param `float` jitter: optional bound of a random delay, in seconds, to
+        add to each call (see class description).
+    :param `int` max_inflight: optional limit of background calls running at
+        the same time (see class description).
+    :param `OverflowPolicy` overflow: what to do with a call that would
+        exceed *max_inflight*; also accepts the policy values, such as
+        ``'queue_one'``.
+    :param `~sig2srv.histogram.LogHistogram` lateness: optional histogram in
+        which to record how late each call fires (see class description).
 
     With a period *P* and start time *S* schedule each call at *S*, *S* + *P*,
     *S* + 2 * *P*, *S* + 3 * *P* and so on.  (The start time *S* is given as
-    the *at* argument to the `start()` method.)
+    the *at* argument to the `start()` method.)  If *at* is not given and
+    *phase* is, use the first *S* after now such that *S* - *phase* is a
+    multiple of *P*, so that instances with different phases call at
+    different offsets within the period no matter when they were started.
+
+    Delay each actual call by a random amount up to *jitter*, without
+    shifting the schedule.
 
     Schedule calls even if their start time is in the past.  Typical event
-    loops will schedule such calls for immediate execution.
+    loops will schedule such calls for immediate execution.  If one or more
+    whole periods have passed by the time the next call is scheduled, handle
+    the missed calls according to *missed*, and count the dropped ones in
+    `missed_ticks`.
 
     Call the callback with the scheduled start timestamp for the call.
 
@@ -80,6 +348,16 @@ class PeriodicCaller(WithEventLoop, WithLog, CtorRepr):
 
         pc = PeriodicCaller(callback, 60, on_exc=lambda e: pc.stop())
 
+    If *max_inflight* is given, limit the number of background tasks running
+    at the same time, handling extra calls according to *overflow*, and
+    count them in `skipped_ticks` and `cancelled_ticks`.  Count calls
+    started while other background calls are still running in
+    `overlapping_ticks`, whether or not *max_inflight* is given.
+
+    If *lateness* is given, record in it the delay between the time each
+    call was due (jitter included) and the time it actually fired.  One
+    histogram may be shared among many instances.
+
     Ignore *on_ret* and *on_exc* for background callbacks.  Return values and
     exceptions from background callbacks can be collected by a callable *bg* as
     noted above.
@@ -89,24 +367,83 @@ class PeriodicCaller(WithEventLoop, WithLog, CtorRepr):
     """
 
     def __init__(self, cb, period, *poargs,
-                 bg=False, on_ret=None, on_exc=None, **kwargs):
+                 bg=False, on_ret=None, on_exc=None, scheduler=None,
+                 missed=MissedTickPolicy.CATCH_UP, phase=None, jitter=0,
+                 max_inflight=None, overflow=OverflowPolicy.SKIP,
+                 lateness=None, **kwargs):
         """Initialize this instance."""
         assert callable(cb)
         assert on_ret is None or callable(on_ret)
         assert on_exc is None or callable(on_exc)
+        assert jitter >= 0
+        assert max_inflight is None or max_inflight >= 1
         super().__init__(*poargs, **kwargs)
         self.__cb = cb
         self.__period = float(period)
         self.__bg = bg if callable(bg) else bool(bg)
         self.__on_ret = on_ret
         self.__on_exc = on_exc
+        self.__scheduler = scheduler
+        self.__missed = MissedTickPolicy(missed)
+        self.__missed_ticks = 0
+        self.__phase = None if phase is None else float(phase)
+        self.__jitter = float(jitter)
+        self.__max_inflight = max_inflight
+        self.__overflow = OverflowPolicy(overflow)
+        self.__inflight = OrderedDict()  # used as an ordered set
+        self.__queued = None
+        self.__skipped_ticks = 0
+        self.__cancelled_ticks = 0
+        self.__overlapping_ticks = 0
+        self.__lateness = lateness
+        self.__due = None
         self.__next = None
         self.__pending = None
+        self.__calling = False
 
     def _collect_repr_args(self, poargs, kwargs):
         super()._collect_repr_args(poargs, kwargs)
         poargs[:0] = self.__cb, self.__period
-        kwargs.update(bg=self.__bg, on_ret=self.__on_ret, on_exc=self.__on_exc)
+        kwargs.update(bg=self.__bg, on_ret=self.__on_ret, on_exc=self.__on_exc,
+                      scheduler=self.__scheduler, missed=self.__missed,
+                      phase=self.__phase, jitter=self.__jitter,
+                      max_inflight=self.__max_inflight,
+                      overflow=self.__overflow, lateness=self.__lateness)
+
+    @property
+    def period(self):
+        """Return the period given at the creation time, in seconds."""
+        return self.__period
+
+    @property
+    def missed_ticks(self):
+        """Return the number of calls dropped so far due to stalls."""
+        return self.__missed_ticks
+
+    @property
+    def inflight(self):
+        """Return the number of background calls currently running."""
+        return len(self.__inflight)
+
+    @property
+    def skipped_ticks(self):
+        """Return the number of calls skipped so far due to *max_inflight*."""
+        return self.__skipped_ticks
+
+    @property
+    def cancelled_ticks(self):
+        """Return the number of background calls cancelled so far."""
+        return self.__cancelled_ticks
+
+    @property
+    def overlapping_ticks(self):
+        """Return the number of calls that overlapped running ones so far."""
+        return self.__overlapping_ticks
+
+    @property
+    def lateness(self):
+        """Return the histogram of call lateness, or `None` if not kept."""
+        return self.__lateness
 
     def start(self, at=None):
         """Start periodic calls.
@@ -115,17 +452,21 @@ class PeriodicCaller(WithEventLoop, WithLog, CtorRepr):
 
         :param `float` at: timestamp at which to start the first call, using
             the same time reference as `AbstractEventLoop.time()`.  If not
-            given or `None`, start the first call after a full period from now.
+            given or `None`, start the first call after a full period from
+            now, or at the next slot of the phase if one was given.
         """
         if self.__next is not None:
             self._debug("already started")
             return
-        if at is None:
+        if at is None and self.__phase is None:
             self.__next = self.loop.time() + self.__period
+        elif at is None:
+            slots = floor((self.loop.time() - self.__phase) / self.__period)
+            self.__next = self.__phase + (slots + 1) * self.__period
         else:
             self.__next = at
         self._debug("next call at {!r}", self.__next)
-        self.__pending = self.loop.call_at(self.__next, self.__handle_expire)
+        self.__pending = self.__call_at(self.__next)
 
     def stop(self):
         """Stop the ongoing periodic calls.
@@ -138,35 +479,111 @@ class PeriodicCaller(WithEventLoop, WithLog, CtorRepr):
         self.__pending.cancel()
         self.__pending = None
         self.__next = None
+        self.__calling = False
+        self.__queued = None
         self._debug("stopped")
 
+    def __call_at(self, when):
+        scheduler = self.loop if self.__scheduler is None else self.__scheduler
+        if self.__jitter:
+            when += uniform(0, self.__jitter)
+        self.__due = when
+        return scheduler.call_at(when, self.__handle_expire)
+
+    def _interval(self):
+        """Return the interval from the last call to the next call.
+
+        Called once after each call.  Subclasses may override this in order
+        to vary the interval between calls; the default is the period.
+        """
+        return self.__period
+
+    def _advance_to(self, at):
+        """Bring the next call forward to *at*, if it is scheduled later.
+
+        Do nothing if periodic calls have not been started, or while the
+        callback is being called.
+        """
+        if self.__next is None or self.__calling or at >= self.__next:
+            return
+        self.__pending.cancel()
+        self.__next = at
+        self.__pending = self.__call_at(self.__next)
+        self._debug("next call brought forward to {!r}", self.__next)
+
     def __handle_expire(self):
+        self._debug("called at {!r}", self.__next)
+        if self.__lateness is not None:
+            self.__lateness.record(self.loop.time() - self.__due)
+        if self.__overflows():
+            self.__schedule_next()
+            return
+        self.__calling = True
+        if not self.__call(self.__next):
+            self.__schedule_next()
+
+    def __call(self, timestamp):
+        # Return whether a foreground task was created, which will schedule
+        # the next call upon its completion.
         # Do not use asyncio.iscoroutinefunction() to test self.__cb itself,
         # because it fails to catch ones with partial()-ly bound arguments.
-        self._debug("called at {!r}", self.__next)
         try:
-            r = self.__cb(self.__next)
+            r = self.__cb(timestamp)
         except Exception as e:
             self._debug("callback raised {!r}", e)
             self.__handle_exc(e)
-            self.__schedule_next()
-        else:
-            if not iscoroutine(r):
-                self._debug("callback was synchronous")
-                self.__handle_ret(r)
-                self.__schedule_next()
-            elif self.__bg:
-                task = self.loop.create_task(r)
-                self._debug("scheduled background task {!r}", task)
-                try:
-                    self.__bg(task)  # catches `True`-not-callable errors too
-                except Exception:
-                    pass
-                self.__schedule_next()
-            else:
-                task = self.loop.create_task(self.__await_coroutine(r))
-                self.__pending = task
-                self._debug("scheduled foreground task {!r}", task)
+            return False
+        if not iscoroutine(r):
+            self._debug("callback was synchronous")
+            self.__handle_ret(r)
+            return False
+        if self.__bg:
+            task = self.loop.create_task(r)
+            self._debug("scheduled background task {!r}", task)
+            if self.__inflight:
+                self.__overlapping_ticks += 1
+            self.__inflight[task] = None
+            task.add_done_callback(self.__handle_bg_done)
+            try:
+                self.__bg(task)  # catches `True`-not-callable errors too
+            except Exception:
+                pass
+            return False
+        task = self.loop.create_task(self.__await_coroutine(r))
+        self.__pending = task
+        self._debug("scheduled foreground task {!r}", task)
+        return True
+
+    def __overflows(self):
+        # Apply the overflow policy; return whether to skip this call.
+        if (self.__max_inflight is None or
+                len(self.__inflight) < self.__max_inflight):
+            return False
+        if self.__overflow is OverflowPolicy.CANCEL_OLDEST:
+            oldest = next(iter(self.__inflight))
+            del self.__inflight[oldest]
+            oldest.cancel()
+            self.__cancelled_ticks += 1
+            self._debug("cancelled oldest background task {!r}", oldest)
+            return False
+        if self.__overflow is OverflowPolicy.QUEUE_ONE:
+            if self.__queued is not None:
+                self.__skipped_ticks += 1
+                self._debug("dropped queued call at {!r}", self.__queued)
+            self.__queued = self.__next
+            self._debug("queued call")
+            return True
+        self.__skipped_ticks += 1
+        self._debug("skipped call, {} in flight", len(self.__inflight))
+        return True
+
+    def __handle_bg_done(self, task):
+        self.__inflight.pop(task, None)
+        if (self.__queued is not None and
+                len(self.__inflight) < self.__max_inflight):
+            timestamp, self.__queued = self.__queued, None
+            self._debug("calling queued call at {!r}", timestamp)
+            self.__call(timestamp)
 
     @coroutine
     def __await_coroutine(self, coro):
@@ -197,20 +614,89 @@ class PeriodicCaller(WithEventLoop, WithLog, CtorRepr):
         if self.__next is None:
             # self was stopped from within callback
             return
-        self.__next += self.__period
-        self.__pending = self.loop.call_at(self.__next, self.__handle_expire)
+        self.__calling = False
+        interval = self._interval()
+        self.__next += interval
+        now = self.loop.time()
+        if (self.__missed is not MissedTickPolicy.CATCH_UP and
+                interval > 0 and now - self.__next >= interval):
+            missed = int((now - self.__next) // interval) + 1
+            if self.__missed is MissedTickPolicy.COALESCE:
+                missed -= 1
+            if missed:
+                self.__next += missed * interval
+                self.__missed_ticks += missed
+                self._warning("stalled; dropped {} call(s), {} so far",
+                              missed, self.__missed_ticks)
+        self.__pending = self.__call_at(self.__next)
         self._debug("next call at {!r}", self.__next)
 
 
+class AdaptivePeriodicCaller(PeriodicCaller):
+    """A `PeriodicCaller` whose period grows while nothing happens.
+
+    :param `float` max_period: the ceiling of the period, in seconds;
+        defaults to *period*, which makes the period fixed.
+    :param `float` backoff: the factor by which to grow the period after
+        each call.
+
+    All other arguments are the same as `PeriodicCaller`.
+
+    Make the first call one *period* after the start time, and then grow the
+    interval between calls by the factor *backoff* after each call, up to
+    *max_period*.  Upon `recheck()`, drop the interval back to *period*, so
+    that the next calls come quickly again.
+    """
+
+    def __init__(self, cb, period, *poargs, max_period=None, backoff=2,
+                 **kwargs):
+        """Initialize this instance."""
+        super().__init__(cb, period, *poargs, **kwargs)
+        if max_period is None:
+            max_period = self.period
+        assert max_period >= self.period
+        assert backoff >= 1
+        self.__max_period = float(max_period)
+        self.__backoff = float(backoff)
+        self.__current_period = self.period
+
+    def _collect_repr_args(self, poargs, kwargs):
+        super()._collect_repr_args(poargs, kwargs)
+        kwargs.update(max_period=self.__max_period, backoff=self.__backoff)
+
+    @property
+    def current_period(self):
+        """Return the interval to use after the next call, in seconds."""
+        return self.__current_period
+
+    def recheck(self):
+        """Drop the period back to the initial period.
+
+        Also bring the next call forward to one initial period from now, if it
+        is scheduled later than that.
+        """
+        self.__current_period = self.period
+        self._advance_to(self.loop.time() + self.period)
+
+    def _interval(self):
+        interval = self.__current_period
+        self.__current_period = min(interval * self.__backoff,
+                                    self.__max_period)
+        return interval
+
+
 @contextmanager
-def periodic_calls(*poargs, at=None, **kwargs):
+def periodic_calls(*poargs, at=None, factory=None, **kwargs):
     """Run the ``with`` statement block with periodic calls to a callback.
 
-    All arguments except for *at* is forwarded to the constructor of
-    `PeriodicCaller`.  The *at* argument is forwarded to the
+    All arguments except for *at* and *factory* are forwarded to the
+    constructor of `PeriodicCaller`, or of *factory* if given, such as
+    `AdaptivePeriodicCaller`.  The *at* argument is forwarded to the
     `PeriodicCaller.start()` method.
     """
-    caller = PeriodicCaller(*poargs, **kwargs)
+    if factory is None:
+        factory = PeriodicCaller
+    caller = factory(*poargs, **kwargs)
     caller.start(at=at)
     try:
         yield caller
@@ -264,3 +750,184 @@ def signal_handled(signum, handler, *, loop=None):
         logger.debug("signal %r -> handler %r: removing", signum, handler)
         loop.remove_signal_handler(signum)
         logger.debug("signal %r -> handler %r: removed", signum, handler)
+
+
+@contextmanager
+def process_exit_watched(pid, handler, *, loop=None):
+    """Install/uninstall a process exit handler upon enter/exit.
+
+    Watch the process through a Linux pidfd registered as a reader with the
+    event loop, so that its exit is detected without polling.  The process
+    need not be a child of this process.
+
+    :param `int` pid: process to watch.
+    :param handler: process exit handler, called (once) with no arguments.
+    :param loop: `asyncio` loop in which to install the handler.
+    :raise `OSError`: if the process cannot be watched, e.g. if it does not
+        exist or if pidfds are not supported (they require Linux 5.3 and
+        Python 3.9 or later).
+    """
+    if loop is None:
+        loop = get_event_loop()
+    try:
+        pidfd_open = os.pidfd_open
+    except AttributeError:
+        raise OSError(ENOSYS, "pidfd_open() is not supported")
+    fd = pidfd_open(pid)
+    try:
+        def handle_exit():
+            logger.debug("process %r -> handler %r: exited", pid, handler)
+            loop.remove_reader(fd)
+            handler()
+        loop.add_reader(fd, handle_exit)
+        logger.debug("process %r -> handler %r: added", pid, handler)
+        try:
+            yield
+        finally:
+            loop.remove_reader(fd)
+            logger.debug("process %r -> handler %r: removed", pid, handler)
+    finally:
+        os.close(fd)
+
+
+@coroutine
+def terminate_process_group(proc, grace, *, loop=None):
+    """Terminate a child and its process group, escalating to SIGKILL.
+
+    Send SIGTERM to the process group led by *proc*, wait up to *grace*
+    seconds for *proc* to exit, then send SIGKILL to the group and wait for
+    *proc* to exit.  Signal the group only while *proc* has not been reaped,
+    lest its process group ID be reused.
+
+    :param proc: child process, such as an `asyncio.subprocess.Process`,
+        started in a new session (``start_new_session=True``), so that it
+        leads its own process group.
+    :param `float` grace: seconds between SIGTERM and SIGKILL.
+    :param loop: `asyncio` loop in which *proc* is reaped.
+    :return: the exit status of *proc*.
+    """
+    if loop is None:
+        loop = get_event_loop()
+    for signum in (SIGTERM, SIGKILL):
+        if proc.returncode is not None:
+            break
+        logger.debug("process group %r: sending %r", proc.pid, signum)
+        try:
+            os.killpg(proc.pid, signum)
+        except ProcessLookupError:
+            pass
+        try:
+            return (yield from wait_for(shield(proc.wait(), loop=loop),
+                                        grace, loop=loop))
+        except TimeoutError:
+            pass
+    return (yield from proc.wait())
+
+
+class SignalFanOut(WithEventLoop, WithLog, CtorRepr):
+    """A facility to deliver each signal to multiple handlers.
+
+    An event loop keeps at most one handler per signal.  Routing signals
+    through a `SignalFanOut` lets multiple parties sharing one event loop,
+    such as multiple `~sig2srv.sig2srv.Sig2Srv` instances, handle the same
+    signal.
+
+    :param `AbstractEventLoop` loop: optional event loop in which to install
+        the actual signal handlers.
+    """
+
+    def __init__(self, *poargs, **kwargs):
+        """Initialize this instance."""
+        super().__init__(*poargs, **kwargs)
+        self.__handlers = {}
+
+    @contextmanager
+    def handled(self, signum, handler):
+        """Add/remove a signal handler upon enter/exit.
+
+        Install the actual signal handler into the event loop when adding the
+        first handler for *signum*, and uninstall it when removing the last.
+
+        :param signum: signal to catch.
+        :param handler: signal handler.
+        """
+        handlers = self.__handlers.get(signum)
+        if handlers is None:
+            self._debug("signal {!r}: installing dispatcher", signum)
+            self.loop.add_signal_handler(signum, self.__dispatch, signum)
+            handlers = self.__handlers[signum] = []
+        handlers.append(handler)
+        self._debug("signal {!r} -> handler {!r}: added", signum, handler)
+        try:
+            yield
+        finally:
+            handlers.remove(handler)
+            self._debug("signal {!r} -> handler {!r}: removed",
+                        signum, handler)
+            if not handlers:
+                del self.__handlers[signum]
+                self.loop.remove_signal_handler(signum)
+                self._debug("signal {!r}: uninstalled dispatcher", signum)
+
+    def __dispatch(self, signum):
+        # Copy so that handlers may add/remove handlers.
+        for handler in list(self.__handlers.get(signum, ())):
+            try:
+                handler()
+            except Exception as e:
+                self._error("signal {!r} -> handler {!r} raised {!r}",
+                            signum, handler, e)
+
+
+class PriorityLock(WithEventLoop, WithLog, CtorRepr):
+    """A lock that lets waiters with a higher priority go first.
+
+    Like `asyncio.Lock`, but hand the lock over to the waiter with the lowest
+    *priority* value, and to the earliest one among equals.
+    """
+
+    def __init__(self, *poargs, **kwargs):
+        """Initialize this instance."""
+        super().__init__(*poargs, **kwargs)
+        self.__locked = False
+        self.__waiters = []  # heap of (priority, sequence, future)
+        self.__sequence = count()
+
+    def locked(self):
+        """Return whether the lock is held."""
+        return self.__locked
+
+    @property
+    def waiting(self):
+        """Return the number of waiters, including cancelled ones."""
+        return len(self.__waiters)
+
+    @coroutine
+    def acquire(self, priority=0):
+        """Acquire the lock.
+
+        :param priority: priority of this waiter; lower values go first.
+        :return: `True`.
+        """
+        if not self.__locked:
+            self.__locked = True
+            return True
+        waiter = Future(loop=self.loop)
+        heappush(self.__waiters, (priority, next(self.__sequence), waiter))
+        try:
+            yield from waiter
+        except CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # handed over, but cancelled before resuming
+            raise
+        return True
+
+    def release(self):
+        """Release the lock, handing it over to the first waiter if any."""
+        assert self.__locked, "release() of an unlocked PriorityLock"
+        while self.__waiters:
+            priority, sequence, waiter = heappop(self.__waiters)
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.__locked = False
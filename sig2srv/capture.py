@@ -0,0 +1,179 @@
+"""Bounded capture of command output."""
+
+from asyncio import coroutine
+from enum import Enum
+
+from ctorrepr import CtorRepr
+
+from .asynchelper import WithEventLoop
+from .logging import WithLog
+
+
+class OutputMode(Enum):
+    """Where `~sig2srv.sig2srv.ServiceCommandRunner` sends command output."""
+
+    INHERIT = 'inherit'
+    """Let commands write to the standard output/error of sig2srv."""
+
+    DISCARD = 'discard'
+    """Send command output to ``/dev/null``."""
+
+    LOG = 'log'
+    """Log command output line by line (see `OutputCapture`)."""
+
+
+class RingBuffer:
+    """A fixed-size byte buffer that keeps the last bytes written to it.
+
+    :param `int` size: how many bytes to keep.
+    """
+
+    __slots__ = ('__buf', '__pos', '__full')
+
+    def __init__(self, size):
+        """Initialize this instance."""
+        assert size > 0
+        self.__buf = bytearray(size)
+        self.__pos = 0
+        self.__full = False
+
+    def __len__(self):
+        """Return the number of bytes held."""
+        return len(self.__buf) if self.__full else self.__pos
+
+    def write(self, data):
+        """Append *data*, overwriting the oldest bytes if full."""
+        size = len(self.__buf)
+        if len(data) >= size:
+            self.__buf[:] = data[-size:]
+            self.__pos = 0
+            self.__full = True
+            return
+        end = self.__pos + len(data)
+        if end <= size:
+            self.__buf[self.__pos:end] = data
+        else:
+            split = size - self.__pos
+            self.__buf[self.__pos:] = data[:split]
+            self.__buf[:end - size] = data[split:]
+            self.__full = True
+        self.__pos = end % size
+        if self.__pos == 0 and end:
+            self.__full = True
+
+    def getvalue(self):
+        """Return the bytes kept, oldest first.
+
+        :rtype: `bytes`
+        """
+        if not self.__full:
+            return bytes(self.__buf[:self.__pos])
+        return bytes(self.__buf[self.__pos:] + self.__buf[:self.__pos])
+
+
+class OutputCapture(WithEventLoop, WithLog, CtorRepr):
+    """A consumer of command output that keeps memory use bounded.
+
+    Read output in chunks, pass each line to *log* subject to a token-bucket
+    rate limit, and keep the last *tail* bytes in a `RingBuffer`.  Truncate
+    lines longer than *max_line* bytes.
+
+    :param log: callable to pass each line to, as a `str` without the line
+        terminator.
+    :param `int` tail: how many bytes of output to keep for `tail`.
+    :param `int` max_line: how many bytes of each line to log.
+    :param `float` rate: how many lines per second to log, on average.
+    :param `int` burst: how many lines to log in a burst.
+    """
+
+    CHUNK_SIZE = 4096
+
+    def __init__(self, *poargs, log, tail=4096, max_line=1024, rate=10,
+                 burst=50, **kwargs):
+        """Initialize this instance."""
+        super().__init__(*poargs, **kwargs)
+        self.__log = log
+        self.__tail = RingBuffer(tail)
+        self.__max_line = max_line
+        self.__rate = rate
+        self.__burst = burst
+        self.__tokens = burst
+        self.__refilled = None
+        self.__line = bytearray()
+        self.__truncated = False
+        self.__suppressed = 0
+
+    def _collect_repr_args(self, poargs, kwargs):
+        super()._collect_repr_args(poargs, kwargs)
+        kwargs.update(log=self.__log, max_line=self.__max_line,
+                      rate=self.__rate, burst=self.__burst)
+
+    @property
+    def tail(self):
+        """Return the last bytes of output, decoded.
+
+        :rtype: `str`
+        """
+        return self.__tail.getvalue().decode(errors='replace')
+
+    @property
+    def suppressed(self):
+        """Return the number of lines not logged due to the rate limit."""
+        return self.__suppressed
+
+    @coroutine
+    def consume(self, reader):
+        """Consume output until EOF.
+
+        :param reader: `asyncio.StreamReader` to read output from.
+        """
+        while True:
+            data = yield from reader.read(self.CHUNK_SIZE)
+            if not data:
+                break
+            self.__tail.write(data)
+            self.__feed(data)
+        if self.__line or self.__truncated:
+            self.__emit()
+        if self.__suppressed:
+            self.__log("({} lines suppressed)".format(self.__suppressed))
+
+    def __feed(self, data):
+        start = 0
+        while True:
+            end = data.find(b'\n', start)
+            if end < 0:
+                self.__append(data[start:])
+                return
+            self.__append(data[start:end])
+            self.__emit()
+            start = end + 1
+
+    def __append(self, data):
+        room = self.__max_line - len(self.__line)
+        if len(data) > room:
+            data = data[:room]
+            self.__truncated = True
+        self.__line += data
+
+    def __emit(self):
+        line = bytes(self.__line).rstrip(b'\r').decode(errors='replace')
+        if self.__truncated:
+            line += ' [truncated]'
+        self.__line.clear()
+        self.__truncated = False
+        if self.__take_token():
+            self.__log(line)
+        else:
+            self.__suppressed += 1
+
+    def __take_token(self):
+        now = self.loop.time()
+        if self.__refilled is not None:
+            self.__tokens = min(self.__burst, self.__tokens +
+                                (now - self.__refilled) * self.__rate)
+        self.__refilled = now
+        if self.__tokens < 1:
+            return False
+        self.__tokens -= 1
+        return True
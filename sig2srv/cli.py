@@ -1,35 +1,284 @@
 """Main CLI module."""
 
-from argparse import ArgumentParser
-from asyncio import get_event_loop
-from contextlib import closing
+from argparse import ArgumentParser, ArgumentTypeError
+from asyncio import coroutine, gather
+from contextlib import ExitStack, closing
+from functools import partial
 from logging import StreamHandler, DEBUG
 import sys
 
+from .asynchelper import (EventLoopKind, SignalFanOut, install_event_loop,
+                          periodic_calls, uvloop_supported)
+from .capture import OutputMode
 from .logging import logger
-from .sig2srv import Sig2Srv, ServiceCommandRunner, FatalError
+from .sig2srv import (Sig2Srv, ServiceCommandRunner, FatalError,
+                      RestartStrategy, find_init_script)
+
+
+def _output(arg):
+    """Parse a ``VERB=MODE`` argument into a ``(verb, mode)`` tuple."""
+    verb, sep, mode = arg.partition('=')
+    if not verb or not sep:
+        raise ArgumentTypeError("expected VERB=MODE")
+    try:
+        return verb, OutputMode(mode)
+    except ValueError:
+        raise ArgumentTypeError("invalid mode {!r} (choose from {})".format(
+            mode, ', '.join(m.value for m in OutputMode)))
+
+
+def _timeout(arg):
+    """Parse a ``VERB=SECONDS`` argument into a ``(verb, seconds)`` tuple."""
+    verb, sep, seconds = arg.partition('=')
+    if not verb or not sep:
+        raise ArgumentTypeError("expected VERB=SECONDS")
+    try:
+        seconds = float(seconds)
+    except ValueError:
+        raise ArgumentTypeError("invalid seconds {!r}".format(seconds))
+    if seconds <= 0:
+        raise ArgumentTypeError("seconds must be positive")
+    return verb, seconds
+
+
+@coroutine
+def _write_metrics(metrics, path, loop):
+    """Write *metrics* to *path*, logging instead of raising errors."""
+    from .metrics import write_textfile
+    try:
+        yield from write_textfile(metrics, path, loop=loop)
+    except OSError as e:
+        logger.warning("cannot write metrics to %s: %s", path, e)
+
+
+@coroutine
+def _supervise(sig2srv):
+    """Run *sig2srv*, returning the `FatalError` that aborted it if any."""
+    try:
+        yield from sig2srv.run()
+    except FatalError as e:
+        return e
 
 
 def main():
-    """Run one `Sig2Srv` instance as a command-line utility."""
-    parser = ArgumentParser(description="Start/stop service(8) script.")
+    """Run `Sig2Srv` instances as a command-line utility.
+
+    Supervise all the services named on the command line from one process,
+    each with its own `Sig2Srv` instance, on one event loop.  Deliver every
+    SIGTERM/SIGHUP to all of them.  Exit after all of them have finished,
+    with a nonzero status if any of them failed.
+
+    Import the modules of optional features, such as metrics, only if they
+    are enabled, so that the ``start`` commands run as early as possible.
+    """
+    parser = ArgumentParser(description="Start/stop service(8) scripts.")
     parser.add_argument('--debug', action='store_const', const=True,
                         help="enable debug logging")
-    parser.add_argument('service', help="service name")
-    parser.set_defaults(debug=False)
+    parser.add_argument('--log-queue', metavar='RECORDS', type=int,
+                        help="write log records from a background thread, "
+                             "buffering up to RECORDS of them and dropping "
+                             "the rest, so that a slow stderr cannot block "
+                             "signal handling")
+    parser.add_argument('--status-period', metavar='SECONDS', type=float,
+                        help="run status commands this often "
+                             "(default: %(default)s)")
+    parser.add_argument('--status-max-period', metavar='SECONDS',
+                        type=float,
+                        help="while the service keeps running, double the "
+                             "status period after each status command, up "
+                             "to this many seconds")
+    parser.add_argument('--status-spread', action='store_const', const=True,
+                        help="offset status commands within the status "
+                             "period by a phase derived from the service "
+                             "name")
+    parser.add_argument('--status-jitter', metavar='SECONDS', type=float,
+                        help="delay each status command by a random amount "
+                             "up to this many seconds")
+    parser.add_argument('--restart-debounce', metavar='SECONDS', type=float,
+                        help="wait for SIGHUP to stop arriving for this long "
+                             "before restarting (default: %(default)s)")
+    parser.add_argument('--restart-strategy',
+                        choices=[s.value for s in RestartStrategy],
+                        help="how to restart services upon SIGHUP "
+                             "(default: %(default)s)")
+    parser.add_argument('--pidfile', metavar='PATH',
+                        help="watch the process named in this pidfile "
+                             "instead of running periodic status commands; "
+                             "{} in PATH is replaced with the service name")
+    parser.add_argument('--via-service', action='store_const', const=True,
+                        help="always run commands through service(8), "
+                             "instead of running init scripts directly")
+    parser.add_argument('--posix-spawn', action='store_const', const=True,
+                        help="start commands with posix_spawn(3) instead of "
+                             "fork(2) (requires Python 3.8 or later)")
+    parser.add_argument('--loop', choices=[k.value for k in EventLoopKind],
+                        help="event loop implementation (default: uvloop "
+                             "if installed and --posix-spawn is not given, "
+                             "asyncio otherwise)")
+    parser.add_argument('--coprocess', action='store_const', const=True,
+                        help="run status commands through a persistent "
+                             "shell coprocess")
+    parser.add_argument('--timeout', metavar='VERB=SECONDS', type=_timeout,
+                        action='append', dest='timeouts',
+                        help="kill VERB commands (such as status) that run "
+                             "longer than SECONDS; may be repeated")
+    parser.add_argument('--kill-grace', metavar='SECONDS', type=float,
+                        help="wait this long between SIGTERM and SIGKILL "
+                             "when killing a command (default: %(default)s)")
+    parser.add_argument('--output', metavar='VERB=MODE', type=_output,
+                        action='append', dest='outputs',
+                        help="send the output of VERB commands to MODE: "
+                             "inherit, discard, or log (default: "
+                             "status=discard, others inherit); may be "
+                             "repeated")
+    parser.add_argument('--metrics-socket', metavar='PATH',
+                        help="serve Prometheus metrics over HTTP on this "
+                             "Unix socket")
+    parser.add_argument('--metrics-port', metavar='PORT', type=int,
+                        help="serve Prometheus metrics over HTTP on this "
+                             "localhost port")
+    parser.add_argument('--metrics-textfile', metavar='PATH',
+                        help="periodically write Prometheus metrics to this "
+                             "file, for the node exporter textfile "
+                             "collector")
+    parser.add_argument('--metrics-interval', metavar='SECONDS', type=float,
+                        help="write the metrics textfile this often "
+                             "(default: %(default)s)")
+    parser.add_argument('--journal', metavar='PATH',
+                        help="record state transitions, commands, and "
+                             "signals in this fixed-size binary journal "
+                             "file; read it with python -m sig2srv.journal")
+    parser.add_argument('--journal-size', metavar='EVENTS', type=int,
+                        help="keep this many events in the journal "
+                             "(default: %(default)s)")
+    parser.add_argument('services', metavar='service', nargs='+',
+                        help="service name")
+    parser.set_defaults(debug=False, log_queue=None,
+                        status_period=5, status_max_period=None,
+                        status_spread=False, status_jitter=0,
+                        restart_debounce=0,
+                        restart_strategy=RestartStrategy.STOP_START.value,
+                        pidfile=None,
+                        via_service=False, posix_spawn=False, loop=None,
+                        coprocess=False,
+                        timeouts=[], kill_grace=5, outputs=[],
+                        metrics_socket=None, metrics_port=None,
+                        metrics_textfile=None, metrics_interval=15,
+                        journal=None, journal_size=4096)
     args = parser.parse_args()
+    if (args.status_max_period is not None and
+            args.status_max_period < args.status_period):
+        parser.error("--status-max-period is less than --status-period")
+    if args.journal_size < 1:
+        parser.error("--journal-size must be positive")
+    if args.log_queue is not None and args.log_queue < 1:
+        parser.error("--log-queue must be positive")
+    launcher = None
+    if args.posix_spawn:
+        from .spawn import posix_spawn_exec, posix_spawn_supported
+        if not posix_spawn_supported():
+            parser.error("posix_spawn(3) is not supported")
+        launcher = posix_spawn_exec
+    loop_kind = args.loop
+    if loop_kind is None:
+        loop_kind = (EventLoopKind.UVLOOP
+                     if uvloop_supported() and not args.posix_spawn else
+                     EventLoopKind.ASYNCIO)
+    loop_kind = EventLoopKind(loop_kind)
+    if loop_kind == EventLoopKind.UVLOOP:
+        if not uvloop_supported():
+            parser.error("uvloop is not installed")
+        if args.posix_spawn:
+            parser.error("--posix-spawn requires --loop=asyncio")
     handler = StreamHandler()
-    logger.addHandler(handler)
+    if args.log_queue is None:
+        logger.addHandler(handler)
     if args.debug:
         logger.setLevel(DEBUG)
-    with closing(get_event_loop()) as loop:
-        runner = ServiceCommandRunner(name=args.service, loop=loop)
-        sig2srv = Sig2Srv(runner=runner, loop=loop)
-        try:
-            loop.run_until_complete(sig2srv.run())
-        except FatalError as e:
-            print("error:", str(e), file=sys.stderr)
-            sys.exit(1)
+    metrics = None
+    if (args.metrics_socket is not None or args.metrics_port is not None or
+            args.metrics_textfile is not None):
+        from .metrics import Metrics, MetricsServer
+        metrics = Metrics()
+    with closing(install_event_loop(loop_kind)) as loop, \
+            ExitStack() as stack:
+        if args.log_queue is not None:
+            from .logqueue import queued_handler
+            queue_handler = stack.enter_context(
+                queued_handler(handler, args.log_queue))
+            logger.addHandler(queue_handler)
+            stack.callback(logger.removeHandler, queue_handler)
+        servers = []
+        if args.metrics_socket is not None:
+            servers.append(MetricsServer(registry=metrics,
+                                         path=args.metrics_socket, loop=loop))
+        if args.metrics_port is not None:
+            servers.append(MetricsServer(registry=metrics,
+                                         port=args.metrics_port, loop=loop))
+        for server in servers:
+            try:
+                loop.run_until_complete(server.start())
+            except OSError as e:
+                print("error: cannot serve metrics:", e, file=sys.stderr)
+                sys.exit(1)
+            stack.callback(
+                lambda server=server: loop.run_until_complete(server.close()))
+        if args.metrics_textfile is not None:
+            write = partial(_write_metrics, metrics, args.metrics_textfile,
+                            loop)
+            stack.callback(lambda: loop.run_until_complete(write()))
+            stack.enter_context(periodic_calls(
+                lambda ts: write(), args.metrics_interval, bg=True,
+                max_inflight=1, loop=loop))
+        journal = None
+        if args.journal is not None:
+            from .journal import Journal
+            try:
+                journal = Journal(path=args.journal,
+                                  capacity=args.journal_size)
+            except (OSError, ValueError) as e:
+                print("error: cannot open journal:", e, file=sys.stderr)
+                sys.exit(1)
+            stack.callback(journal.close)
+        signals = SignalFanOut(loop=loop)
+        bridges = []
+        for name in args.services:
+            init_script = None if args.via_service else find_init_script(name)
+            runner = ServiceCommandRunner(name=name, init_script=init_script,
+                                          launcher=launcher,
+                                          coprocess=args.coprocess,
+                                          timeouts=dict(args.timeouts),
+                                          kill_grace=args.kill_grace,
+                                          output=dict(args.outputs),
+                                          metrics=metrics, journal=journal,
+                                          loop=loop)
+            pidfile = (None if args.pidfile is None else
+                       args.pidfile.format(name))
+            bridges.append(Sig2Srv(runner=runner, signals=signals,
+                                   pidfile=pidfile,
+                                   status_period=args.status_period,
+                                   status_max_period=args.status_max_period,
+                                   status_spread=args.status_spread,
+                                   status_jitter=args.status_jitter,
+                                   restart_debounce=args.restart_debounce,
+                                   restart_strategy=args.restart_strategy,
+                                   metrics=metrics, journal=journal))
+        errors = loop.run_until_complete(
+            gather(*(_supervise(bridge) for bridge in bridges), loop=loop))
+        loop.run_until_complete(
+            gather(*(bridge.runner.close() for bridge in bridges),
+                   loop=loop))
+    failed = False
+    for name, error in zip(args.services, errors):
+        if error is None:
+            continue
+        failed = True
+        if len(args.services) == 1:
+            print("error:", str(error), file=sys.stderr)
+        else:
+            print("error: {}: {}".format(name, error), file=sys.stderr)
+    if failed:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
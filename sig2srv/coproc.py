@@ -0,0 +1,141 @@
+"""Persistent shell coprocess."""
+
+from asyncio import coroutine, create_subprocess_exec
+from asyncio.subprocess import PIPE
+from binascii import hexlify
+import os
+from shlex import quote
+
+from ctorrepr import CtorRepr
+
+from .asynchelper import WithEventLoop, terminate_process_group
+from .logging import WithLog
+
+
+class ShellCoprocess(WithEventLoop, WithLog, CtorRepr):
+    """A long-lived shell that runs commands sent to it over a pipe.
+
+    Running a command through a coprocess costs one fork/exec of the command
+    by the already running shell, instead of a fork/exec of a new shell and
+    then of the command.
+
+    Send each command as one line to the standard input of the shell,
+    followed by an ``echo`` of its exit status prefixed with a marker unique
+    to the coprocess, and read the standard output of the shell up to the
+    marker.  Redirect the standard input of commands from ``/dev/null`` and
+    their standard output to the standard error of the shell, so that they
+    cannot interfere with the framing.
+
+    Start the shell upon the first command, and restart it if it has died.
+    Start it in a new session, so that `kill()` can reach the command it is
+    running too.
+
+    Not safe for concurrent use; callers must serialize `run()` calls.
+
+    :param `str` shell: shell to run.
+    :param `dict` env: environment for the shell; defaults to `os.environ`.
+    :param stderr: standard error for the shell, and thus the output of
+        commands, as with `asyncio.create_subprocess_exec()`; defaults to
+        that of this process.
+    """
+
+    def __init__(self, *poargs, shell='/bin/sh', env=None, stderr=None,
+                 **kwargs):
+        """Initialize this instance."""
+        super().__init__(*poargs, **kwargs)
+        self.__shell = shell
+        self.__env = env
+        self.__stderr = stderr
+        self.__marker = b'sig2srv-' + hexlify(os.urandom(8))
+        self.__proc = None
+
+    def _collect_repr_args(self, poargs, kwargs):
+        super()._collect_repr_args(poargs, kwargs)
+        kwargs.update(shell=self.__shell, env=self.__env,
+                      stderr=self.__stderr)
+
+    @property
+    def pid(self):
+        """Return the process ID of the shell, or `None` if not running."""
+        return None if self.__proc is None else self.__proc.pid
+
+    @coroutine
+    def run(self, *args):
+        """Run a command in the shell.
+
+        If the shell dies while running the command, restart it and retry
+        the command once.
+
+        :param args: the command and its arguments.
+        :return: the exit status of the command.
+        :raise `ConnectionError`: if the shell died twice.
+        """
+        line = (' '.join(quote(arg) for arg in args) +
+                ' </dev/null 1>&2; echo "' + self.__marker.decode() +
+                ' $?"\n').encode()
+        for attempt in range(2):
+            proc = yield from self.__start()
+            try:
+                proc.stdin.write(line)
+                yield from proc.stdin.drain()
+                return (yield from self.__read_status(proc))
+            except ConnectionError as e:
+                self._warning("shell coprocess died: {!r}", e)
+                yield from self.__reap()
+                if attempt:
+                    raise
+
+    @coroutine
+    def close(self):
+        """Stop the shell, if running, and wait for it to exit."""
+        if self.__proc is not None:
+            self.__proc.stdin.close()
+            yield from self.__reap(kill=False)
+
+    @coroutine
+    def kill(self, grace=5):
+        """Stop the shell and the command it is running, if any.
+
+        Use this instead of `close()` to abort a `run()` that is taking too
+        long; see `~sig2srv.asynchelper.terminate_process_group()`.
+
+        :param `float` grace: seconds between SIGTERM and SIGKILL.
+        """
+        proc, self.__proc = self.__proc, None
+        if proc is not None:
+            result = yield from terminate_process_group(proc, grace,
+                                                        loop=self.loop)
+            self._debug("shell coprocess {} exited with {}", proc.pid, result)
+
+    @coroutine
+    def __start(self):
+        if self.__proc is not None and self.__proc.returncode is not None:
+            yield from self.__reap()
+        if self.__proc is None:
+            self.__proc = yield from create_subprocess_exec(
+                self.__shell, stdin=PIPE, stdout=PIPE, stderr=self.__stderr,
+                env=self.__env, start_new_session=True, loop=self.loop)
+            self._debug("started shell coprocess {}", self.__proc.pid)
+        return self.__proc
+
+    @coroutine
+    def __read_status(self, proc):
+        while True:
+            line = yield from proc.stdout.readline()
+            if not line:
+                raise ConnectionResetError("EOF from shell coprocess")
+            words = line.split()
+            if len(words) == 2 and words[0] == self.__marker:
+                return int(words[1])
+            self._debug("ignoring stray output {!r}", line)
+
+    @coroutine
+    def __reap(self, kill=True):
+        proc, self.__proc = self.__proc, None
+        if kill and proc.returncode is None:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+        result = yield from proc.wait()
+        self._debug("shell coprocess {} exited with {}", proc.pid, result)
@@ -0,0 +1,135 @@
+"""In-process fake service backend."""
+
+from asyncio import Lock, coroutine, sleep
+from collections import Counter, defaultdict, deque
+from random import Random
+
+from .sig2srv import ServiceBackend
+
+
+class FakeBackend(ServiceBackend):
+    """A `~sig2srv.sig2srv.ServiceBackend` that runs no processes.
+
+    Simulate a service that `start`, `stop`, `restart` and `reload` commands
+    act on, and that `status` commands report on, with exit statuses as the
+    LSB specifies for init scripts.  Run one command at a time, like
+    `~sig2srv.sig2srv.ServiceCommandRunner`, taking *latency* seconds plus
+    up to *jitter* seconds for each, so that `~sig2srv.sig2srv.Sig2Srv` can
+    be benchmarked and stress-tested at scale without forking.
+
+    Inject failures either at random, with *failure_rate*, or
+    deterministically, with `inject()`; simulate the service dying with
+    `crash()`.
+
+    :param `str` name: service name.
+    :param latency: seconds each command takes, as a `float`, or as a
+        `dict` from verbs to seconds (others take none).
+    :param `float` jitter: bound of a random delay to add to each command.
+    :param failure_rate: probability of a command failing, as a `float`, or
+        as a `dict` from verbs to probabilities (others never fail).
+    :param seed: optional seed for the random delays and failures.
+    :param `bool` running: whether the service starts out running.
+    """
+
+    FAILED = 1
+    """Exit status of failed commands."""
+
+    NOT_RUNNING = 3
+    """Exit status of ``status`` while not running, and of unknown verbs."""
+
+    def __init__(self, *poargs, name, latency=0, jitter=0, failure_rate=0,
+                 seed=None, running=False, **kwargs):
+        """Initialize this instance."""
+        super().__init__(*poargs, **kwargs)
+        assert jitter >= 0
+        self.__name = name
+        self.__latency = latency
+        self.__jitter = jitter
+        self.__failure_rate = failure_rate
+        self.__seed = seed
+        self.__random = Random(seed)
+        self.__running = bool(running)
+        self.__injected = defaultdict(deque)  # verb -> results to return
+        self.__counts = Counter()
+        self.__lock = Lock(loop=self.loop)
+
+    def _collect_repr_args(self, poargs, kwargs):
+        super()._collect_repr_args(poargs, kwargs)
+        kwargs.update(name=self.__name, latency=self.__latency,
+                      jitter=self.__jitter, failure_rate=self.__failure_rate,
+                      seed=self.__seed)
+
+    @property
+    def name(self):
+        """Return the service name."""
+        return self.__name
+
+    @property
+    def running(self):
+        """Return whether the simulated service is running."""
+        return self.__running
+
+    @property
+    def counts(self):
+        """Return a `~collections.Counter` of commands run, by verb."""
+        return Counter(self.__counts)
+
+    def inject(self, verb, *results):
+        """Make the next commands with *verb* return *results*, in order.
+
+        Such commands take their usual time but leave the service as is.
+        Results may include `~sig2srv.sig2srv.TIMED_OUT`.
+        """
+        self.__injected[verb].extend(results)
+
+    def crash(self):
+        """Make the simulated service stop running on its own."""
+        self.__running = False
+
+    @coroutine
+    def run(self, *args):
+        """Simulate a command.
+
+        Take the same arguments, and return the same exit statuses, as
+        `~sig2srv.sig2srv.ServiceBackend.run()`.
+        """
+        verb = args[0] if args else ''
+        yield from self.__lock.acquire()
+        try:
+            yield from sleep(self.__delay(verb), loop=self.loop)
+            self.__counts[verb] += 1
+            injected = self.__injected.get(verb)
+            if injected:
+                result = injected.popleft()
+            elif self.__random.random() < self.__lookup(self.__failure_rate,
+                                                        verb):
+                result = self.FAILED
+            else:
+                result = self.__simulate(verb)
+        finally:
+            self.__lock.release()
+        self._debug("{} returned {}", args, result)
+        return result
+
+    def __delay(self, verb):
+        delay = self.__lookup(self.__latency, verb)
+        if self.__jitter:
+            delay += self.__random.uniform(0, self.__jitter)
+        return delay
+
+    @staticmethod
+    def __lookup(value, verb):
+        if isinstance(value, dict):
+            return value.get(verb, 0)
+        return value
+
+    def __simulate(self, verb):
+        if verb in ('start', 'restart'):
+            self.__running = True
+        elif verb == 'stop':
+            self.__running = False
+        elif verb in ('reload', 'status'):
+            return 0 if self.__running else self.NOT_RUNNING
+        else:
+            return self.NOT_RUNNING
+        return 0
@@ -0,0 +1,188 @@
+"""Fixed-memory latency histogram."""
+
+from array import array
+
+
+class LogHistogram:
+    """A fixed-memory histogram with log-linear buckets, like HdrHistogram.
+
+    Count values in an `array` of buckets: Values below ``2 ** precision``
+    times *lowest* go into linear buckets *lowest* apart, and each power of
+    two range above that into ``2 ** (precision - 1)`` linear buckets, so
+    that the relative error of reported values is below ``2 ** -(precision
+    - 1)``.  Count values above *highest* in the last bucket, but track the
+    exact maximum.
+
+    Record values in O(1) time, and report quantiles in time proportional
+    to the number of buckets, which is logarithmic in
+    ``highest / lowest``.
+
+    :param `float` lowest: resolution, e.g. ``1e-6`` for microseconds.
+    :param `float` highest: highest value to count precisely.
+    :param `int` precision: number of bits of precision.
+    """
+
+    __slots__ = ('__lowest', '__highest', '__precision', '__half',
+                 '__counts', '__count', '__sum', '__min', '__max')
+
+    def __init__(self, lowest=1e-6, highest=3600, precision=7):
+        """Initialize this instance."""
+        assert 0 < lowest < highest
+        assert precision >= 2
+        self.__lowest = lowest
+        self.__highest = highest
+        self.__precision = precision
+        self.__half = 1 << (precision - 1)
+        size = self.__index(int(highest / lowest)) + 1
+        self.__counts = array('Q', [0]) * size
+        self.__count = 0
+        self.__sum = 0.0
+        self.__min = None
+        self.__max = None
+
+    def __repr__(self):
+        """Return a constructor expression for an empty copy."""
+        return ('{}(lowest={!r}, highest={!r}, precision={!r})'
+                .format(type(self).__name__, self.__lowest, self.__highest,
+                        self.__precision))
+
+    def __index(self, units):
+        shift = units.bit_length() - self.__precision
+        if shift <= 0:
+            return units
+        return shift * self.__half + (units >> shift)
+
+    def __bounds(self, index):
+        """Return the [lower, upper) bounds of bucket *index*, in units."""
+        if index < 2 * self.__half:
+            return index, index + 1
+        shift, offset = divmod(index - 2 * self.__half, self.__half)
+        shift += 1
+        lower = (self.__half + offset) << shift
+        return lower, lower + (1 << shift)
+
+    def __len__(self):
+        """Return the number of values recorded."""
+        return self.__count
+
+    @property
+    def count(self):
+        """Return the number of values recorded."""
+        return self.__count
+
+    @property
+    def sum(self):
+        """Return the sum of values recorded."""
+        return self.__sum
+
+    @property
+    def min(self):
+        """Return the smallest value recorded, or `None` if empty."""
+        return self.__min
+
+    @property
+    def max(self):
+        """Return the largest value recorded, or `None` if empty."""
+        return self.__max
+
+    @property
+    def mean(self):
+        """Return the mean of values recorded, or `None` if empty."""
+        return self.__sum / self.__count if self.__count else None
+
+    @property
+    def nbytes(self):
+        """Return the size of the bucket array, in bytes."""
+        return self.__counts.itemsize * len(self.__counts)
+
+    def record(self, value, count=1):
+        """Record *value*, *count* times.
+
+        Record negative values as zero.
+        """
+        if value < 0:
+            value = 0
+        index = self.__index(int(value / self.__lowest))
+        if index >= len(self.__counts):
+            index = len(self.__counts) - 1
+        self.__counts[index] += count
+        self.__count += count
+        self.__sum += value * count
+        if self.__min is None or value < self.__min:
+            self.__min = value
+        if self.__max is None or value > self.__max:
+            self.__max = value
+
+    def merge(self, other):
+        """Add the values recorded in *other* to this histogram.
+
+        :param `LogHistogram` other: histogram with the same parameters.
+        :raise `ValueError`: if *other* has different parameters.
+        """
+        if ((other.__lowest, other.__highest, other.__precision) !=
+                (self.__lowest, self.__highest, self.__precision)):
+            raise ValueError("cannot merge {!r} into {!r}"
+                             .format(other, self))
+        if not other.__count:
+            return
+        counts = self.__counts
+        for index, count in enumerate(other.__counts):
+            if count:
+                counts[index] += count
+        self.__count += other.__count
+        self.__sum += other.__sum
+        if self.__min is None or other.__min < self.__min:
+            self.__min = other.__min
+        if self.__max is None or other.__max > self.__max:
+            self.__max = other.__max
+
+    def copy(self):
+        """Return a copy of this histogram."""
+        copy = LogHistogram(self.__lowest, self.__highest, self.__precision)
+        copy.merge(self)
+        return copy
+
+    def reset(self):
+        """Forget all values recorded."""
+        for index in range(len(self.__counts)):
+            self.__counts[index] = 0
+        self.__count = 0
+        self.__sum = 0.0
+        self.__min = None
+        self.__max = None
+
+    def quantile(self, q):
+        """Return the value below which fraction *q* of values fall.
+
+        Report the midpoint of the bucket holding the value, clamped to the
+        recorded minimum and maximum, or those exactly for the extreme ranks.
+
+        :param `float` q: quantile, between 0 and 1.
+        :return: the value, or `None` if empty.
+        """
+        assert 0 <= q <= 1
+        if not self.__count:
+            return None
+        rank = max(1, int(q * self.__count + 0.5))
+        if rank == 1:
+            return self.__min
+        if rank == self.__count:
+            return self.__max
+        seen = 0
+        for index, count in enumerate(self.__counts):
+            seen += count
+            if seen >= rank:
+                break
+        lower, upper = self.__bounds(index)
+        value = (lower + upper) / 2 * self.__lowest
+        return min(max(value, self.__min), self.__max)
+
+    def quantiles(self, *qs):
+        """Return `quantile()` for each of *qs*, as a `list`."""
+        return [self.quantile(q) for q in qs]
+
+    def buckets(self):
+        """Yield ``(upper_bound, count)`` for each non-empty bucket."""
+        for index, count in enumerate(self.__counts):
+            if count:
+                yield self.__bounds(index)[1] * self.__lowest, count
@@ -0,0 +1,251 @@
+"""Memory-mapped binary event journal.
+
+Record state transitions, commands, and signals in a fixed-size ring of
+fixed-size records in a memory-mapped file, for post-mortems.  Writing a
+record costs a `struct.Struct.pack_into()` into the shared mapping and no
+system call, so the journal can always be on; the kernel writes the pages
+back to the file even if sig2srv crashes.
+
+Read a journal with::
+
+    python -m sig2srv.journal [-n COUNT] PATH
+"""
+
+from argparse import ArgumentParser
+from collections import namedtuple
+from datetime import datetime
+from enum import IntEnum
+import mmap
+import os
+import signal
+from struct import Struct
+import time
+
+from ctorrepr import CtorRepr
+
+from .logging import WithLog
+from .sig2srv import TIMED_OUT
+
+MAGIC = b'S2SJRNL\x01'
+
+_HEADER = Struct('<8sIII4xQ')  # magic, version, record size, capacity, next
+_HEADER_SIZE = 64
+_NEXT = Struct('<Q')  # the last header field, updated after each record
+_NEXT_OFFSET = _HEADER.size - _NEXT.size
+_RECORD = Struct('<QdB3xid20s12s')  # seq, time, kind, code, duration, ...
+
+NO_STATUS = -0x80000000
+"""`Event.code` of commands that raised an exception instead of returning."""
+
+
+class EventKind(IntEnum):
+    """Kind of a journal `Event`."""
+
+    STATE = 1
+    """A `~sig2srv.sig2srv.Sig2Srv` state transition; the code is the state
+    value, and the detail is the state name."""
+
+    COMMAND_START = 2
+    """A command started; the detail is the command arguments."""
+
+    COMMAND_END = 3
+    """A command finished; the code is its exit status (or `NO_STATUS`),
+    and the duration is how long it ran."""
+
+    SIGNAL = 4
+    """A signal arrived; the code is the signal number."""
+
+
+_KINDS = frozenset(kind.value for kind in EventKind)
+
+Event = namedtuple('Event', 'seq time kind service code duration detail')
+"""A journal record, as returned by `read_journal()`."""
+
+
+def _encode(text, size):
+    return text.encode(errors='replace')[:size]
+
+
+def _decode(data):
+    return data.rstrip(b'\0').decode(errors='ignore')
+
+
+def _signal_name(signum):
+    try:
+        return signal.Signals(signum).name
+    except (AttributeError, ValueError):  # no Signals before Python 3.5
+        return str(signum)
+
+
+class Journal(WithLog, CtorRepr):
+    """A writer of a memory-mapped ring of events.
+
+    Keep the last *capacity* events in the file at *path*, which takes
+    ``64 + 64 * capacity`` bytes.  If the file already holds a journal of
+    the same capacity, e.g. from before a crash, continue after its last
+    event.  If it holds a journal of another capacity or format version,
+    start afresh.  Create the file if it does not exist, but refuse to
+    overwrite a non-empty file that is not a journal.
+
+    Truncate service names and details to 20 and 12 bytes respectively.
+
+    :param `str` path: journal file.
+    :param `int` capacity: how many events to keep.
+    :raise `ValueError`: if *path* is a non-empty file but not a journal.
+    :raise `OSError`: if *path* cannot be opened or mapped.
+    """
+
+    def __init__(self, *poargs, path, capacity=4096, **kwargs):
+        """Initialize this instance."""
+        super().__init__(*poargs, **kwargs)
+        assert capacity > 0
+        self.__path = path
+        self.__capacity = capacity
+        size = _HEADER_SIZE + _RECORD.size * capacity
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            old_size = os.fstat(fd).st_size
+            header = os.read(fd, _HEADER.size) if old_size else b''
+            if header and not header.startswith(MAGIC):
+                raise ValueError("{} is not a sig2srv journal".format(path))
+            fresh = (len(header) < _HEADER.size or old_size != size or
+                     _HEADER.unpack(header)[1:4] != (1, _RECORD.size,
+                                                     capacity))
+            if fresh and header:
+                self._warning("reinitializing journal {}", path)
+            if old_size != size:
+                os.ftruncate(fd, size)
+            self.__map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        if fresh:
+            self.__map[:] = bytes(size)
+            next_seq = 1
+        else:
+            next_seq = _HEADER.unpack_from(self.__map)[4]
+        self.__next = next_seq
+        _HEADER.pack_into(self.__map, 0, MAGIC, 1, _RECORD.size, capacity,
+                          next_seq)
+
+    def _collect_repr_args(self, poargs, kwargs):
+        super()._collect_repr_args(poargs, kwargs)
+        kwargs.update(path=self.__path, capacity=self.__capacity)
+
+    def record(self, kind, service='', detail='', code=0, duration=0.0):
+        """Record an event.
+
+        :param `EventKind` kind: kind of the event.
+        :param `str` service: service name.
+        :param `str` detail: short description, such as a verb.
+        :param `int` code: kind-specific code, such as an exit status.
+        :param `float` duration: kind-specific duration, in seconds.
+        """
+        seq = self.__next
+        offset = (_HEADER_SIZE +
+                  (seq - 1) % self.__capacity * _RECORD.size)
+        _RECORD.pack_into(self.__map, offset, seq, time.time(), kind, code,
+                          duration, _encode(service, 20),
+                          _encode(detail, 12))
+        self.__next = seq + 1
+        _NEXT.pack_into(self.__map, _NEXT_OFFSET, self.__next)
+
+    def state(self, service, state):
+        """Record a transition of *service* to *state*."""
+        self.record(EventKind.STATE, service, state.name, state.value)
+
+    def command_start(self, service, args):
+        """Record the start of a command with *args*."""
+        self.record(EventKind.COMMAND_START, service, ' '.join(args))
+
+    def command_end(self, service, args, status, duration):
+        """Record the end of a command with *args*.
+
+        :param status: exit status, or `None` if the command raised.
+        :param `float` duration: seconds the command ran.
+        """
+        self.record(EventKind.COMMAND_END, service, ' '.join(args),
+                    NO_STATUS if status is None else status, duration)
+
+    def signal(self, service, signum):
+        """Record the arrival of signal *signum* for *service*."""
+        self.record(EventKind.SIGNAL, service, _signal_name(signum), signum)
+
+    def close(self):
+        """Write the journal back to the file, and unmap it."""
+        if not self.__map.closed:
+            self.__map.flush()
+            self.__map.close()
+
+
+def read_journal(path):
+    """Read the events in a journal file, oldest first.
+
+    :param `str` path: journal file written by `Journal`.
+    :return: a `list` of `Event` tuples.
+    :raise `ValueError`: if *path* is not a journal.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, record_size, capacity, next_seq = \
+        _HEADER.unpack_from(data)
+    if magic != MAGIC or version != 1 or record_size != _RECORD.size:
+        raise ValueError("{} is not a sig2srv journal".format(path))
+    events = []
+    for slot in range(capacity):
+        offset = _HEADER_SIZE + slot * _RECORD.size
+        if offset + _RECORD.size > len(data):
+            break
+        seq, when, kind, code, duration, service, detail = \
+            _RECORD.unpack_from(data, offset)
+        # Skip empty slots, and ones torn by a crash mid-write.
+        if (seq == 0 or (seq - 1) % capacity != slot or
+                seq < next_seq - capacity or kind not in _KINDS):
+            continue
+        events.append(Event(seq, when, EventKind(kind), _decode(service),
+                            code, duration, _decode(detail)))
+    events.sort()
+    return events
+
+
+def format_event(event):
+    """Return a human-readable line for *event*."""
+    if event.kind == EventKind.STATE:
+        what = "state {}".format(event.detail)
+    elif event.kind == EventKind.COMMAND_START:
+        what = "run {}".format(event.detail)
+    elif event.kind == EventKind.COMMAND_END:
+        if event.code == NO_STATUS:
+            status = "raised"
+        elif event.code == TIMED_OUT:
+            status = "timed out"
+        else:
+            status = "returned {}".format(event.code)
+        what = "{} {} after {:.3f} s".format(event.detail, status,
+                                             event.duration)
+    else:
+        what = "signal {}".format(event.detail)
+    return "{:>8} {} {} {}".format(
+        event.seq,
+        datetime.fromtimestamp(event.time).isoformat(sep=' '),
+        event.service or '-', what)
+
+
+def main(argv=None):
+    """Print the events in a journal."""
+    parser = ArgumentParser(description="Print a sig2srv event journal.")
+    parser.add_argument('-n', '--count', type=int,
+                        help="print only the last COUNT events")
+    parser.add_argument('path', help="journal file")
+    args = parser.parse_args(argv)
+    try:
+        events = read_journal(args.path)
+    except (OSError, ValueError) as e:
+        parser.exit(1, "error: {}\n".format(e))
+    if args.count is not None:
+        events = events[-args.count:] if args.count > 0 else []
+    for event in events:
+        print(format_event(event))
+
+
+if __name__ == '__main__':
+    main()
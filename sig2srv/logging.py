@@ -1,32 +1,49 @@
 """Logging for `sig2srv`."""
 
 from logging import getLogger, DEBUG, INFO, WARNING, ERROR, CRITICAL
-from traceback import extract_stack
+import sys
 
 from ctorrepr import CtorRepr
 
+_ESCAPE_BRACES = {ord('{'): '{{', ord('}'): '}}'}
+
 
 class BraceMessage(CtorRepr):
     """Brace-style message formatter.
 
-    Taken from the Python logging cookbook.
+    Adapted from the Python logging cookbook.  Format the message only when
+    it is first rendered, and reuse the result thereafter, e.g. when more
+    than one handler formats the same record.  Upon rendering, release the
+    format and arguments (setting the attributes to `None`), and keep only
+    the result, so that records held in a queue stay small.
     """
 
+    __slots__ = ('fmt', 'poargs', 'kwargs', '__str')
+
     def __init__(self, fmt, *poargs, **kwargs):
         """Initialize this instance."""
         super().__init__()
         self.fmt = fmt
         self.poargs = poargs
         self.kwargs = kwargs
+        self.__str = None
 
     def _collect_repr_args(self, poargs, kwargs):
         super()._collect_repr_args(poargs, kwargs)
-        poargs[:0] = (self.fmt,) + self.poargs
-        kwargs.update(kwargs)
+        if self.__str is None:
+            poargs[:0] = (self.fmt,) + self.poargs
+            kwargs.update(self.kwargs)
+        else:  # an equivalent message
+            poargs[:0] = (self.__str.translate(_ESCAPE_BRACES),)
 
     def __str__(self):
         """Lazy-format the given logging arguments into the format string."""
-        return self.fmt.format(*self.poargs, **self.kwargs)
+        result = self.__str
+        if result is None:
+            result = self.__str = self.fmt.format(*self.poargs,
+                                                  **self.kwargs)
+            self.fmt = self.poargs = self.kwargs = None
+        return result
 
 
 logger = getLogger(__name__)
@@ -37,7 +54,16 @@ __ = BraceMessage
 
 
 class WithLog(CtorRepr):
-    """Logging mixin."""
+    """Logging mixin.
+
+    The ``_log()`` family of methods return immediately, without inspecting
+    the call stack or rendering the instance repr, if the logger is not
+    enabled for the requested level.  The repr of the instance is rendered
+    only once, upon the first enabled log call, and reused thereafter until
+    `_invalidate_log_header()` is called.
+    """
+
+    __generation = 0  # of cached log headers; see _invalidate_log_header()
 
     def __init__(self, *poargs, logger=None, **kwargs):
         """Initialize this instance."""
@@ -45,6 +71,7 @@ class WithLog(CtorRepr):
         if logger is None:
             logger = globals()['logger']
         self.__logger = logger
+        self.__log_header = None  # (generation, header)
 
     def _collect_repr_args(self, poargs, kwargs):
         super()._collect_repr_args(poargs, kwargs)
@@ -55,24 +82,46 @@ class WithLog(CtorRepr):
         """Return the logger to which this instance will log."""
         return self.__logger
 
+    def _invalidate_log_header(self):
+        """Render the repr anew for the next log message header.
+
+        Call this after changing state that appears in the repr.  Because
+        reprs nest, e.g. that of a `~sig2srv.sig2srv.Sig2Srv` contains that
+        of its runner, this invalidates the cached headers of all instances.
+        """
+        WithLog.__generation += 1
+
     def _log(self, level, fmt, *poargs, log_depth=0, **kwargs):
-        caller = extract_stack()[-2 - log_depth][2]
-        header = ("{!r}.{}(): "
-                  .format(self, caller)
-                  .translate({ord('{'): '{{', ord('}'): '}}'}))
-        self.__logger.log(level, BraceMessage(header + fmt, *poargs, **kwargs))
+        if not self.__logger.isEnabledFor(level):
+            return
+        caller = sys._getframe(1 + log_depth).f_code.co_name
+        cached = self.__log_header
+        if cached is None or cached[0] != WithLog.__generation:
+            cached = self.__log_header = (
+                WithLog.__generation,
+                repr(self).translate(_ESCAPE_BRACES))
+        header = cached[1]
+        self.__logger.log(level, BraceMessage(header + '.' + caller + '(): ' +
+                                              fmt, *poargs, **kwargs))
 
     def _debug(self, fmt, *poargs, log_depth=0, **kwargs):
-        self._log(DEBUG, fmt, *poargs, log_depth=(log_depth + 1), **kwargs)
+        if self.__logger.isEnabledFor(DEBUG):
+            self._log(DEBUG, fmt, *poargs, log_depth=(log_depth + 1), **kwargs)
 
     def _info(self, fmt, *poargs, log_depth=0, **kwargs):
-        self._log(INFO, fmt, *poargs, log_depth=(log_depth + 1), **kwargs)
+        if self.__logger.isEnabledFor(INFO):
+            self._log(INFO, fmt, *poargs, log_depth=(log_depth + 1), **kwargs)
 
     def _warning(self, fmt, *poargs, log_depth=0, **kwargs):
-        self._log(WARNING, fmt, *poargs, log_depth=(log_depth + 1), **kwargs)
+        if self.__logger.isEnabledFor(WARNING):
+            self._log(WARNING, fmt, *poargs, log_depth=(log_depth + 1),
+                      **kwargs)
 
     def _error(self, fmt, *poargs, log_depth=0, **kwargs):
-        self._log(ERROR, fmt, *poargs, log_depth=(log_depth + 1), **kwargs)
+        if self.__logger.isEnabledFor(ERROR):
+            self._log(ERROR, fmt, *poargs, log_depth=(log_depth + 1), **kwargs)
 
     def _critical(self, fmt, *poargs, log_depth=0, **kwargs):
-        self._log(CRITICAL, fmt, *poargs, log_depth=(log_depth + 1), **kwargs)
+        if self.__logger.isEnabledFor(CRITICAL):
+            self._log(CRITICAL, fmt, *poargs, log_depth=(log_depth + 1),
+                      **kwargs)
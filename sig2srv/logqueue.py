@@ -0,0 +1,125 @@
+"""Non-blocking logging through a bounded queue and a writer thread.
+
+Writing log records to a slow stream, such as a backed-up pipe to a log
+collector, would otherwise block the event loop, and with it the handling
+of signals.  This module is separate from `sig2srv.logging` so that
+`logging.handlers` is imported only when queued logging is used.
+"""
+
+from contextlib import contextmanager
+import logging
+from logging import LogRecord, WARNING
+from logging.handlers import QueueHandler, QueueListener
+from queue import Full, Queue
+from time import monotonic
+
+from .logging import logger
+
+
+class DroppingQueueHandler(QueueHandler):
+    """A `QueueHandler` that drops records instead of blocking.
+
+    Format each record on the logging thread, as `QueueHandler` does, and
+    put it in the queue without waiting; if the queue is full, drop the
+    record and count it in `dropped`.
+
+    :param `queue.Queue` queue: bounded queue.
+    """
+
+    def __init__(self, queue):
+        """Initialize this instance."""
+        super().__init__(queue)
+        self.__dropped = 0
+
+    @property
+    def dropped(self):
+        """Return how many records were dropped because the queue was full."""
+        return self.__dropped
+
+    def enqueue(self, record):
+        """Put *record* in the queue, or drop it if the queue is full."""
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.__dropped += 1
+
+
+class _QueueListener(QueueListener):
+    """A `QueueListener` that stops within a deadline, or is abandoned."""
+
+    def __init__(self, queue, *handlers):
+        """Initialize this instance."""
+        super().__init__(queue, *handlers)
+        self.__abandoned = False
+
+    def handle(self, record):
+        """Pass *record* to the handlers, unless abandoned."""
+        if not self.__abandoned:
+            super().handle(record)
+
+    def abandon(self):
+        """Leave the thread to drop the rest of the records.
+
+        Detach the handlers from `logging.shutdown()`, which would otherwise
+        wait forever for a lock the thread holds while blocked in a handler.
+        """
+        self.__abandoned = True
+        for ref in list(logging._handlerList):
+            if ref() in self.handlers:
+                logging._removeHandlerRef(ref)
+
+    def stop(self, timeout=None):
+        """Stop the thread after it has handled the queued records.
+
+        Wait at most *timeout* seconds, or indefinitely if `None`, for room
+        for the stop sentinel in the queue and for the thread to finish.
+
+        :return: whether the thread finished.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        try:
+            self.queue.put(self._sentinel, timeout=timeout)
+        except Full:
+            return False
+        if deadline is not None:
+            timeout = max(0, deadline - monotonic())
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            return False
+        self._thread = None
+        return True
+
+
+@contextmanager
+def queued_handler(handler, capacity=1000, timeout=5):
+    """Run the ``with`` statement block with a thread writing to *handler*.
+
+    Yield a `DroppingQueueHandler` that buffers up to *capacity* records for
+    a background thread to pass to *handler*.  Upon exit, wait for the
+    thread to write the buffered records, then report to *handler* how many
+    records were dropped, if any.  If *handler* is still blocked after
+    *timeout* seconds, abandon the (daemon) thread instead, leaving it to
+    drop the remaining records, and detach *handler* from
+    `logging.shutdown()`, so that a stuck stream cannot prevent exiting.
+
+    :param `logging.Handler` handler: handler to write records to.
+    :param `int` capacity: how many records to buffer.
+    :param `float` timeout: seconds to wait for the buffered records to be
+        written upon exit, or `None` to wait indefinitely.
+    """
+    queue = Queue(capacity)
+    queue_handler = DroppingQueueHandler(queue)
+    listener = _QueueListener(queue, handler)
+    listener.start()
+    try:
+        yield queue_handler
+    finally:
+        if listener.stop(timeout):
+            if queue_handler.dropped:
+                handler.handle(LogRecord(
+                    logger.name, WARNING, __file__, 0,
+                    "dropped %d log records because the log queue was full",
+                    (queue_handler.dropped,), None))
+            handler.flush()
+        else:
+            listener.abandon()
@@ -0,0 +1,314 @@
+"""Prometheus-style metrics.
+
+Collect metrics in `Registry` instances, such as `Metrics`, and expose them
+in the Prometheus text format through a `MetricsServer` or with
+`write_textfile()`.  Both take a cheap snapshot of the metrics in the event
+loop and format it in an executor, so that scrapes do not block the event
+loop.
+"""
+
+from asyncio import coroutine, get_event_loop, start_server
+import asyncio
+from bisect import bisect_left
+import os
+
+from ctorrepr import CtorRepr
+
+from .asynchelper import WithEventLoop
+from .logging import WithLog
+
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+"""Default `Histogram` bucket upper bounds, in seconds."""
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+"""MIME type of the Prometheus text format."""
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('\n', r'\n')
+            .replace('"', r'\"'))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, _escape(value))
+                          for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A family of monotonically increasing counters.
+
+    :param `str` name: metric name.
+    :param `str` help: metric description.
+    :param labelnames: names of the labels that tell counters apart.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        """Initialize this instance."""
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.__values = {}
+
+    def inc(self, *labelvalues, amount=1):
+        """Increment the counter with the given label values."""
+        assert len(labelvalues) == len(self.labelnames)
+        self.__values[labelvalues] = (self.__values.get(labelvalues, 0) +
+                                      amount)
+
+    def value(self, *labelvalues):
+        """Return the counter with the given label values."""
+        return self.__values.get(labelvalues, 0)
+
+    def snapshot(self):
+        """Return a copy of the values, for `render()`."""
+        return dict(self.__values)
+
+    def render(self, snapshot):
+        """Yield the sample lines of a `snapshot()`."""
+        for labelvalues, value in sorted(snapshot.items()):
+            yield '{}{} {}'.format(
+                self.name, _format_labels(self.labelnames, labelvalues),
+                _format_value(value))
+
+
+class Histogram:
+    """A family of histograms with fixed buckets.
+
+    :param `str` name: metric name.
+    :param `str` help: metric description.
+    :param labelnames: names of the labels that tell histograms apart.
+    :param buckets: upper bounds of the buckets, in increasing order; an
+        implicit ``+Inf`` bucket follows.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Initialize this instance."""
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.__values = {}  # labelvalues -> [counts, sum]
+
+    def observe(self, value, *labelvalues):
+        """Record *value* in the histogram with the given label values."""
+        assert len(labelvalues) == len(self.labelnames)
+        entry = self.__values.get(labelvalues)
+        if entry is None:
+            entry = self.__values[labelvalues] = [[0] * len(self.buckets), 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def count(self, *labelvalues):
+        """Return the number of values recorded with the label values."""
+        entry = self.__values.get(labelvalues)
+        return 0 if entry is None else sum(entry[0])
+
+    def sum(self, *labelvalues):
+        """Return the sum of values recorded with the label values."""
+        entry = self.__values.get(labelvalues)
+        return 0 if entry is None else entry[1]
+
+    def snapshot(self):
+        """Return a copy of the values, for `render()`."""
+        return {labelvalues: (list(counts), total)
+                for labelvalues, (counts, total) in self.__values.items()}
+
+    def render(self, snapshot):
+        """Yield the sample lines of a `snapshot()`."""
+        for labelvalues, (counts, total) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield '{}_bucket{} {}'.format(
+                    self.name,
+                    _format_labels(self.labelnames, labelvalues,
+                                   [('le', _format_value(float(bound)))]),
+                    cumulative)
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield '{}_sum{} {}'.format(self.name, labels,
+                                       _format_value(float(total)))
+            yield '{}_count{} {}'.format(self.name, labels, cumulative)
+
+
+class Registry:
+    """A collection of metrics."""
+
+    def __init__(self):
+        """Initialize this instance."""
+        self.__metrics = []
+
+    def register(self, metric):
+        """Add *metric*, and return it."""
+        self.__metrics.append(metric)
+        return metric
+
+    def snapshot(self):
+        """Return a copy of the values of all the metrics.
+
+        Pass the copy to `render_snapshot()`.
+        """
+        return [(metric, metric.snapshot()) for metric in self.__metrics]
+
+    @staticmethod
+    def render_snapshot(snapshot):
+        """Return a `snapshot()` in the Prometheus text format.
+
+        Safe to call from another thread.
+        """
+        lines = []
+        for metric, values in snapshot:
+            lines.append('# HELP {} {}'.format(
+                metric.name, metric.help.replace('\\', r'\\')
+                .replace('\n', r'\n')))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+            lines.extend(metric.render(values))
+        return '\n'.join(lines) + '\n'
+
+    def render(self):
+        """Return all the metrics in the Prometheus text format."""
+        return self.render_snapshot(self.snapshot())
+
+
+class Metrics(Registry):
+    """The metrics of sig2srv."""
+
+    def __init__(self):
+        """Initialize this instance."""
+        super().__init__()
+        self.command_duration = self.register(Histogram(
+            'sig2srv_command_duration_seconds',
+            "Time spent running service commands.", ('service', 'verb')))
+        self.commands = self.register(Counter(
+            'sig2srv_commands_total', "Service commands run, by outcome.",
+            ('service', 'verb', 'outcome')))
+        self.lock_wait = self.register(Histogram(
+            'sig2srv_lock_wait_seconds',
+            "Time service commands spent waiting for earlier ones.",
+            ('service',)))
+        self.status_checks = self.register(Counter(
+            'sig2srv_status_checks_total', "Status checks, by outcome.",
+            ('service', 'outcome')))
+        self.state_transitions = self.register(Counter(
+            'sig2srv_state_transitions_total',
+            "Transitions into each Sig2Srv state.", ('service', 'state')))
+
+
+class MetricsServer(WithEventLoop, WithLog, CtorRepr):
+    """A minimal HTTP server for the Prometheus text format.
+
+    Serve the metrics in *registry* in response to any request, over a Unix
+    socket if *path* is given, or over TCP on *host* and *port* otherwise.
+
+    :param `Registry` registry: metrics to serve.
+    :param `str` path: optional Unix socket path.
+    :param `str` host: address to listen on; defaults to localhost.
+    :param `int` port: TCP port to listen on.
+    """
+
+    MAX_REQUEST_LINES = 100
+
+    def __init__(self, *poargs, registry, path=None, host='127.0.0.1',
+                 port=None, **kwargs):
+        """Initialize this instance."""
+        super().__init__(*poargs, **kwargs)
+        assert (path is None) != (port is None)
+        self.__registry = registry
+        self.__path = path
+        self.__host = host
+        self.__port = port
+        self.__server = None
+
+    def _collect_repr_args(self, poargs, kwargs):
+        super()._collect_repr_args(poargs, kwargs)
+        kwargs.update(registry=self.__registry, path=self.__path,
+                      host=self.__host, port=self.__port)
+
+    @property
+    def sockets(self):
+        """Return the listening sockets, or `None` if not started."""
+        return None if self.__server is None else self.__server.sockets
+
+    @coroutine
+    def start(self):
+        """Start listening."""
+        if self.__path is not None:
+            self.__server = yield from asyncio.start_unix_server(
+                self.__handle, self.__path, loop=self.loop)
+        else:
+            self.__server = yield from start_server(
+                self.__handle, self.__host, self.__port, loop=self.loop)
+        self._debug("listening on {}", self.__server.sockets)
+
+    @coroutine
+    def close(self):
+        """Stop listening."""
+        if self.__server is not None:
+            self.__server.close()
+            yield from self.__server.wait_closed()
+            self.__server = None
+            if self.__path is not None:
+                try:
+                    os.unlink(self.__path)
+                except FileNotFoundError:
+                    pass
+
+    @coroutine
+    def __handle(self, reader, writer):
+        try:
+            for i in range(self.MAX_REQUEST_LINES):
+                line = yield from reader.readline()
+                if line in (b'', b'\n', b'\r\n'):
+                    break
+            snapshot = self.__registry.snapshot()
+            body = (yield from self.loop.run_in_executor(
+                None, self.__registry.render_snapshot, snapshot)).encode()
+            writer.write('HTTP/1.0 200 OK\r\n'
+                         'Content-Type: {}\r\n'
+                         'Content-Length: {}\r\n'
+                         '\r\n'.format(CONTENT_TYPE, len(body)).encode())
+            writer.write(body)
+            yield from writer.drain()
+        except (ConnectionError, ValueError) as e:
+            self._debug("dropping client: {!r}", e)
+        finally:
+            writer.close()
+
+
+def _write_atomically(path, text):
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+@coroutine
+def write_textfile(registry, path, *, loop=None):
+    """Write the metrics in *registry* to a file, for a textfile collector.
+
+    Write to a temporary file and rename it over *path*, so that readers
+    never see a partial file.  Format and write in an executor.
+
+    :param `Registry` registry: metrics to write.
+    :param `str` path: file to write; should end in ``.prom``.
+    :param loop: `asyncio` loop whose executor to use.
+    """
+    if loop is None:
+        loop = get_event_loop()
+    snapshot = registry.snapshot()
+    yield from loop.run_in_executor(
+        None, lambda: _write_atomically(path,
+                                        registry.render_snapshot(snapshot)))
@@ -2,69 +2,557 @@
 
 """Main module."""
 
-from asyncio import Event, Lock, coroutine, create_subprocess_exec
+from abc import ABCMeta, abstractmethod
+from asyncio import (Event, TimeoutError, coroutine, create_subprocess_exec,
+                     shield, wait, wait_for)
+from asyncio.subprocess import DEVNULL, PIPE, STDOUT
 from contextlib import ExitStack
 from enum import Enum
+from functools import partial
+import os
 from signal import SIGTERM, SIGHUP
 
 from ctorrepr import CtorRepr
 
+from .capture import OutputCapture, OutputMode
+from .histogram import LogHistogram
 from .logging import WithLog
-from .asynchelper import periodic_calls, WithEventLoop, signal_handled
+from .asynchelper import (AdaptivePeriodicCaller, MissedTickPolicy,
+                          PriorityLock, periodic_calls, process_exit_watched,
+                          WithEventLoop, signal_handled, stable_phase,
+                          terminate_process_group)
 
 
-class ServiceCommandRunner(WithEventLoop, WithLog, CtorRepr):
+INIT_SCRIPT_DIRS = ('/etc/init.d', '/etc/rc.d', '/usr/local/etc/rc.d')
+"""Directories in which service(8) looks for init scripts, in order."""
+
+SERVICE_PATH = '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'
+"""The ``PATH`` that service(8) passes to init scripts."""
+
+TIMED_OUT = -256
+"""`ServiceBackend.run()` result for commands that timed out.
+
+Distinct from any exit status, including the negative ones of commands
+killed by signals.
+"""
+
+DEFAULT_OUTPUT = {'status': OutputMode.DISCARD}
+"""Default `~sig2srv.capture.OutputMode` of commands, by service(8) verb.
+
+Commands with verbs not listed inherit the output of sig2srv.
+"""
+
+LOW_PRIORITY_VERBS = frozenset(['status'])
+"""service(8) verbs whose commands yield to other queued commands.
+
+Also, identical commands with these verbs that are queued at the same time
+run once and share the result.
+"""
+
+
+def _outcome(result):
+    """Return the metrics label for a `ServiceBackend.run()` result."""
+    if result == TIMED_OUT:
+        return 'timed_out'
+    return 'ok' if result == 0 else 'failed'
+
+
+def find_init_script(name, dirs=INIT_SCRIPT_DIRS):
+    """Find the init script that service(8) would run for a service.
+
+    :param `str` name: service name, such as ``apache``.
+    :param dirs: directories to search, in order.
+    :return: the path to the init script, or `None` if not found.
+    """
+    if not name or name.startswith('.') or '/' in name:
+        return None
+    for dir in dirs:
+        path = os.path.join(dir, name)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def service_env(environ=None):
+    """Return the environment service(8) would pass to an init script.
+
+    Like service(8), keep only the locale and terminal settings, and use a
+    fixed `SERVICE_PATH`.
+
+    :param environ: the environment to scrub; defaults to `os.environ`.
+    :rtype: `dict`
+    """
+    if environ is None:
+        environ = os.environ
+    env = {k: v for k, v in environ.items()
+           if k in ('LANG', 'LANGUAGE', 'TERM') or k.startswith('LC_')}
+    env['PATH'] = SERVICE_PATH
+    return env
+
+
+class ServiceBackend(WithEventLoop, WithLog, CtorRepr, metaclass=ABCMeta):
+    """A way to run service(8)-style commands for one service.
+
+    `Sig2Srv` drives services through this interface.  Subclasses must
+    implement `name` and `run()`, and may override `close()`.  The other
+    methods are shorthands for `run()` with a service(8) verb.
+    """
+
+    @property
+    @abstractmethod
+    def name(self):
+        """Return the service name."""
+
+    @abstractmethod
+    @coroutine
+    def run(self, *args):
+        """Run a command for the service.
+
+        :param args: a service(8) verb such as ``start``, and its arguments.
+        :return: the exit status of the command, or `TIMED_OUT`.
+        """
+
+    @coroutine
+    def close(self):
+        """Release resources held across commands; by default, none."""
+
+    @coroutine
+    def start(self):
+        """Start the service; see `run()`."""
+        return (yield from self.run('start'))
+
+    @coroutine
+    def stop(self):
+        """Stop the service; see `run()`."""
+        return (yield from self.run('stop'))
+
+    @coroutine
+    def restart(self):
+        """Restart the service; see `run()`."""
+        return (yield from self.run('restart'))
+
+    @coroutine
+    def reload(self):
+        """Reload the configuration of the service; see `run()`."""
+        return (yield from self.run('reload'))
+
+    @coroutine
+    def status(self):
+        """Check whether the service is running; see `run()`."""
+        return (yield from self.run('status'))
+
+
+class ServiceCommandRunner(ServiceBackend):
     """Serialized service(8) command runner.
 
     :param `str` name: service name, such as ``apache``.
+    :param `str` init_script: optional path to the init script of the
+        service, as found by `find_init_script()`.  If given, run the init
+        script directly, with the environment that service(8) would give
+        it, instead of running it through service(8), which saves a shell
+        startup per command.  Fall back to service(8) if the init script
+        cannot be run.
+    :param launcher: optional coroutine function with the same signature
+        and contract as `asyncio.create_subprocess_exec()` (the default),
+        used to start commands, such as
+        `~sig2srv.spawn.posix_spawn_exec()`.
+    :param `bool` coprocess: whether to run ``status`` commands through a
+        persistent `~sig2srv.coproc.ShellCoprocess`, instead of starting
+        each of them from scratch.
+    :param `dict` timeouts: optional mapping from service(8) verbs, such as
+        ``status``, to how many seconds to let their commands run.
+    :param `float` kill_grace: seconds to wait between SIGTERM and SIGKILL
+        when killing a command that timed out.
+    :param `dict` output: optional mapping from service(8) verbs to where
+        to send the output of their commands, as
+        `~sig2srv.capture.OutputMode` enums or their values, overriding
+        `DEFAULT_OUTPUT`.
+    :param `int` output_tail: for commands whose output is logged, how many
+        bytes of the output to log again if the command fails.
+    :param `float` output_rate: for commands whose output is logged, how many
+        lines per second to log, on average.
+    :param `int` output_burst: for commands whose output is logged, how many
+        lines to log in a burst.
+    :param `~sig2srv.metrics.Metrics` metrics: optional metrics in which to
+        record command durations, outcomes, and lock wait times.
+    :param `~sig2srv.journal.Journal` journal: optional journal in which to
+        record the start and end of each command.
+    :param `dict` latencies: optional `dict` from verbs to
+        `~sig2srv.histogram.LogHistogram` instances in which to record
+        command run times; may be shared among runners.
+
+    Run one command at a time.  Among queued commands, run ones with verbs
+    in `LOW_PRIORITY_VERBS`, such as ``status``, only after all others, such
+    as ``stop``; merge identical queued ones into one run.
+
+    Start commands that have a timeout in a new session.  When one times out,
+    kill its process group in the background (see
+    `~sig2srv.asynchelper.terminate_process_group()`), and let the next
+    command run right away.
+
+    Log the output of commands through `~sig2srv.capture.OutputCapture`, so
+    that memory use stays bounded.  Keep reading the output of a command in
+    the background after it exits, in case it started a daemon that holds on
+    to the pipe.  The coprocess cannot log output; it discards the output of
+    ``status`` commands unless they inherit it.
+
+    If given *latencies*, record how long commands take to run, not counting
+    time spent queued, in a `~sig2srv.histogram.LogHistogram` per verb (see
+    `latency()`), adding histograms for new verbs to *latencies*.
     """
 
-    def __init__(self, *poargs, name, **kwargs):
+    OUTPUT_LINGER = 0.1
+    """Seconds to keep waiting for the output of a command after it exits."""
+
+    def __init__(self, *poargs, name, init_script=None, launcher=None,
+                 coprocess=False, timeouts=None, kill_grace=5, output=None,
+                 output_tail=4096, output_rate=10, output_burst=50,
+                 metrics=None, journal=None, latencies=None, **kwargs):
         """Initialize this instance."""
         super().__init__(*poargs, **kwargs)
         self.__name = name
-        self.__lock = Lock(loop=self.loop)
+        self.__init_script = init_script
+        self.__launcher = launcher
+        self.__coprocess = bool(coprocess)
+        self.__timeouts = dict(timeouts or {})
+        self.__kill_grace = kill_grace
+        self.__killers = set()
+        self.__output = dict(DEFAULT_OUTPUT)
+        self.__output.update((verb, OutputMode(mode))
+                             for verb, mode in dict(output or {}).items())
+        self.__output_tail = output_tail
+        self.__output_rate = output_rate
+        self.__output_burst = output_burst
+        self.__captures = set()
+        self.__metrics = metrics
+        self.__journal = journal
+        self.__latencies = latencies  # verb -> LogHistogram, or None
+        self.__shell = None
+        self.__env = None if init_script is None else service_env()
+        self.__lock = PriorityLock(loop=self.loop)
+        self.__merged = {}  # args -> queued task shared by identical runs
 
     def _collect_repr_args(self, poargs, kwargs):
         super()._collect_repr_args(poargs, kwargs)
-        kwargs.update(name=self.__name)
+        kwargs.update(name=self.__name, init_script=self.__init_script,
+                      launcher=self.__launcher, coprocess=self.__coprocess,
+                      timeouts=self.__timeouts, kill_grace=self.__kill_grace,
+                      output=self.__output, output_tail=self.__output_tail,
+                      output_rate=self.__output_rate,
+                      output_burst=self.__output_burst,
+                      metrics=self.__metrics, journal=self.__journal,
+                      latencies=self.__latencies)
 
     @property
     def name(self):
         """Return the service name."""
         return self.__name
 
+    @property
+    def init_script(self):
+        """Return the init script run directly, or `None` if not used."""
+        return self.__init_script
+
+    @property
+    def latencies(self):
+        """Return the *latencies* `dict` given, or `None`."""
+        return self.__latencies
+
+    def latency(self, verb):
+        """Return the histogram of run times of commands with *verb*.
+
+        :param `str` verb: service(8) verb, such as ``status``.
+        :return: a `~sig2srv.histogram.LogHistogram` of seconds, or `None` if
+            not recording *latencies*, or no command with *verb* has run yet.
+        """
+        if self.__latencies is None:
+            return None
+        return self.__latencies.get(verb)
+
     @coroutine
     def run(self, *args):
-        """Run ``service <name> <args>``.
+        """Run ``service <name> <args>``, or ``<init_script> <args>``.
 
         Do not permit concurrent runs: If another one is already running, wait
         for it to finish.
 
         :param args: arguments to put after ``service <name>``.
             Its first element should be a service(8) verb such as ``start``.
-        :return: the exit status of the given command.
+        :return: the exit status of the given command, or `TIMED_OUT`.
         """
-        yield from self.__lock.acquire()
+        if args[:1] and args[0] in LOW_PRIORITY_VERBS:
+            task = self.__merged.get(args)
+            if task is None:
+                task = self.loop.create_task(self.__run(1, *args))
+                self.__merged[args] = task
+            else:
+                self._debug("merging {} into the queued one", args)
+            return (yield from shield(task, loop=self.loop))
+        return (yield from self.__run(0, *args))
+
+    @coroutine
+    def __run(self, priority, *args):
+        timeout = self.__timeouts.get(args[0]) if args else None
+        output = (self.__output.get(args[0], OutputMode.INHERIT) if args else
+                  OutputMode.INHERIT)
+        queued = self.loop.time()
+        yield from self.__lock.acquire(priority)
+        started = self.loop.time()
+        self.__merged.pop(args, None)  # no longer queued
+        if self.__journal is not None:
+            self.__journal.command_start(self.__name, args)
+        status = None  # for the journal, if the command completes
+        outcome = 'error'
         try:
-            args = ('service', self.__name) + args
-            self._debug("running {}", args)
-            proc = yield from create_subprocess_exec(*args, loop=self.loop)
-            result = yield from proc.wait()
+            if self.__coprocess and args[:1] == ('status',):
+                result = yield from self.__run_in_shell(timeout, *args)
+            else:
+                proc = yield from self.__exec(
+                    *args, new_session=timeout is not None, output=output)
+                capture = task = None
+                if output == OutputMode.LOG:
+                    capture, task = self.__capture(proc, args)
+                result = yield from self.__wait(proc, timeout, args)
+                if capture is not None:
+                    yield from self.__report(capture, task, args, result)
             self._debug("{} returned {}", args, result)
+            outcome = _outcome(result)
+            status = result
             return result
         finally:
             self.__lock.release()
+            verb = args[0] if args else ''
+            duration = self.loop.time() - started
+            if self.__latencies is not None:
+                latency = self.__latencies.get(verb)
+                if latency is None:
+                    latency = self.__latencies[verb] = LogHistogram()
+                latency.record(duration)
+            if self.__journal is not None:
+                self.__journal.command_end(self.__name, args, status,
+                                           duration)
+            if self.__metrics is not None:
+                self.__metrics.lock_wait.observe(started - queued,
+                                                 self.__name)
+                self.__metrics.command_duration.observe(duration,
+                                                        self.__name, verb)
+                self.__metrics.commands.inc(self.__name, verb, outcome)
+
+    @coroutine
+    def close(self):
+        """Release resources held across commands, such as the coprocess.
+
+        Also wait for commands that timed out to be killed.
+        """
+        if self.__shell is not None:
+            yield from self.__shell.close()
+            self.__shell = None
+        while self.__killers:
+            yield from self.__killers.pop()
+        if self.__captures:
+            for task in self.__captures:
+                task.cancel()
+            yield from wait(self.__captures, loop=self.loop)
+
+    def __kill_in_background(self, coro):
+        task = self.loop.create_task(coro)
+        self.__killers.add(task)
+        task.add_done_callback(self.__killers.discard)
+
+    def __capture(self, proc, args):
+        capture = OutputCapture(log=partial(self.__log_output, args[0]),
+                                tail=self.__output_tail,
+                                rate=self.__output_rate,
+                                burst=self.__output_burst, loop=self.loop)
+        task = self.loop.create_task(capture.consume(proc.stdout))
+        self.__captures.add(task)
+        task.add_done_callback(self.__captures.discard)
+        return capture, task
+
+    def __log_output(self, verb, line):
+        self._info("{}: {}", verb, line)
+
+    @coroutine
+    def __report(self, capture, task, args, result):
+        try:
+            # Give the last output a moment to arrive, but do not wait for
+            # daemons that hold on to the pipe.
+            yield from wait_for(shield(task, loop=self.loop),
+                                self.OUTPUT_LINGER, loop=self.loop)
+        except TimeoutError:
+            pass
+        if result != 0:
+            self._warning("{} returned {}, last output:\n{}",
+                          args, result, capture.tail)
+
+    @coroutine
+    def __wait(self, proc, timeout, args):
+        if timeout is None:
+            return (yield from proc.wait())
+        try:
+            return (yield from wait_for(shield(proc.wait(), loop=self.loop),
+                                        timeout, loop=self.loop))
+        except TimeoutError:
+            self._warning("{} timed out after {} seconds, killing it",
+                          args, timeout)
+            self.__kill_in_background(terminate_process_group(
+                proc, self.__kill_grace, loop=self.loop))
+            return TIMED_OUT
+
+    @coroutine
+    def __run_in_shell(self, timeout, *args):
+        if (self.__init_script is not None and
+                not os.access(self.__init_script, os.X_OK)):
+            self._warning("cannot run {}, falling back to service(8)",
+                          self.__init_script)
+            self.__init_script = None
+            self._invalidate_log_header()
+            if self.__shell is not None:
+                # Not `close()`, which also waits for killers and cancels
+                # the output capture of other commands.
+                shell, self.__shell = self.__shell, None
+                yield from shell.close()
+        if self.__shell is None:
+            # Deferred, so as not to slow down startup without a coprocess.
+            from .coproc import ShellCoprocess
+            inherit = (self.__output.get('status', OutputMode.INHERIT) ==
+                       OutputMode.INHERIT)
+            self.__shell = ShellCoprocess(
+                env=self.__env, stderr=None if inherit else DEVNULL,
+                loop=self.loop)
+        if self.__init_script is not None:
+            cmd = (self.__init_script,) + args
+        else:
+            cmd = ('service', self.__name) + args
+        self._debug("running {} in {!r}", cmd, self.__shell)
+        try:
+            return (yield from wait_for(self.__shell.run(*cmd), timeout,
+                                        loop=self.loop))
+        except TimeoutError:
+            self._warning("{} timed out after {} seconds, killing {!r}",
+                          args, timeout, self.__shell)
+            shell, self.__shell = self.__shell, None
+            self.__kill_in_background(shell.kill(self.__kill_grace))
+            return TIMED_OUT
+
+    @coroutine
+    def __exec(self, *args, new_session=False, output=OutputMode.INHERIT):
+        launch = self.__launcher or create_subprocess_exec
+        # Pass optional arguments only if needed, so that simpler launchers
+        # keep working without timeouts or redirection.
+        kwargs = dict(start_new_session=True) if new_session else {}
+        if output == OutputMode.DISCARD:
+            kwargs.update(stdout=DEVNULL, stderr=DEVNULL)
+        elif output == OutputMode.LOG:
+            kwargs.update(stdout=PIPE, stderr=STDOUT)
+        if self.__init_script is not None:
+            cmd = (self.__init_script,) + args
+            self._debug("running {}", cmd)
+            try:
+                return (yield from launch(*cmd, loop=self.loop,
+                                          env=self.__env, **kwargs))
+            except OSError as e:
+                self._warning("cannot run {}, "
+                              "falling back to service(8): {}",
+                              self.__init_script, e)
+                self.__init_script = None
+                self._invalidate_log_header()
+        cmd = ('service', self.__name) + args
+        self._debug("running {}", cmd)
+        return (yield from launch(*cmd, loop=self.loop, **kwargs))
+
+
+class RestartStrategy(Enum):
+    """How `Sig2Srv` restarts a service upon SIGHUP."""
+
+    STOP_START = 'stop-start'
+    """Run ``stop`` and then ``start``."""
+
+    RESTART = 'restart'
+    """Run ``restart``."""
+
+    RELOAD = 'reload'
+    """Run ``reload``; keep the service running even if it fails."""
+
+    RELOAD_OR_RESTART = 'reload-or-restart'
+    """Run ``reload``, and ``restart`` if it fails, e.g. if unsupported."""
 
 
 class FatalError(RuntimeError):
     """Fatal errors that abort the execution of the main routine."""
 
 
+def read_pidfile(path):
+    """Read a process ID from a pidfile.
+
+    :param `str` path: pidfile path.
+    :return: the process ID found on the first line.
+    :rtype: `int`
+    :raise `OSError`: if the pidfile cannot be read.
+    :raise `ValueError`: if the pidfile does not contain a valid process ID.
+    """
+    with open(path) as f:
+        pid = int(f.readline())
+    if pid <= 0:
+        raise ValueError("invalid process ID {!r}".format(pid))
+    return pid
+
+
 class Sig2Srv(WithLog, CtorRepr):
     """Signal-to-service bridge.
 
-    :param `ServiceCommandRunner` runner: service command runner.
+    :param `ServiceBackend` runner: service backend, such as a
+        `ServiceCommandRunner`.
+    :param `~sig2srv.asynchelper.SignalFanOut` signals: optional signal
+        fan-out through which to receive signals, so that multiple bridges
+        can share one event loop.  If not given, install signal handlers
+        directly into the event loop of *runner*.
+    :param `str` pidfile: optional pidfile of the main process of the
+        service.  If given, after each successful start, watch the exit of
+        the process named in the pidfile (see
+        `~sig2srv.asynchelper.process_exit_watched()`) instead of running
+        periodic status commands.  Fall back to status commands if the
+        process cannot be watched.
+    :param `float` status_period: how often to run status commands, in
+        seconds.
+    :param `float` status_max_period: if given, back the status period off
+        exponentially by the factor *status_backoff* while the service keeps
+        running, up to this many seconds.  Drop back to *status_period* after
+        a (re)start or a failed status command.
+    :param `float` status_backoff: see *status_max_period*.
+    :param `bool` status_spread: whether to offset status commands within
+        *status_period* by a phase derived from the service name (see
+        `~sig2srv.asynchelper.stable_phase()`), so that bridges started
+        together do not run their status commands in lockstep.
+    :param `float` status_jitter: optional bound of a random delay, in
+        seconds, to add to each status command.
+    :param `float` restart_debounce: how long to wait, in seconds, for SIGHUP
+        to stop arriving before restarting the service.
+    :param `RestartStrategy` restart_strategy: how to restart the service;
+        also accepts the strategy values, such as ``'reload'``.
+    :param `~sig2srv.metrics.Metrics` metrics: optional metrics in which to
+        record status check outcomes and state transitions.
+    :param `~sig2srv.journal.Journal` journal: optional journal in which to
+        record state transitions and signals.
+    :param `~sig2srv.histogram.LogHistogram` status_lateness: optional
+        histogram in which to record status lateness; may be shared among
+        bridges (see `status_lateness`).
+
+    Handle signals one at a time, coalescing the ones that arrive meanwhile:
+    Any number of SIGHUPs arriving while the service is being restarted, or
+    within *restart_debounce* of each other, cause one restart.  A SIGTERM
+    overrides pending restarts.
+
+    Treat a status command that timed out (see `TIMED_OUT`) as
+    inconclusive: keep the service running and check again soon.  Treat a
+    start or stop command that timed out as failed.
+
+    If status commands fall behind by whole periods, e.g. after the host
+    was suspended, run one status command for all the missed ones instead of
+    a burst of them (see `~sig2srv.asynchelper.MissedTickPolicy.COALESCE`).
+
+    If given *status_lateness*, record in it how late status commands
+    start, relative to their schedule.
     """
 
     class State(Enum):
@@ -75,17 +563,52 @@ class Sig2Srv(WithLog, CtorRepr):
         RUNNING = 2
         STOPPING = 3
         UNKNOWN = 4
-
-    def __init__(self, *poargs, runner, **kwargs):
+        RESTARTING = 5
+        RELOADING = 6
+
+    def __init__(self, *poargs, runner, signals=None, pidfile=None,
+                 status_period=5, status_max_period=None, status_backoff=2,
+                 status_spread=False, status_jitter=0, restart_debounce=0,
+                 restart_strategy=RestartStrategy.STOP_START, metrics=None,
+                 journal=None, status_lateness=None, **kwargs):
         """Initialize this instance."""
         super().__init__(*poargs, **kwargs)
         self.__runner = runner
+        self.__signals = signals
+        self.__pidfile = pidfile
+        self.__status_period = status_period
+        self.__status_max_period = status_max_period
+        self.__status_backoff = status_backoff
+        self.__status_spread = bool(status_spread)
+        self.__status_jitter = status_jitter
+        self.__restart_debounce = restart_debounce
+        self.__restart_strategy = RestartStrategy(restart_strategy)
+        self.__metrics = metrics
+        self.__journal = journal
+        self.__status_caller = None
+        self.__status_lateness = status_lateness
+        self.__pending_action = None
+        self.__last_request = None
+        self.__wakeup = Event(loop=runner.loop)
+        self.__actor = None
+        self.__liveness = ExitStack()
+        self.__watched = False
         self.__finished = Event(loop=runner.loop)
         self.__state = self.State.STOPPED
 
     def _collect_repr_args(self, poargs, kwargs):
         super()._collect_repr_args(poargs, kwargs)
-        kwargs.update(runner=self.__runner)
+        kwargs.update(runner=self.__runner, signals=self.__signals,
+                      pidfile=self.__pidfile,
+                      status_period=self.__status_period,
+                      status_max_period=self.__status_max_period,
+                      status_backoff=self.__status_backoff,
+                      status_spread=self.__status_spread,
+                      status_jitter=self.__status_jitter,
+                      restart_debounce=self.__restart_debounce,
+                      restart_strategy=self.__restart_strategy,
+                      metrics=self.__metrics, journal=self.__journal,
+                      status_lateness=self.__status_lateness)
 
     @property
     def state(self):
@@ -97,9 +620,18 @@ class Sig2Srv(WithLog, CtorRepr):
 
     @property
     def runner(self):
-        """Return the `ServiceCommandRunner` for this instance."""
+        """Return the `ServiceBackend` for this instance."""
         return self.__runner
 
+    @property
+    def status_lateness(self):
+        """Return the `~sig2srv.histogram.LogHistogram` of status lateness.
+
+        Record in it, in seconds, how late each periodic status command
+        started relative to its schedule.  Return `None` if not given one.
+        """
+        return self.__status_lateness
+
     @property
     def __state(self):
         return self.__state_
@@ -108,9 +640,50 @@ class Sig2Srv(WithLog, CtorRepr):
     def __state(self, new_state):
         self._debug("new state is {}", new_state)
         self.__state_ = new_state
-
-    def __signal_handled(self, *poargs, **kwargs):
-        return signal_handled(*poargs, loop=self.__runner.loop, **kwargs)
+        if self.__metrics is not None:
+            self.__metrics.state_transitions.inc(self.__runner.name,
+                                                 new_state.name.lower())
+        if self.__journal is not None:
+            self.__journal.state(self.__runner.name, new_state)
+
+    def __signal_handled(self, signum, handler):
+        if self.__signals is None:
+            return signal_handled(signum, handler, loop=self.__runner.loop)
+        return self.__signals.handled(signum, handler)
+
+    def __watch(self):
+        self.__unwatch()
+        if self.__pidfile is None:
+            return
+        try:
+            pid = read_pidfile(self.__pidfile)
+            self.__liveness.enter_context(process_exit_watched(
+                pid, self.__handle_exit, loop=self.__runner.loop))
+        except (OSError, ValueError) as e:
+            self._warning("cannot watch main process, "
+                          "falling back to status commands: {}", e)
+            return
+        self.__watched = True
+        self._debug("watching main process {}", pid)
+
+    def __unwatch(self):
+        self.__watched = False
+        self.__liveness.close()
+
+    def __handle_exit(self):
+        self._debug("main process exited")
+        self.__unwatch()
+        if self.__state == self.State.RUNNING:
+            try:
+                self.__fatal("service stopped unexpectedly")
+            except FatalError:
+                pass
+
+    @staticmethod
+    def __failure(message, result):
+        if result == TIMED_OUT:
+            return message + " (timed out)"
+        return message
 
     def __fatal(self, *poargs, **kwargs):
         self.__finished.set()
@@ -124,18 +697,32 @@ class Sig2Srv(WithLog, CtorRepr):
     def run(self):
         """Run the state machine."""
         assert self.__state == self.State.STOPPED
+        phase = None
+        if self.__status_spread:
+            phase = stable_phase(self.__runner.name, self.__status_period)
         with ExitStack() as stack:
             sec = stack.enter_context
             sec(self.__signal_handled(SIGTERM, self.__handle_stop_signal))
             sec(self.__signal_handled(SIGHUP, self.__handle_restart_signal))
-            sec(periodic_calls(self.__check_status, 5,
-                               loop=self.__runner.loop))
+            self.__status_caller = sec(periodic_calls(
+                self.__check_status, self.__status_period,
+                max_period=self.__status_max_period,
+                backoff=self.__status_backoff,
+                missed=MissedTickPolicy.COALESCE, phase=phase,
+                jitter=self.__status_jitter,
+                lateness=self.__status_lateness,
+                factory=AdaptivePeriodicCaller, loop=self.__runner.loop))
+            stack.callback(self.__unwatch)
+            stack.callback(self.__cancel_actions)
             self.__state = self.State.STARTING
             result = yield from self.__runner.run('start')
             if result != 0:
                 self.__state = self.State.STOPPED
-                raise FatalError("failed to start service")
+                raise FatalError(self.__failure("failed to start service",
+                                                result))
             self.__state = self.State.RUNNING
+            self.__watch()
+            self.__status_caller.recheck()
             self.__fatal_error = None
             self.__finished.clear()
             self._debug("awaiting finish")
@@ -147,12 +734,68 @@ class Sig2Srv(WithLog, CtorRepr):
 
     @coroutine
     def __check_status(self, timestamp):
+        if self.__watched:
+            return
         result = yield from self.__runner.run('status')
-        if result != 0 and self.__state == self.State.RUNNING:
-            self.__fatal("service stopped unexpectedly")
+        if self.__metrics is not None:
+            self.__metrics.status_checks.inc(self.__runner.name,
+                                             _outcome(result))
+        if result == TIMED_OUT:
+            self._warning("status command timed out, checking again")
+            self.__status_caller.recheck()
+        elif result != 0:
+            if self.__state == self.State.RUNNING:
+                self.__fatal("service stopped unexpectedly")
+            self.__status_caller.recheck()
 
     def __handle_stop_signal(self):
-        self.__runner.loop.create_task(self.__stop())
+        if self.__journal is not None:
+            self.__journal.signal(self.__runner.name, SIGTERM)
+        self.__request(self.__stop)
+
+    def __handle_restart_signal(self):
+        if self.__journal is not None:
+            self.__journal.signal(self.__runner.name, SIGHUP)
+        self.__request(self.__restart)
+
+    def __request(self, action):
+        if action == self.__restart:
+            if self.__pending_action == self.__stop:
+                self._debug("stop pending, ignoring restart request")
+                return
+            self.__last_request = self.__runner.loop.time()
+        self.__pending_action = action
+        self.__wakeup.set()
+        if self.__actor is None:
+            self.__actor = self.__runner.loop.create_task(self.__act())
+
+    @coroutine
+    def __act(self):
+        loop = self.__runner.loop
+        try:
+            while self.__pending_action is not None:
+                if self.__pending_action == self.__restart:
+                    delay = (self.__last_request + self.__restart_debounce -
+                             loop.time())
+                    if delay > 0:
+                        self.__wakeup.clear()
+                        try:
+                            yield from wait_for(self.__wakeup.wait(), delay,
+                                                loop=loop)
+                        except TimeoutError:
+                            pass
+                        continue
+                action, self.__pending_action = self.__pending_action, None
+                yield from action()
+        except FatalError:
+            self.__pending_action = None
+        finally:
+            self.__actor = None
+
+    def __cancel_actions(self):
+        self.__pending_action = None
+        if self.__actor is not None:
+            self.__actor.cancel()
 
     @coroutine
     def __stop(self):
@@ -160,29 +803,59 @@ class Sig2Srv(WithLog, CtorRepr):
             self._debug("loop not running, doing nothing")
             return
         self.__state = self.State.STOPPING
+        self.__unwatch()
         result = yield from self.__runner.run('stop')
         if result != 0:
             self.__state = self.State.UNKNOWN
-            self.__fatal("failed to stop service while stopping")
+            self.__fatal(self.__failure(
+                "failed to stop service while stopping", result))
         self.__state = self.State.STOPPED
         self.__finished.set()
 
-    def __handle_restart_signal(self):
-        self.__runner.loop.create_task(self.__restart())
-
     @coroutine
     def __restart(self):
         if self.__state != self.State.RUNNING:
             self._debug("loop not running, doing nothing")
             return
+        strategy = self.__restart_strategy
+        if strategy in (RestartStrategy.RELOAD,
+                        RestartStrategy.RELOAD_OR_RESTART):
+            self.__state = self.State.RELOADING
+            result = yield from self.__runner.run('reload')
+            if result == 0 or strategy == RestartStrategy.RELOAD:
+                if result != 0:
+                    self._warning(self.__failure(
+                        "failed to reload service", result))
+                self.__state = self.State.RUNNING
+                self.__status_caller.recheck()
+                return
+            self._info(self.__failure("failed to reload service, "
+                                      "restarting it instead", result))
+        if strategy != RestartStrategy.STOP_START:
+            self.__state = self.State.RESTARTING
+            self.__unwatch()
+            result = yield from self.__runner.run('restart')
+            if result != 0:
+                self.__state = self.State.UNKNOWN
+                self.__fatal(self.__failure("failed to restart service",
+                                            result))
+            self.__state = self.State.RUNNING
+            self.__watch()
+            self.__status_caller.recheck()
+            return
         self.__state = self.State.STOPPING
+        self.__unwatch()
         result = yield from self.__runner.run('stop')
         if result != 0:
             self.__state = self.State.UNKNOWN
-            self.__fatal("failed to stop service while restarting")
+            self.__fatal(self.__failure(
+                "failed to stop service while restarting", result))
         self.__state = self.State.STARTING
         result = yield from self.__runner.run('start')
         if result != 0:
             self.__state = self.State.STOPPED
-            self.__fatal("failed to start service while restarting")
+            self.__fatal(self.__failure(
+                "failed to start service while restarting", result))
         self.__state = self.State.RUNNING
+        self.__watch()
+        self.__status_caller.recheck()
@@ -0,0 +1,165 @@
+"""`os.posix_spawn()`-based subprocess launcher.
+
+`asyncio.create_subprocess_exec()` forks the supervisor and then execs the
+command in the child, which copies the page tables of the supervisor and
+gets slower as its heap grows.  `posix_spawn_exec()` uses
+`os.posix_spawnp()` instead, which the C library implements with vfork
+semantics where it can, and reaps the child through the child watcher of
+`asyncio`, just like `~asyncio.create_subprocess_exec()` does.
+"""
+
+from asyncio import (Future, StreamReader, StreamReaderProtocol, coroutine,
+                     get_event_loop, shield)
+from asyncio.subprocess import DEVNULL, PIPE, STDOUT
+import asyncio
+import os
+from signal import SIGKILL, SIGTERM
+
+from ctorrepr import CtorRepr
+
+from .asynchelper import WithEventLoop
+from .logging import WithLog
+
+
+def posix_spawn_supported():
+    """Return whether `posix_spawn_exec()` can be used on this platform.
+
+    It requires `os.posix_spawnp()` (Python 3.8 or later) and the child
+    watcher API of `asyncio`.
+    """
+    return (hasattr(os, 'posix_spawnp') and
+            hasattr(asyncio, 'get_child_watcher'))
+
+
+class SpawnedProcess(WithEventLoop, WithLog, CtorRepr):
+    """A child process started by `posix_spawn_exec()`.
+
+    Provide the subset of the `asyncio.subprocess.Process` interface that
+    sig2srv uses.
+
+    :param `int` pid: process ID of the child.
+    :param stdout: optional `asyncio.StreamReader` for the standard output
+        of the child.
+    """
+
+    def __init__(self, *poargs, pid, stdout=None, **kwargs):
+        """Initialize this instance."""
+        super().__init__(*poargs, **kwargs)
+        self.__pid = pid
+        self.stdout = stdout
+        self.__returncode = None
+        self.__exited = Future(loop=self.loop)
+
+    def _collect_repr_args(self, poargs, kwargs):
+        super()._collect_repr_args(poargs, kwargs)
+        kwargs.update(pid=self.__pid)
+
+    @property
+    def pid(self):
+        """Return the process ID of the child."""
+        return self.__pid
+
+    @property
+    def returncode(self):
+        """Return the exit status of the child, or `None` if still running.
+
+        A negative value ``-N`` means that the child was killed by signal
+        ``N``, as with `asyncio.subprocess.Process`.
+        """
+        return self.__returncode
+
+    def _handle_exit(self, pid, returncode):
+        """Child watcher callback."""
+        self._debug("child {} exited with {}", pid, returncode)
+        self.__returncode = returncode
+        if not self.__exited.done():
+            self.__exited.set_result(returncode)
+
+    @coroutine
+    def wait(self):
+        """Wait for the child to exit.
+
+        :return: the exit status of the child (see `returncode`).
+        """
+        return (yield from shield(self.__exited, loop=self.loop))
+
+    def send_signal(self, signum):
+        """Send a signal to the child, unless it has already exited."""
+        if self.__returncode is None:
+            os.kill(self.__pid, signum)
+
+    def terminate(self):
+        """Send SIGTERM to the child."""
+        self.send_signal(SIGTERM)
+
+    def kill(self):
+        """Send SIGKILL to the child."""
+        self.send_signal(SIGKILL)
+
+
+@coroutine
+def posix_spawn_exec(program, *args, loop=None, env=None,
+                     start_new_session=False, stdout=None, stderr=None):
+    """Start a command using `os.posix_spawnp()`.
+
+    A drop-in replacement for `asyncio.create_subprocess_exec()`, with
+    limited support for redirection: the standard input is always
+    inherited, and the standard error cannot be a separate pipe.
+
+    :param `str` program: the program to run; searched in ``PATH``.
+    :param args: arguments to the program.
+    :param loop: `asyncio` loop in which to reap the child.
+    :param `dict` env: environment for the child; defaults to `os.environ`.
+    :param `bool` start_new_session: whether to start the child in a new
+        session, as with `asyncio.create_subprocess_exec()`.
+    :param stdout: `None` (inherit), `~asyncio.subprocess.DEVNULL`, or
+        `~asyncio.subprocess.PIPE`.
+    :param stderr: `None` (inherit), `~asyncio.subprocess.DEVNULL`, or
+        `~asyncio.subprocess.STDOUT`.
+    :return: the started child.
+    :rtype: `SpawnedProcess`
+    :raise `OSError`: if the command cannot be started.
+    """
+    if loop is None:
+        loop = get_event_loop()
+    if env is None:
+        env = os.environ
+    assert stdout in (None, DEVNULL, PIPE)
+    assert stderr in (None, DEVNULL, STDOUT)
+    fds = []  # to close in the parent after spawning
+    read_fd = None
+    file_actions = []
+    try:
+        if DEVNULL in (stdout, stderr):
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            fds.append(devnull)
+        if stdout == PIPE:
+            read_fd, write_fd = os.pipe()
+            fds.append(write_fd)
+            file_actions.append((os.POSIX_SPAWN_DUP2, write_fd, 1))
+        elif stdout == DEVNULL:
+            file_actions.append((os.POSIX_SPAWN_DUP2, devnull, 1))
+        if stderr == STDOUT:
+            file_actions.append((os.POSIX_SPAWN_DUP2, 1, 2))
+        elif stderr == DEVNULL:
+            file_actions.append((os.POSIX_SPAWN_DUP2, devnull, 2))
+        with asyncio.get_child_watcher() as watcher:
+            pid = os.posix_spawnp(program, (program,) + args, env,
+                                  file_actions=file_actions,
+                                  setsid=bool(start_new_session))
+            proc = SpawnedProcess(pid=pid, loop=loop)
+            watcher.add_child_handler(pid, proc._handle_exit)
+    except BaseException:
+        if read_fd is not None:
+            os.close(read_fd)
+        raise
+    finally:
+        for fd in fds:
+            os.close(fd)
+    if read_fd is not None:
+        reader = StreamReader(loop=loop)
+        yield from loop.connect_read_pipe(
+            lambda: StreamReaderProtocol(reader, loop=loop),
+            os.fdopen(read_fd, 'rb', 0))
+        proc.stdout = reader
+    return proc
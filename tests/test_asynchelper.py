@@ -1,14 +1,26 @@
-from asyncio import (CancelledError, Event, Task, coroutine, ensure_future,
-                     get_event_loop, sleep)
-from contextlib import contextmanager
+from asyncio import (CancelledError, DefaultEventLoopPolicy, Event, Task,
+                     coroutine, create_subprocess_exec, ensure_future, gather,
+                     get_event_loop, get_event_loop_policy, set_event_loop,
+                     set_event_loop_policy, sleep)
+from contextlib import closing, contextmanager
+from math import ceil
+import os
+from signal import SIGKILL, SIGTERM
 import sys
-from unittest.mock import MagicMock, patch, ANY
+from unittest.mock import MagicMock, call, patch, ANY
 
 from asynciotimemachine import TimeMachine
 import pytest
 
-from sig2srv.asynchelper import (WithEventLoop, PeriodicCaller, periodic_calls,
-                                 signal_handled)
+from sig2srv.asynchelper import (WithEventLoop, PeriodicCaller,
+                                 AdaptivePeriodicCaller, periodic_calls,
+                                 signal_handled, SignalFanOut,
+                                 process_exit_watched, TimerWheel,
+                                 MissedTickPolicy, OverflowPolicy,
+                                 stable_phase, terminate_process_group,
+                                 PriorityLock, EventLoopKind,
+                                 install_event_loop, uvloop_supported)
+from sig2srv.histogram import LogHistogram
 from tests.eventloopfixture import event_loop
 
 
@@ -27,6 +39,52 @@ class TestWithEventLoop:
             WithEventLoop(loop=1)
 
 
+class TestInstallEventLoop:
+
+    @pytest.fixture(autouse=True)
+    def policy(self):
+        policy = get_event_loop_policy()
+        yield
+        set_event_loop_policy(policy)
+
+    def test_asyncio(self):
+        with closing(install_event_loop('asyncio')) as loop:
+            assert type(get_event_loop_policy()) is DefaultEventLoopPolicy
+            assert get_event_loop() is loop
+            assert WithEventLoop().loop is loop
+
+    @pytest.mark.skipif(not uvloop_supported(),
+                        reason="uvloop is not installed")
+    def test_uvloop(self):
+        import uvloop
+        with closing(install_event_loop(EventLoopKind.UVLOOP)) as loop:
+            assert isinstance(loop, uvloop.Loop)
+            assert get_event_loop() is loop
+            assert WithEventLoop().loop is loop
+
+    def test_default_is_asyncio_without_uvloop(self):
+        with patch('sig2srv.asynchelper.uvloop_supported',
+                   return_value=False):
+            with closing(install_event_loop()):
+                assert (type(get_event_loop_policy()) is
+                        DefaultEventLoopPolicy)
+
+    @pytest.mark.skipif(not uvloop_supported(),
+                        reason="uvloop is not installed")
+    def test_default_is_uvloop_if_installed(self):
+        import uvloop
+        with closing(install_event_loop()) as loop:
+            assert isinstance(loop, uvloop.Loop)
+
+    def test_rejects_unknown_kind(self):
+        with pytest.raises(ValueError):
+            install_event_loop('omg')
+
+    def test_uvloop_supported(self):
+        with patch.dict('sys.modules', uvloop=None):
+            assert not uvloop_supported()
+
+
 class TestPeriodicCaller:
     def test_init_requires_cb_as_poarg_1(self):
         with pytest.raises(TypeError):
@@ -330,6 +388,212 @@ class TestPeriodicCaller:
         assert ([handle.result() for handle in handles] ==
                 list(reversed(range(11))))
 
+    def __stall_test(self, event_loop, missed, stall=3.5):
+        tm = TimeMachine(event_loop=event_loop)
+        called = []
+        def cb(ts):
+            called.append(ts)
+            if len(called) == 2:
+                tm.advance_by(stall)  # stall during the call at start + 1
+        pc = PeriodicCaller(cb, 1, missed=missed, loop=event_loop)
+        start = event_loop.time()
+        pc.start(at=start)
+        run_for(event_loop, tm, 4.4, step=0.1)  # + 3.5 stalled = 7.9
+        pc.stop()
+        return [round(ts - start, 6) for ts in called], pc.missed_ticks
+
+    def test_missed_defaults_to_catch_up(self, event_loop):
+        pc = PeriodicCaller(lambda ts: None, 1, loop=event_loop)
+        assert 'missed=<MissedTickPolicy.CATCH_UP' in repr(pc)
+
+    def test_missed_catch_up(self, event_loop):
+        called, missed = self.__stall_test(event_loop,
+                                           MissedTickPolicy.CATCH_UP)
+        assert called == [0, 1, 2, 3, 4, 5, 6, 7]
+        assert missed == 0
+
+    def test_missed_skip(self, event_loop):
+        called, missed = self.__stall_test(event_loop, MissedTickPolicy.SKIP)
+        assert called == [0, 1, 5, 6, 7]
+        assert missed == 3
+
+    def test_missed_coalesce(self, event_loop):
+        called, missed = self.__stall_test(event_loop, 'coalesce')
+        assert called == [0, 1, 4, 5, 6, 7]
+        assert missed == 2
+
+    @pytest.mark.parametrize('missed', list(MissedTickPolicy))
+    def test_lateness_under_a_period_is_not_a_stall(self, event_loop,
+                                                    missed):
+        # The call at start + 1 overruns into start + 2.3, so the call at
+        # start + 2 is late, but by less than a period.
+        called, missed = self.__stall_test(event_loop, missed, stall=1.3)
+        assert called == [0, 1, 2, 3, 4, 5]
+        assert missed == 0
+
+    def test_init_rejects_bad_missed(self):
+        with pytest.raises(ValueError):
+            PeriodicCaller(lambda ts: None, 1, missed='omg')
+
+    def test_start_aligns_to_phase(self, event_loop):
+        event_loop = MagicMock(spec=event_loop, wraps=event_loop)
+        event_loop.time.return_value = 12345.5
+        pc = PeriodicCaller(lambda: None, 10, phase=3, loop=event_loop)
+        pc.start()
+        event_loop.call_at.assert_called_once_with(12353, ANY)
+
+    def test_start_at_overrides_phase(self, event_loop):
+        event_loop = MagicMock(spec=event_loop, wraps=event_loop)
+        pc = PeriodicCaller(lambda: None, 10, phase=3, loop=event_loop)
+        pc.start(at=12345)
+        event_loop.call_at.assert_called_once_with(12345, ANY)
+
+    def test_phase_spreads_callers_started_together(self, event_loop):
+        tm = TimeMachine(event_loop=event_loop)
+        called = []
+        start = event_loop.time()
+        callers = [PeriodicCaller(called.append, 4,
+                                  phase=stable_phase(name, 4),
+                                  loop=event_loop)
+                   for name in ('apache', 'mysql', 'redis', 'sshd')]
+        for caller in callers:
+            caller.start()
+        run_for(event_loop, tm, 8.1, step=0.1)
+        for caller in callers:
+            caller.stop()
+        assert len(called) == 8
+        offsets = sorted(set(round(ts % 4, 6) for ts in called))
+        assert len(offsets) == 4
+        assert all(start < ts <= start + 8.1 for ts in called)
+
+    @patch('sig2srv.asynchelper.uniform', autospec=True)
+    def test_jitter_delays_calls_without_drift(self, uniform, event_loop):
+        uniform.return_value = 0.5
+        tm = TimeMachine(event_loop=event_loop)
+        called = []
+        def cb(ts):
+            called.append((ts, event_loop.time()))
+        pc = PeriodicCaller(cb, 2, jitter=0.8, loop=event_loop)
+        start = event_loop.time()
+        pc.start(at=start + 1)
+        run_for(event_loop, tm, 6, step=0.1)
+        pc.stop()
+        assert uniform.call_args_list == [call(0, 0.8)] * 4
+        assert [round(ts - start, 6) for ts, now in called] == [1, 3, 5]
+        assert [now - ts for ts, now in called] == pytest.approx(
+            [0.5, 0.5, 0.5], abs=0.15)
+
+    @patch('sig2srv.asynchelper.uniform', autospec=True)
+    def test_lateness_counts_from_jittered_due_time(self, uniform,
+                                                    event_loop):
+        uniform.return_value = 0.5
+        tm = TimeMachine(event_loop=event_loop)
+        lateness = LogHistogram()
+        pc = PeriodicCaller(lambda ts: None, 2, jitter=0.8,
+                            lateness=lateness, loop=event_loop)
+        assert pc.lateness is lateness
+        pc.start(at=event_loop.time() + 1)
+        run_for(event_loop, tm, 6, step=0.1)
+        pc.stop()
+        assert lateness.count == 3
+        assert lateness.max < 0.15
+
+    def test_lateness_is_shared_and_optional(self, event_loop):
+        tm = TimeMachine(event_loop=event_loop)
+        lateness = LogHistogram()
+        pcs = [PeriodicCaller(lambda ts: None, 1, lateness=lateness,
+                              loop=event_loop) for i in range(3)]
+        pcs.append(PeriodicCaller(lambda ts: None, 1, loop=event_loop))
+        for pc in pcs:
+            pc.start()
+        run_for(event_loop, tm, 2.5)
+        for pc in pcs:
+            pc.stop()
+        assert lateness.count == 6
+        assert pcs[-1].lateness is None
+
+    def test_no_jitter_by_default(self, event_loop):
+        event_loop = MagicMock(spec=event_loop, wraps=event_loop)
+        with patch('sig2srv.asynchelper.uniform') as uniform:
+            pc = PeriodicCaller(lambda: None, 10, loop=event_loop)
+            pc.start(at=12345)
+        assert not uniform.call_args_list
+
+    def test_init_asserts_jitter_not_negative(self):
+        with pytest.raises(AssertionError):
+            PeriodicCaller(lambda ts: None, 10, jitter=-1)
+
+    def __overflow_test(self, event_loop, **kwargs):
+        tm = TimeMachine(event_loop=event_loop)
+        started = []
+        tasks = []
+        @coroutine
+        def cb(ts):
+            started.append(ts)
+            yield from sleep(2.25, loop=event_loop)
+        pc = PeriodicCaller(cb, 1, bg=tasks.append, loop=event_loop,
+                            **kwargs)
+        start = event_loop.time()
+        pc.start(at=start)
+        run_for(event_loop, tm, 6.5, step=0.1)
+        pc.stop()
+        self.__inflight = pc.inflight
+        for task in tasks:
+            task.cancel()
+        run_for(event_loop, tm, 1)
+        return [round(ts - start, 6) for ts in started], pc, tasks
+
+    def test_unbounded_inflight_counts_overlaps(self, event_loop):
+        started, pc, tasks = self.__overflow_test(event_loop)
+        assert started == [0, 1, 2, 3, 4, 5, 6]
+        assert pc.overlapping_ticks == 6
+        assert self.__inflight == 2
+        assert pc.skipped_ticks == 0
+
+    def test_overflow_defaults_to_skip(self, event_loop):
+        started, pc, tasks = self.__overflow_test(event_loop, max_inflight=1)
+        assert 'overflow=<OverflowPolicy.SKIP' in repr(pc)
+        assert started == [0, 3, 6]
+        assert pc.skipped_ticks == 4
+        assert pc.overlapping_ticks == 0
+        assert self.__inflight == 1
+
+    def test_overflow_skip_allows_max_inflight(self, event_loop):
+        started, pc, tasks = self.__overflow_test(event_loop, max_inflight=2)
+        assert started == [0, 1, 3, 4, 6]
+        assert pc.skipped_ticks == 2
+        assert pc.overlapping_ticks == 4
+
+    def test_overflow_queue_one(self, event_loop):
+        started, pc, tasks = self.__overflow_test(
+            event_loop, max_inflight=1, overflow=OverflowPolicy.QUEUE_ONE)
+        assert started == [0, 2, 4]
+        assert pc.skipped_ticks == 3
+
+    def test_stop_drops_queued_call(self, event_loop):
+        # The helper cancels the running call after stopping; the call
+        # queued behind it must not start.
+        started, pc, tasks = self.__overflow_test(
+            event_loop, max_inflight=1, overflow='queue_one')
+        assert started == [0, 2, 4]
+        assert len(tasks) == 3
+
+    def test_overflow_cancel_oldest(self, event_loop):
+        started, pc, tasks = self.__overflow_test(
+            event_loop, max_inflight=1, overflow='cancel_oldest')
+        assert started == [0, 1, 2, 3, 4, 5, 6]
+        assert pc.cancelled_ticks == 6
+        assert self.__inflight == 1
+        assert pc.inflight == 0
+
+    def test_init_asserts_max_inflight_positive(self):
+        with pytest.raises(AssertionError):
+            PeriodicCaller(lambda ts: None, 10, max_inflight=0)
+
+    def test_init_rejects_bad_overflow(self):
+        with pytest.raises(ValueError):
+            PeriodicCaller(lambda ts: None, 10, overflow='omg')
+
     @patch('sig2srv.asynchelper.PeriodicCaller', autospec=True)
     def test_periodic_calls(self, cls):
         obj = MagicMock()
@@ -353,6 +617,205 @@ class TestPeriodicCaller:
                 raise RuntimeError("OMG")
         obj.stop.assert_called_once_with()
 
+    def test_periodic_calls_factory(self):
+        factory = MagicMock()
+        with periodic_calls(1, 2, omg=3, at=4, factory=factory) as caller:
+            factory.assert_called_once_with(1, 2, omg=3)
+            assert caller is factory.return_value
+            caller.start.assert_called_once_with(at=4)
+
+
+def run_for(event_loop, tm, duration, step=0.25):
+    """Advance virtual time by *duration*, running the loop every *step*."""
+    for i in range(int(duration / step)):
+        tm.advance_by(step)
+        event_loop.run_until_complete(sleep(0, loop=event_loop))
+
+
+@pytest.mark.parametrize('key', ['apache', 'mysql', ''])
+def test_stable_phase(key):
+    phase = stable_phase(key, 5)
+    assert 0 <= phase < 5
+    assert stable_phase(key, 5) == phase
+    assert stable_phase(key, 10) == pytest.approx(phase * 2)
+
+
+class TestTimerWheel:
+    @pytest.fixture
+    def loop(self, event_loop):
+        return MagicMock(spec=event_loop, wraps=event_loop)
+
+    @pytest.fixture
+    def wheel(self, loop):
+        return TimerWheel(resolution=0.5, loop=loop)
+
+    def test_one_loop_timer_per_bucket(self, wheel, loop):
+        for when in (100.1, 100.2, 100.5, 100.6):
+            wheel.call_at(when, lambda: None)
+        assert loop.call_at.call_args_list == [call(100.5, ANY, ANY),
+                                               call(101.0, ANY, ANY)]
+        assert len(wheel) == 4
+
+    def test_timers_fire_in_order_at_bucket_time(self, event_loop):
+        tm = TimeMachine(event_loop=event_loop)
+        wheel = TimerWheel(resolution=1, loop=event_loop)
+        start = float(ceil(event_loop.time()))
+        fired = []
+        def cb(name):
+            fired.append((name, event_loop.time()))
+        wheel.call_at(start + 1.5, cb, 'b1')
+        wheel.call_at(start + 0.2, cb, 'a1')
+        wheel.call_at(start + 1.1, cb, 'b2')
+        wheel.call_at(start + 0.9, cb, 'a2')
+        run_for(event_loop, tm, 3)
+        assert [name for name, ts in fired] == ['a1', 'a2', 'b1', 'b2']
+        assert [ts - start for name, ts in fired] == pytest.approx(
+            [1, 1, 2, 2], abs=0.3)
+        assert not len(wheel)
+
+    def test_when(self, wheel):
+        assert wheel.call_at(100.1, lambda: None).when() == 100.1
+
+    def test_cancel(self, event_loop):
+        tm = TimeMachine(event_loop=event_loop)
+        wheel = TimerWheel(resolution=1, loop=event_loop)
+        fired = []
+        now = event_loop.time()
+        wheel.call_at(now + 0.5, fired.append, 1)
+        timer = wheel.call_at(now + 0.5, fired.append, 2)
+        timer.cancel()
+        assert timer.cancelled()
+        timer.cancel()
+        run_for(event_loop, tm, 2)
+        assert fired == [1]
+
+    def test_cancelling_last_timer_cancels_loop_timer(self, wheel, loop):
+        handle = MagicMock()
+        loop.call_at.return_value = handle
+        timers = [wheel.call_at(100.1, lambda: None) for i in range(2)]
+        timers[0].cancel()
+        assert not handle.cancel.call_args_list
+        timers[1].cancel()
+        handle.cancel.assert_called_once_with()
+        assert not len(wheel)
+
+    def test_callback_can_cancel_later_timer_in_bucket(self, event_loop):
+        tm = TimeMachine(event_loop=event_loop)
+        wheel = TimerWheel(resolution=1, loop=event_loop)
+        fired = []
+        now = event_loop.time()
+        wheel.call_at(now + 0.5, lambda: later.cancel())
+        later = wheel.call_at(now + 0.5, fired.append, 1)
+        run_for(event_loop, tm, 2)
+        assert not fired
+
+    def test_callback_exception_does_not_stop_others(self, event_loop):
+        tm = TimeMachine(event_loop=event_loop)
+        wheel = TimerWheel(resolution=1, loop=event_loop)
+        fired = []
+        now = event_loop.time()
+        wheel.call_at(now + 0.5, lambda: 1 / 0)
+        wheel.call_at(now + 0.5, fired.append, 1)
+        with patch.object(event_loop, 'call_exception_handler') as ceh:
+            run_for(event_loop, tm, 2)
+        assert fired == [1]
+        ceh.assert_called_once_with(dict(message=ANY, exception=ANY,
+                                         handle=ANY))
+
+    def test_periodic_callers_share_wheel(self, event_loop):
+        tm = TimeMachine(event_loop=event_loop)
+        wheel = TimerWheel(resolution=1, loop=event_loop)
+        called = []
+        start = event_loop.time()
+        callers = [PeriodicCaller(lambda ts, i=i: called.append((i, ts)), 2,
+                                  scheduler=wheel, loop=event_loop)
+                   for i in range(3)]
+        for caller in callers:
+            caller.start(at=start + 1)
+        run_for(event_loop, tm, 4.5)
+        for caller in callers:
+            caller.stop()
+        assert not len(wheel)
+        assert [(i, round(ts - start, 6)) for i, ts in called] == [
+            (0, 1), (1, 1), (2, 1), (0, 3), (1, 3), (2, 3),
+        ]
+
+
+class TestAdaptivePeriodicCaller:
+    def test_max_period_defaults_to_period(self, event_loop):
+        tm = TimeMachine(event_loop=event_loop)
+        called = []
+        pc = AdaptivePeriodicCaller(called.append, 2, loop=event_loop)
+        start = event_loop.time()
+        pc.start(at=start)
+        run_for(event_loop, tm, 9)
+        pc.stop()
+        assert [round(ts - start, 6) for ts in called] == [0, 2, 4, 6, 8]
+
+    def test_period_backs_off_up_to_max_period(self, event_loop):
+        tm = TimeMachine(event_loop=event_loop)
+        called = []
+        pc = AdaptivePeriodicCaller(called.append, 1, max_period=8,
+                                    loop=event_loop)
+        start = event_loop.time()
+        pc.start(at=start)
+        run_for(event_loop, tm, 33)
+        pc.stop()
+        assert [round(ts - start, 6) for ts in called] == [
+            0, 1, 3, 7, 15, 23, 31]
+        assert pc.current_period == 8
+
+    def test_backoff_factor(self, event_loop):
+        tm = TimeMachine(event_loop=event_loop)
+        called = []
+        pc = AdaptivePeriodicCaller(called.append, 1, max_period=100,
+                                    backoff=3, loop=event_loop)
+        start = event_loop.time()
+        pc.start(at=start)
+        run_for(event_loop, tm, 15)
+        pc.stop()
+        assert [round(ts - start, 6) for ts in called] == [0, 1, 4, 13]
+
+    def test_recheck_brings_next_call_forward(self, event_loop):
+        tm = TimeMachine(event_loop=event_loop)
+        called = []
+        pc = AdaptivePeriodicCaller(called.append, 1, max_period=8,
+                                    loop=event_loop)
+        start = event_loop.time()
+        pc.start(at=start)
+        run_for(event_loop, tm, 16)
+        assert [round(ts - start, 6) for ts in called] == [0, 1, 3, 7, 15]
+        pc.recheck()
+        recheck_at = event_loop.time()
+        assert pc.current_period == 1
+        run_for(event_loop, tm, 4)
+        pc.stop()
+        assert ([ts - recheck_at for ts in called[5:]] ==
+                pytest.approx([1, 2, 4], abs=0.01))
+
+    def test_recheck_does_not_postpone_next_call(self, event_loop):
+        tm = TimeMachine(event_loop=event_loop)
+        called = []
+        pc = AdaptivePeriodicCaller(called.append, 4, max_period=8,
+                                    loop=event_loop)
+        start = event_loop.time()
+        pc.start(at=start + 1)
+        pc.recheck()
+        run_for(event_loop, tm, 2)
+        pc.stop()
+        assert [round(ts - start, 6) for ts in called] == [1]
+
+    def test_recheck_while_stopped_does_nothing(self, event_loop):
+        event_loop = MagicMock(spec=event_loop, wraps=event_loop)
+        pc = AdaptivePeriodicCaller(lambda ts: None, 1, max_period=8,
+                                    loop=event_loop)
+        pc.recheck()
+        assert not event_loop.call_at.call_args_list
+
+    def test_init_asserts_max_period_not_less_than_period(self):
+        with pytest.raises(AssertionError):
+            AdaptivePeriodicCaller(lambda ts: None, 2, max_period=1)
+
 
 class TestSignalHandled:
     @pytest.fixture
@@ -394,3 +857,220 @@ class TestSignalHandled:
     def test_loop_is_keyword_only(self):
         with pytest.raises(TypeError):
             signal_handled('SIG', 'HANDLER', 'LOOP')
+
+
+class TestProcessExitWatched:
+    @pytest.fixture
+    def pipe(self):
+        """Pipe whose read end stands in for a pidfd."""
+        r, w = os.pipe()
+        try:
+            yield r, w
+        finally:
+            os.close(w)
+
+    def test_handler_called_on_exit(self, pipe, event_loop):
+        r, w = pipe
+        calls = []
+        with patch('sig2srv.asynchelper.os.pidfd_open', create=True,
+                   return_value=r) as pidfd_open:
+            with process_exit_watched(1234, lambda: calls.append(1),
+                                      loop=event_loop):
+                pidfd_open.assert_called_once_with(1234)
+                event_loop.run_until_complete(sleep(0.01, loop=event_loop))
+                assert not calls
+                os.write(w, b'x')
+                event_loop.run_until_complete(sleep(0.01, loop=event_loop))
+                event_loop.run_until_complete(sleep(0.01, loop=event_loop))
+                assert calls == [1]
+        with pytest.raises(OSError):
+            os.fstat(r)
+
+    def test_handler_removed_on_exit(self, pipe, event_loop):
+        r, w = pipe
+        calls = []
+        with patch('sig2srv.asynchelper.os.pidfd_open', create=True,
+                   return_value=r):
+            with process_exit_watched(1234, lambda: calls.append(1),
+                                      loop=event_loop):
+                pass
+        assert not event_loop.remove_reader(r)
+        assert not calls
+
+    def test_raises_oserror_if_unsupported(self, event_loop):
+        with patch('sig2srv.asynchelper.os', spec=['close']):
+            with pytest.raises(OSError):
+                with process_exit_watched(1234, lambda: None,
+                                          loop=event_loop):
+                    pass
+
+    @pytest.mark.skipif(not hasattr(os, 'pidfd_open'),
+                        reason="pidfd_open() not supported")
+    @pytest.mark.timeout(5)
+    def test_real_process(self, event_loop):
+        from subprocess import Popen
+        proc = Popen(['sleep', '0.1'])
+        try:
+            exited = Event(loop=event_loop)
+            with process_exit_watched(proc.pid, exited.set, loop=event_loop):
+                event_loop.run_until_complete(exited.wait())
+        finally:
+            proc.wait()
+
+
+class TestSignalFanOut:
+    @pytest.fixture
+    def loop(self, event_loop):
+        """Real loop with mocked add/remove_signal_handler()."""
+        loop = MagicMock(spec=event_loop, wraps=event_loop)
+        loop.add_signal_handler = MagicMock()
+        loop.remove_signal_handler = MagicMock()
+        return loop
+
+    @pytest.fixture
+    def fan_out(self, loop):
+        return SignalFanOut(loop=loop)
+
+    def dispatch(self, loop, signum):
+        for (sig, dispatcher, *args), kwargs in \
+                loop.add_signal_handler.call_args_list:
+            if sig == signum:
+                dispatcher(*args)
+
+    def test_installs_one_dispatcher_per_signal(self, fan_out, loop):
+        with fan_out.handled('SIG', 'H1'):
+            loop.add_signal_handler.assert_called_once_with('SIG', ANY, ANY)
+            with fan_out.handled('SIG', 'H2'):
+                loop.add_signal_handler.assert_called_once_with('SIG', ANY,
+                                                                ANY)
+            assert not loop.remove_signal_handler.call_args_list
+        loop.remove_signal_handler.assert_called_once_with('SIG')
+
+    def test_delivers_to_all_handlers(self, fan_out, loop):
+        calls = []
+        with fan_out.handled('SIG', lambda: calls.append(1)), \
+                fan_out.handled('SIG', lambda: calls.append(2)), \
+                fan_out.handled('OTHER', lambda: calls.append(3)):
+            self.dispatch(loop, 'SIG')
+        assert calls == [1, 2]
+
+    def test_stops_delivering_to_removed_handlers(self, fan_out, loop):
+        calls = []
+        with fan_out.handled('SIG', lambda: calls.append(1)):
+            with fan_out.handled('SIG', lambda: calls.append(2)):
+                pass
+            self.dispatch(loop, 'SIG')
+        assert calls == [1]
+
+    def test_handler_exception_does_not_stop_others(self, fan_out, loop):
+        calls = []
+        def bad():
+            raise RuntimeError("OMG")
+        with fan_out.handled('SIG', bad), \
+                fan_out.handled('SIG', lambda: calls.append(2)):
+            self.dispatch(loop, 'SIG')
+        assert calls == [2]
+
+    def test_handler_is_removed_on_exc(self, fan_out, loop):
+        with pytest.raises(RuntimeError):
+            with fan_out.handled('SIG', 'HANDLER'):
+                raise RuntimeError("OMG")
+        loop.remove_signal_handler.assert_called_once_with('SIG')
+
+
+@pytest.mark.timeout(5)
+class TestTerminateProcessGroup:
+
+    @pytest.fixture
+    def loop(self, event_loop):
+        """Event loop to which the child watcher is attached."""
+        old_loop = get_event_loop()
+        set_event_loop(event_loop)
+        try:
+            yield event_loop
+        finally:
+            set_event_loop(old_loop)
+
+    def terminate(self, loop, script, grace=0.5):
+        @coroutine
+        def start_and_terminate():
+            proc = yield from create_subprocess_exec(
+                'sh', '-c', script, start_new_session=True, loop=loop)
+            yield from sleep(0.1, loop=loop)
+            return (yield from terminate_process_group(proc, grace,
+                                                       loop=loop))
+        return loop.run_until_complete(start_and_terminate())
+
+    def test_terminates(self, loop):
+        assert self.terminate(loop, 'sleep 30') == -SIGTERM
+
+    def test_kills_if_terminate_ignored(self, loop):
+        assert self.terminate(
+            loop, "trap '' TERM; while :; do sleep 0.05; done") == -SIGKILL
+
+    def test_returns_status_if_already_exited(self, loop):
+        assert self.terminate(loop, 'exit 3') == 3
+
+
+class TestPriorityLock:
+
+    @pytest.fixture
+    def lock(self, event_loop):
+        return PriorityLock(loop=event_loop)
+
+    def hold(self, lock, event_loop, order, name, priority):
+        @coroutine
+        def hold():
+            yield from lock.acquire(priority)
+            try:
+                order.append(name)
+                yield from sleep(0, loop=event_loop)
+            finally:
+                lock.release()
+        return event_loop.create_task(hold())
+
+    def test_acquire_release(self, lock, event_loop):
+        assert not lock.locked()
+        assert event_loop.run_until_complete(lock.acquire())
+        assert lock.locked()
+        lock.release()
+        assert not lock.locked()
+
+    def test_release_unlocked_raises(self, lock):
+        with pytest.raises(AssertionError):
+            lock.release()
+
+    def test_waiters_go_by_priority_then_fifo(self, lock, event_loop):
+        order = []
+        tasks = [self.hold(lock, event_loop, order, name, priority)
+                 for name, priority in [('a', 1), ('b', 1), ('c', 0),
+                                        ('d', 2), ('e', 0)]]
+        event_loop.run_until_complete(gather(*tasks, loop=event_loop))
+        # 'a' gets the lock right away.
+        assert order == ['a', 'c', 'e', 'b', 'd']
+        assert not lock.locked()
+        assert lock.waiting == 0
+
+    def test_cancelled_waiter_is_skipped(self, lock, event_loop):
+        order = []
+        event_loop.run_until_complete(lock.acquire())
+        tasks = [self.hold(lock, event_loop, order, name, 0)
+                 for name in 'abc']
+        event_loop.run_until_complete(sleep(0, loop=event_loop))
+        tasks[1].cancel()
+        lock.release()
+        event_loop.run_until_complete(gather(*tasks, loop=event_loop,
+                                             return_exceptions=True))
+        assert order == ['a', 'c']
+        assert not lock.locked()
+
+    def test_waiter_cancelled_after_handover_releases(self, lock,
+                                                      event_loop):
+        event_loop.run_until_complete(lock.acquire())
+        task = event_loop.create_task(lock.acquire())
+        event_loop.run_until_complete(sleep(0, loop=event_loop))
+        lock.release()  # hands over to task
+        task.cancel()
+        with pytest.raises(CancelledError):
+            event_loop.run_until_complete(task)
+        assert not lock.locked()
@@ -0,0 +1,79 @@
+from asyncio import StreamReader
+
+from sig2srv.capture import OutputCapture, OutputMode, RingBuffer
+from tests.eventloopfixture import event_loop
+
+
+class TestRingBuffer:
+
+    def test_empty(self):
+        buf = RingBuffer(8)
+        assert len(buf) == 0
+        assert buf.getvalue() == b''
+
+    def test_keeps_everything_until_full(self):
+        buf = RingBuffer(8)
+        buf.write(b'abc')
+        buf.write(b'defgh')
+        assert len(buf) == 8
+        assert buf.getvalue() == b'abcdefgh'
+
+    def test_wraps_around(self):
+        buf = RingBuffer(8)
+        for chunk in (b'abcde', b'fghij', b'kl'):
+            buf.write(chunk)
+        assert len(buf) == 8
+        assert buf.getvalue() == b'efghijkl'
+
+    def test_large_write_keeps_its_end(self):
+        buf = RingBuffer(8)
+        buf.write(b'abc')
+        buf.write(b'0123456789')
+        assert buf.getvalue() == b'23456789'
+        buf.write(b'x')
+        assert buf.getvalue() == b'3456789x'
+
+
+def test_output_mode_values():
+    assert OutputMode('log') is OutputMode.LOG
+
+
+class TestOutputCapture:
+
+    def consume(self, event_loop, *chunks, **kwargs):
+        lines = []
+        capture = OutputCapture(log=lines.append, loop=event_loop, **kwargs)
+        reader = StreamReader(loop=event_loop)
+        for chunk in chunks:
+            reader.feed_data(chunk)
+        reader.feed_eof()
+        event_loop.run_until_complete(capture.consume(reader))
+        return capture, lines
+
+    def test_logs_lines(self, event_loop):
+        capture, lines = self.consume(event_loop, b'one\ntw', b'o\r\n',
+                                      b'\nthree')
+        assert lines == ['one', 'two', '', 'three']
+        assert capture.tail == 'one\ntwo\r\n\nthree'
+
+    def test_truncates_long_lines(self, event_loop):
+        capture, lines = self.consume(event_loop, b'x' * 10000, b'x\nok\n',
+                                      max_line=16)
+        assert lines == ['x' * 16 + ' [truncated]', 'ok']
+
+    def test_tail_is_bounded(self, event_loop):
+        chunks = [b'line %d\n' % i for i in range(100000)]
+        capture, lines = self.consume(event_loop, *chunks, tail=64,
+                                      rate=0, burst=0)
+        assert len(capture.tail) == 64
+        assert capture.tail.endswith('line 99999\n')
+
+    def test_rate_limits_lines(self, event_loop):
+        capture, lines = self.consume(event_loop, b'a\n' * 1000, rate=0,
+                                      burst=3)
+        assert lines == ['a', 'a', 'a', '(997 lines suppressed)']
+        assert capture.suppressed == 997
+
+    def test_decodes_invalid_utf8(self, event_loop):
+        capture, lines = self.consume(event_loop, b'\xff\n')
+        assert lines == ['�']
@@ -0,0 +1,98 @@
+from asyncio import get_event_loop_policy, set_event_loop_policy
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from sig2srv import cli
+from sig2srv.logging import logger
+
+IMPORT_TIME_BUDGET = 0.012
+"""Seconds that importing `sig2srv.cli` may add to its stdlib baseline."""
+
+OWN_IMPORT_TIME_BUDGET = 0.005
+"""Seconds that the `sig2srv` modules themselves may take to import."""
+
+BASELINE = 'import argparse, asyncio, logging'
+"""Imports that `sig2srv.cli` cannot do without."""
+
+DEFERRED = ('sig2srv.metrics', 'sig2srv.spawn', 'sig2srv.coproc',
+            'sig2srv.journal', 'sig2srv.logqueue', 'uvloop')
+"""Modules that `sig2srv.cli` should import only when used."""
+
+importtime = pytest.mark.skipif(sys.version_info < (3, 7),
+                                reason="-X importtime requires Python 3.7")
+
+
+def import_times(code):
+    """Return the self import time of each module imported by *code*."""
+    top = os.path.dirname(os.path.dirname(os.path.abspath(cli.__file__)))
+    env = dict(os.environ, PYTHONPATH=top)
+    # Time imports from cached bytecode, as after installation.
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          stderr=subprocess.PIPE, env=env, check=True,
+                          universal_newlines=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if self_us.strip().isdigit():
+            times[name.strip()] = int(self_us) * 1e-6
+    return times
+
+
+@importtime
+def test_import_time_budget():
+    import_times('import sig2srv.cli')  # compile
+    added, own = [], []
+    for attempt in range(3):
+        baseline = import_times(BASELINE)
+        times = import_times('import sig2srv.cli')
+        added.append(sum(seconds for name, seconds in times.items()
+                         if name not in baseline))
+        own.append(sum(seconds for name, seconds in times.items()
+                       if name.split('.')[0] == 'sig2srv'))
+    assert min(own) < OWN_IMPORT_TIME_BUDGET
+    assert min(added) < IMPORT_TIME_BUDGET
+
+
+@importtime
+def test_optional_modules_are_deferred():
+    times = import_times('import sig2srv.cli')
+    assert 'sig2srv.sig2srv' in times
+    assert not set(DEFERRED) & set(times)
+
+
+@pytest.mark.parametrize('argv', [
+    ['--loop=uvloop', '--posix-spawn', 'omg'],
+    ['--status-period=10', '--status-max-period=5', 'omg'],
+    ['--log-queue=0', 'omg'],
+])
+def test_bad_arguments(argv, capsys):
+    with patch.object(sys, 'argv', ['sig2srv'] + argv), \
+            pytest.raises(SystemExit) as excinfo:
+        cli.main()
+    assert excinfo.value.code == 2
+    assert 'error:' in capsys.readouterr().err
+
+
+def test_journal_refuses_other_files(tmpdir, capsys):
+    path = tmpdir.join('precious.log')
+    path.write('precious')
+    policy = get_event_loop_policy()
+    handlers = logger.handlers[:]
+    try:
+        with patch.object(sys, 'argv', ['sig2srv', '--loop=asyncio',
+                                        '--journal', str(path), 'omg']), \
+                pytest.raises(SystemExit) as excinfo:
+            cli.main()
+    finally:
+        set_event_loop_policy(policy)
+        logger.handlers[:] = handlers
+    assert excinfo.value.code == 1
+    assert 'not a sig2srv journal' in capsys.readouterr().err
+    assert path.read() == 'precious'
@@ -0,0 +1,118 @@
+from asyncio import TimeoutError, get_event_loop, set_event_loop, wait_for
+import os
+from signal import SIGKILL
+import time
+
+import pytest
+
+from sig2srv.coproc import ShellCoprocess
+from tests.eventloopfixture import event_loop
+
+
+def process_alive(pid, wait=1):
+    """Return whether *pid* exists and is not a zombie after up to *wait*
+    seconds."""
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            with open('/proc/{}/stat'.format(pid)) as f:
+                if f.read().rsplit(')', 1)[1].split()[0] == 'Z':
+                    return False
+        except FileNotFoundError:
+            return False
+        if time.monotonic() >= deadline:
+            return True
+        time.sleep(0.01)
+
+
+@pytest.mark.timeout(5)
+class TestShellCoprocess:
+
+    @pytest.fixture
+    def loop(self, event_loop):
+        """Event loop to which the child watcher is attached."""
+        old_loop = get_event_loop()
+        set_event_loop(event_loop)
+        try:
+            yield event_loop
+        finally:
+            set_event_loop(old_loop)
+
+    @pytest.fixture
+    def coproc(self, loop):
+        coproc = ShellCoprocess(loop=loop)
+        try:
+            yield coproc
+        finally:
+            loop.run_until_complete(coproc.close())
+
+    def test_run_returns_exit_status(self, coproc, loop):
+        assert loop.run_until_complete(coproc.run('true')) == 0
+        assert loop.run_until_complete(coproc.run('false')) == 1
+        assert loop.run_until_complete(
+            coproc.run('sh', '-c', 'exit 42')) == 42
+
+    def test_run_reuses_shell(self, coproc, loop):
+        loop.run_until_complete(coproc.run('true'))
+        pid = coproc.pid
+        loop.run_until_complete(coproc.run('true'))
+        assert coproc.pid == pid
+
+    def test_run_quotes_args(self, coproc, loop):
+        assert loop.run_until_complete(
+            coproc.run('test', 'a b;$x', '=', 'a b;$x')) == 0
+
+    def test_command_output_does_not_break_framing(self, coproc, loop):
+        assert loop.run_until_complete(
+            coproc.run('echo', 'sig2srv-0000000000000000 0')) == 0
+        assert loop.run_until_complete(coproc.run('false')) == 1
+
+    def test_command_stdin_is_not_the_pipe(self, coproc, loop):
+        assert loop.run_until_complete(coproc.run('cat')) == 0
+        assert loop.run_until_complete(coproc.run('false')) == 1
+
+    def test_run_restarts_dead_shell(self, coproc, loop):
+        loop.run_until_complete(coproc.run('true'))
+        pid = coproc.pid
+        os.kill(pid, SIGKILL)
+        assert loop.run_until_complete(coproc.run('false')) == 1
+        assert coproc.pid != pid
+
+    def test_run_retries_if_shell_dies_during_command(self, coproc, loop,
+                                                      tmpdir):
+        flag = str(tmpdir.join('killed'))
+        assert loop.run_until_complete(coproc.run(
+            'sh', '-c', '[ -e "$0" ] || { touch "$0"; kill -KILL $PPID; }',
+            flag)) == 0
+        assert os.path.exists(flag)
+
+    def test_run_gives_up_if_shell_dies_twice(self, coproc, loop):
+        with pytest.raises(ConnectionError):
+            loop.run_until_complete(coproc.run('sh', '-c', 'kill -KILL $PPID'))
+
+    def test_passes_env(self, loop):
+        coproc = ShellCoprocess(env=dict(os.environ, OMG='wtf'), loop=loop)
+        try:
+            assert loop.run_until_complete(
+                coproc.run('sh', '-c', 'test "$OMG" = wtf')) == 0
+        finally:
+            loop.run_until_complete(coproc.close())
+
+    def test_kill_stops_running_command(self, coproc, loop, tmpdir):
+        pidfile = str(tmpdir.join('pid'))
+        with pytest.raises(TimeoutError):
+            loop.run_until_complete(wait_for(
+                coproc.run('sh', '-c', 'echo $$ > "$0"; exec sleep 30',
+                           pidfile),
+                0.5, loop=loop))
+        with open(pidfile) as f:
+            pid = int(f.read())
+        loop.run_until_complete(coproc.kill(grace=1))
+        assert coproc.pid is None
+        assert not process_alive(pid)
+        assert loop.run_until_complete(coproc.run('false')) == 1
+
+    def test_close(self, coproc, loop):
+        loop.run_until_complete(coproc.run('true'))
+        loop.run_until_complete(coproc.close())
+        assert coproc.pid is None
@@ -0,0 +1,119 @@
+from asyncio import coroutine, gather
+
+from asynciotimemachine import TimeMachine
+import pytest
+
+from sig2srv.fake import FakeBackend
+from sig2srv.sig2srv import TIMED_OUT, FatalError, Sig2Srv, ServiceBackend
+from tests.eventloopfixture import event_loop
+from tests.test_asynchelper import run_for
+
+
+def run(event_loop, coro):
+    return event_loop.run_until_complete(coro)
+
+
+class TestFakeBackend:
+
+    @pytest.fixture
+    def fake(self, event_loop):
+        return FakeBackend(name='omg', loop=event_loop)
+
+    def test_is_a_service_backend(self, fake):
+        assert isinstance(fake, ServiceBackend)
+        assert fake.name == 'omg'
+
+    def test_simulates_the_service(self, fake, event_loop):
+        assert run(event_loop, fake.status()) == FakeBackend.NOT_RUNNING
+        assert run(event_loop, fake.reload()) == FakeBackend.NOT_RUNNING
+        assert run(event_loop, fake.start()) == 0
+        assert fake.running
+        assert run(event_loop, fake.status()) == 0
+        assert run(event_loop, fake.reload()) == 0
+        assert run(event_loop, fake.stop()) == 0
+        assert not fake.running
+        assert run(event_loop, fake.restart()) == 0
+        assert fake.running
+
+    def test_unknown_verbs_fail(self, fake, event_loop):
+        assert run(event_loop, fake.run('omg')) == FakeBackend.NOT_RUNNING
+        assert run(event_loop, fake.run()) == FakeBackend.NOT_RUNNING
+
+    def test_counts_commands(self, fake, event_loop):
+        run(event_loop, fake.start())
+        run(event_loop, fake.status())
+        run(event_loop, fake.status())
+        assert fake.counts == {'start': 1, 'status': 2}
+
+    def test_crash(self, fake, event_loop):
+        run(event_loop, fake.start())
+        fake.crash()
+        assert run(event_loop, fake.status()) == FakeBackend.NOT_RUNNING
+
+    def test_inject(self, fake, event_loop):
+        fake.inject('start', 1, TIMED_OUT)
+        assert run(event_loop, fake.start()) == 1
+        assert run(event_loop, fake.start()) == TIMED_OUT
+        assert not fake.running
+        assert run(event_loop, fake.start()) == 0
+
+    def test_failure_rate(self, event_loop):
+        fake = FakeBackend(name='omg', failure_rate={'status': 0.5}, seed=1,
+                           running=True, loop=event_loop)
+        results = [run(event_loop, fake.status()) for i in range(200)]
+        assert 50 < results.count(FakeBackend.FAILED) < 150
+        assert set(results) == {0, FakeBackend.FAILED}
+        assert run(event_loop, fake.stop()) == 0
+
+    def test_latency_serializes_commands(self, event_loop):
+        fake = FakeBackend(name='omg', latency={'start': 2, 'status': 1},
+                           loop=event_loop)
+        tm = TimeMachine(event_loop=event_loop)
+        done = []
+
+        @coroutine
+        def command(verb):
+            result = yield from fake.run(verb)
+            done.append((verb, round(event_loop.time() - start)))
+            return result
+
+        start = event_loop.time()
+        tasks = gather(command('start'), command('status'), loop=event_loop)
+        run_for(event_loop, tm, 4)
+        assert tasks.done()
+        assert done == [('start', 2), ('status', 3)]
+
+    def test_jitter_is_seeded(self, event_loop):
+        delays = []
+        for i in range(2):
+            fake = FakeBackend(name='omg', jitter=1, seed=42, loop=event_loop)
+            delays.append(fake._FakeBackend__delay('status'))
+        assert delays[0] == delays[1]
+        assert 0 <= delays[0] <= 1
+
+    def test_repr(self, event_loop):
+        fake = FakeBackend(name='omg', latency=0.5, loop=event_loop)
+        assert repr(fake).startswith("FakeBackend(")
+        assert "latency=0.5" in repr(fake)
+
+
+class TestSig2SrvWithFakeBackend:
+
+    def test_service_crash_is_fatal(self, event_loop):
+        fake = FakeBackend(name='omg', loop=event_loop)
+        sig2srv = Sig2Srv(runner=fake, status_period=1)
+        tm = TimeMachine(event_loop=event_loop)
+        task = event_loop.create_task(sig2srv.run())
+        run_for(event_loop, tm, 0.5)
+        assert sig2srv.state == Sig2Srv.State.RUNNING
+        fake.crash()
+        run_for(event_loop, tm, 2)
+        with pytest.raises(FatalError):
+            task.result()
+        assert fake.counts['status'] >= 1
+
+    def test_failed_start_is_fatal(self, event_loop):
+        fake = FakeBackend(name='omg', loop=event_loop)
+        fake.inject('start', 1)
+        with pytest.raises(FatalError):
+            run(event_loop, Sig2Srv(runner=fake).run())
@@ -0,0 +1,136 @@
+from random import Random
+
+import pytest
+
+from sig2srv.histogram import LogHistogram
+
+
+def exact_quantile(values, q):
+    values = sorted(values)
+    return values[max(1, int(q * len(values) + 0.5)) - 1]
+
+
+class TestLogHistogram:
+
+    def test_empty(self):
+        h = LogHistogram()
+        assert len(h) == 0
+        assert h.count == 0
+        assert h.sum == 0
+        assert h.min is None and h.max is None and h.mean is None
+        assert h.quantile(0.5) is None
+        assert list(h.buckets()) == []
+
+    def test_summary_statistics(self):
+        h = LogHistogram()
+        for value in (0.25, 0.5, 2):
+            h.record(value)
+        h.record(1, count=3)
+        assert h.count == 6
+        assert h.sum == pytest.approx(5.75)
+        assert h.min == 0.25
+        assert h.max == 2
+        assert h.mean == pytest.approx(5.75 / 6)
+
+    @pytest.mark.parametrize('precision', [5, 7, 10])
+    def test_quantiles_are_within_relative_error(self, precision):
+        rng = Random(precision)
+        values = [rng.lognormvariate(-3, 2) for i in range(10000)]
+        h = LogHistogram(precision=precision)
+        for value in values:
+            h.record(value)
+        bound = 2 ** -(precision - 1)
+        for q in (0.01, 0.1, 0.5, 0.9, 0.99, 0.999):
+            exact = exact_quantile(values, q)
+            assert h.quantile(q) == pytest.approx(exact, rel=bound, abs=1e-6)
+
+    def test_extremes_are_exact(self):
+        h = LogHistogram()
+        for value in (0.0123, 0.5, 7.89):
+            h.record(value)
+        assert h.quantile(0) == 0.0123
+        assert h.quantile(1) == 7.89
+
+    def test_negative_values_count_as_zero(self):
+        h = LogHistogram()
+        h.record(-1)
+        assert h.min == 0
+        assert h.quantile(0.5) == 0
+
+    def test_values_above_highest_are_clamped_but_max_is_kept(self):
+        h = LogHistogram(highest=10)
+        h.record(1e6)
+        assert h.max == 1e6
+        assert h.quantile(1) == 1e6
+        assert list(h.buckets())[-1][0] <= 11
+
+    def test_memory_is_fixed(self):
+        h = LogHistogram()
+        nbytes = h.nbytes
+        assert nbytes < 16384
+        for i in range(100000):
+            h.record(i * 0.001)
+        assert h.nbytes == nbytes
+
+    def test_buckets(self):
+        h = LogHistogram(lowest=1, highest=1000, precision=3)
+        for value in (1, 1, 5, 100):
+            h.record(value)
+        assert list(h.buckets()) == [(2, 2), (6, 1), (112, 1)]
+
+    def test_quantiles(self):
+        h = LogHistogram()
+        for value in range(1, 101):
+            h.record(value / 100)
+        p50, p90 = h.quantiles(0.5, 0.9)
+        assert p50 == pytest.approx(0.5, rel=0.02)
+        assert p90 == pytest.approx(0.9, rel=0.02)
+
+    def test_merge(self):
+        a, b = LogHistogram(), LogHistogram()
+        for value in (0.1, 0.2):
+            a.record(value)
+        for value in (0.05, 0.3, 0.4):
+            b.record(value)
+        a.merge(b)
+        assert a.count == 5
+        assert a.sum == pytest.approx(1.05)
+        assert a.min == 0.05 and a.max == 0.4
+        assert b.count == 3
+
+    def test_merge_empty(self):
+        a = LogHistogram()
+        a.record(1)
+        a.merge(LogHistogram())
+        assert a.count == 1 and a.min == 1 and a.max == 1
+
+    def test_merge_rejects_different_parameters(self):
+        with pytest.raises(ValueError):
+            LogHistogram().merge(LogHistogram(precision=5))
+
+    def test_merge_compares_parameters_not_reprs(self):
+        class Sub(LogHistogram):
+            __slots__ = ()
+        a, b = LogHistogram(), Sub()
+        b.record(1)
+        a.merge(b)
+        assert a.count == 1
+
+    def test_copy_is_independent(self):
+        h = LogHistogram()
+        h.record(1)
+        copy = h.copy()
+        h.record(2)
+        assert copy.count == 1
+        assert repr(copy) == repr(h)
+
+    def test_reset(self):
+        h = LogHistogram()
+        h.record(1)
+        h.reset()
+        assert h.count == 0 and h.max is None
+        assert list(h.buckets()) == []
+
+    def test_repr(self):
+        assert (repr(LogHistogram(lowest=0.001, highest=60, precision=4)) ==
+                'LogHistogram(lowest=0.001, highest=60, precision=4)')
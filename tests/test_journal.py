@@ -0,0 +1,214 @@
+from asyncio import gather
+import os
+from signal import SIGHUP, SIGTERM
+from unittest.mock import patch
+
+from asynciotimemachine import TimeMachine
+import pytest
+
+from sig2srv.fake import FakeBackend
+from sig2srv.journal import (MAGIC, NO_STATUS, EventKind, Journal,
+                             format_event, main, read_journal)
+from sig2srv.sig2srv import TIMED_OUT, ServiceCommandRunner, Sig2Srv
+from tests.eventloopfixture import event_loop
+from tests.test_asynchelper import run_for
+
+
+@pytest.fixture
+def path(tmpdir):
+    return str(tmpdir.join('journal'))
+
+
+class TestJournal:
+
+    def test_file_size_is_fixed(self, path):
+        journal = Journal(path=path, capacity=8)
+        for i in range(100):
+            journal.signal('omg', SIGHUP)
+        journal.close()
+        assert os.path.getsize(path) == 64 + 64 * 8
+
+    def test_records_events(self, path):
+        journal = Journal(path=path)
+        journal.state('omg', Sig2Srv.State.STARTING)
+        journal.command_start('omg', ('start',))
+        journal.command_end('omg', ('start',), 0, 0.25)
+        journal.signal('omg', SIGTERM)
+        journal.close()
+        events = read_journal(path)
+        assert [(e.seq, e.kind, e.service, e.code, e.duration, e.detail)
+                for e in events] == [
+            (1, EventKind.STATE, 'omg', 1, 0, 'STARTING'),
+            (2, EventKind.COMMAND_START, 'omg', 0, 0, 'start'),
+            (3, EventKind.COMMAND_END, 'omg', 0, 0.25, 'start'),
+            (4, EventKind.SIGNAL, 'omg', SIGTERM, 0, 'SIGTERM'),
+        ]
+        assert events[0].time <= events[-1].time
+
+    def test_keeps_the_last_events(self, path):
+        journal = Journal(path=path, capacity=4)
+        for i in range(10):
+            journal.command_start('omg', ('status', str(i)))
+        journal.close()
+        assert [(e.seq, e.detail) for e in read_journal(path)] == [
+            (7, 'status 6'), (8, 'status 7'), (9, 'status 8'),
+            (10, 'status 9')]
+
+    def test_survives_a_crash(self, path):
+        journal = Journal(path=path, capacity=4)
+        journal.command_start('omg', ('start',))
+        # No close(), as if the process died; the mapping is shared.
+        assert [e.detail for e in read_journal(path)] == ['start']
+
+    def test_continues_after_reopening(self, path):
+        journal = Journal(path=path, capacity=4)
+        journal.command_start('omg', ('start',))
+        journal.close()
+        journal = Journal(path=path, capacity=4)
+        journal.command_start('omg', ('stop',))
+        journal.close()
+        assert [(e.seq, e.detail) for e in read_journal(path)] == [
+            (1, 'start'), (2, 'stop')]
+
+    def test_starts_afresh_with_another_capacity(self, path):
+        journal = Journal(path=path, capacity=4)
+        journal.command_start('omg', ('start',))
+        journal.close()
+        journal = Journal(path=path, capacity=8)
+        journal.command_start('omg', ('stop',))
+        journal.close()
+        assert [(e.seq, e.detail) for e in read_journal(path)] == [
+            (1, 'stop')]
+
+    def test_starts_afresh_over_another_version(self, path):
+        journal = Journal(path=path, capacity=4)
+        journal.command_start('omg', ('start',))
+        journal.close()
+        with open(path, 'r+b') as f:
+            f.seek(len(MAGIC))
+            f.write(b'\x02')
+        journal = Journal(path=path, capacity=4)
+        journal.command_start('omg', ('stop',))
+        journal.close()
+        assert [(e.seq, e.detail) for e in read_journal(path)] == [
+            (1, 'stop')]
+
+    def test_uses_an_empty_file(self, path):
+        open(path, 'wb').close()
+        journal = Journal(path=path, capacity=4)
+        journal.command_start('omg', ('start',))
+        journal.close()
+        assert [e.seq for e in read_journal(path)] == [1]
+
+    @pytest.mark.parametrize('data', [b'x', b'garbage' * 1000, bytes(1000)])
+    def test_refuses_to_overwrite_other_files(self, path, data):
+        with open(path, 'wb') as f:
+            f.write(data)
+        with pytest.raises(ValueError):
+            Journal(path=path, capacity=4)
+        with open(path, 'rb') as f:
+            assert f.read() == data
+
+    def test_truncates_long_fields(self, path):
+        journal = Journal(path=path)
+        journal.command_start('a-very-long-service-name', ('status', 'x' * 20))
+        journal.close()
+        event, = read_journal(path)
+        assert event.service == 'a-very-long-service-'
+        assert event.detail == 'status xxxxx'
+
+    def test_skips_torn_records(self, path):
+        journal = Journal(path=path, capacity=4)
+        for i in range(2):
+            journal.command_start('omg', ('start',))
+        journal.close()
+        with open(path, 'r+b') as f:
+            f.seek(64 + 64)  # seq of the second record
+            f.write(b'\xff' * 8)
+        assert [e.seq for e in read_journal(path)] == [1]
+
+    def test_read_rejects_other_files(self, path):
+        with open(path, 'wb') as f:
+            f.write(bytes(128))
+        with pytest.raises(ValueError):
+            read_journal(path)
+
+    def test_does_not_write_per_event(self, path):
+        journal = Journal(path=path)
+        with patch('os.write') as write, patch('os.fsync') as fsync:
+            journal.command_start('omg', ('start',))
+        assert not write.called and not fsync.called
+        journal.close()
+
+
+class TestFormatEvent:
+
+    @pytest.mark.parametrize('status,text', [
+        (0, 'status returned 0 after 0.500 s'),
+        (3, 'status returned 3 after 0.500 s'),
+        (TIMED_OUT, 'status timed out after 0.500 s'),
+        (None, 'status raised after 0.500 s'),
+    ])
+    def test_command_end(self, path, status, text):
+        journal = Journal(path=path)
+        journal.command_end('omg', ('status',), status, 0.5)
+        journal.close()
+        event, = read_journal(path)
+        assert format_event(event).endswith(' omg ' + text)
+        if status is None:
+            assert event.code == NO_STATUS
+
+    def test_main(self, path, capsys):
+        journal = Journal(path=path)
+        journal.state('omg', Sig2Srv.State.RUNNING)
+        journal.signal('omg', SIGHUP)
+        journal.close()
+        main([path])
+        lines = capsys.readouterr().out.splitlines()
+        assert len(lines) == 2
+        assert lines[0].endswith(' omg state RUNNING')
+        assert lines[1].endswith(' omg signal SIGHUP')
+        main(['-n', '1', path])
+        assert capsys.readouterr().out.splitlines() == lines[1:]
+
+    def test_main_reports_bad_files(self, path, capsys):
+        with pytest.raises(SystemExit) as excinfo:
+            main([path])
+        assert excinfo.value.code == 1
+        assert 'error:' in capsys.readouterr().err
+
+
+class TestJournalIntegration:
+
+    def test_runner_records_commands(self, path, event_loop):
+        journal = Journal(path=path)
+        runner = ServiceCommandRunner(name='omg', journal=journal,
+                                      loop=event_loop)
+        with patch('sig2srv.sig2srv.create_subprocess_exec') as cse:
+            cse.side_effect = OSError("nope")
+            with pytest.raises(OSError):
+                event_loop.run_until_complete(runner.run('start'))
+        journal.close()
+        assert [(e.kind, e.detail, e.code) for e in read_journal(path)] == [
+            (EventKind.COMMAND_START, 'start', 0),
+            (EventKind.COMMAND_END, 'start', NO_STATUS)]
+
+    def test_sig2srv_records_states_and_signals(self, path, event_loop):
+        journal = Journal(path=path)
+        fake = FakeBackend(name='omg', loop=event_loop)
+        sig2srv = Sig2Srv(runner=fake, status_period=10, journal=journal)
+        tm = TimeMachine(event_loop=event_loop)
+        task = event_loop.create_task(sig2srv.run())
+        run_for(event_loop, tm, 0.5)
+        os.kill(os.getpid(), SIGTERM)
+        run_for(event_loop, tm, 0.5)
+        event_loop.run_until_complete(gather(task, loop=event_loop))
+        journal.close()
+        assert [(e.kind, e.detail) for e in read_journal(path)] == [
+            (EventKind.STATE, 'STOPPED'),
+            (EventKind.STATE, 'STARTING'),
+            (EventKind.STATE, 'RUNNING'),
+            (EventKind.SIGNAL, 'SIGTERM'),
+            (EventKind.STATE, 'STOPPING'),
+            (EventKind.STATE, 'STOPPED'),
+        ]
@@ -1,5 +1,5 @@
 from logging import getLogger, DEBUG, INFO, WARNING, ERROR, CRITICAL
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, call, patch
 
 import pytest
 
@@ -33,6 +33,38 @@ class TestBraceMessage:
     def test_str_formats(self, brace_message):
         assert str(brace_message) == 'abc=3 def=DEF ghi=GHI'
 
+    def test_str_formats_once(self):
+        formats = 0
+        class Arg:
+            def __format__(self, spec):
+                nonlocal formats
+                formats += 1
+                return 'arg'
+        brace_message = BraceMessage("{}", Arg())
+        assert formats == 0
+        assert str(brace_message) == str(brace_message) == 'arg'
+        assert formats == 1
+
+    def test_is_slotted(self, brace_message):
+        assert not hasattr(brace_message, '__dict__')
+
+    def test_str_releases_format_and_arguments(self, brace_message):
+        str(brace_message)
+        assert brace_message.fmt is None
+        assert brace_message.poargs is None
+        assert brace_message.kwargs is None
+        assert str(brace_message) == 'abc=3 def=DEF ghi=GHI'
+
+    def test_repr(self, brace_message, fmt):
+        assert repr(brace_message) == (
+            "BraceMessage({!r}, 3, 'DEF', ghi='GHI')".format(fmt))
+
+    def test_repr_after_str_is_equivalent(self):
+        brace_message = BraceMessage("{{{}}}", 1)
+        assert str(brace_message) == '{1}'
+        assert repr(brace_message) == "BraceMessage('{{1}}')"
+        assert str(BraceMessage('{{1}}')) == '{1}'
+
 
 class TestWithLog:
 
@@ -90,6 +122,91 @@ class TestWithLog:
             assert poargs[0] == INFO
             assert poargs[1] is bm
 
+    def test_log_does_nothing_if_level_disabled(self, mock_logger):
+        mock_logger.isEnabledFor.return_value = False
+        repr_calls = 0
+        class Caller(WithLog):
+            def __repr__(self):
+                nonlocal repr_calls
+                repr_calls += 1
+                return "Caller()"
+
+        with patch('sig2srv.logging.BraceMessage') as BraceMessageMock:
+            Caller(logger=mock_logger)._log(DEBUG, "abc")
+            mock_logger.isEnabledFor.assert_called_once_with(DEBUG)
+            assert not BraceMessageMock.call_args_list
+            assert not mock_logger.log.call_args_list
+            assert repr_calls == 0
+
+    def test_log_renders_repr_once(self, mock_logger):
+        repr_calls = 0
+        class Caller(WithLog):
+            def __repr__(self):
+                nonlocal repr_calls
+                repr_calls += 1
+                return "Caller()"
+
+            def first(self):
+                self._log(INFO, "1")
+
+            def second(self):
+                self._log(INFO, "2")
+
+        with patch('sig2srv.logging.BraceMessage') as BraceMessageMock:
+            caller = Caller(logger=mock_logger)
+            caller.first()
+            caller.second()
+            assert BraceMessageMock.call_args_list == [
+                call("Caller().first(): 1"),
+                call("Caller().second(): 2"),
+            ]
+            assert repr_calls == 1
+
+    def test_invalidate_log_header_renders_repr_again(self, mock_logger):
+        class Caller(WithLog):
+            def __init__(self, x, **kwargs):
+                super().__init__(**kwargs)
+                self.x = x
+
+            def __repr__(self):
+                return "Caller({})".format(self.x)
+
+            def test(self):
+                self._log(INFO, "abc")
+
+        with patch('sig2srv.logging.BraceMessage') as BraceMessageMock:
+            outer = Caller(1, logger=mock_logger)
+            inner = Caller(2, logger=mock_logger)
+            outer.test()
+            inner.test()
+            outer.x = inner.x = 3
+            outer.test()
+            inner._invalidate_log_header()
+            outer.test()
+            inner.test()
+            assert BraceMessageMock.call_args_list == [
+                call("Caller(1).test(): abc"),
+                call("Caller(2).test(): abc"),
+                call("Caller(1).test(): abc"),  # still cached
+                call("Caller(3).test(): abc"),  # invalidated by inner
+                call("Caller(3).test(): abc"),
+            ]
+
+    def test_log_depth_skips_frames(self, mock_logger):
+        class Caller(WithLog):
+            def __repr__(self):
+                return "Caller()"
+
+            def helper(self):
+                self._log(INFO, "abc", log_depth=1)
+
+            def test(self):
+                self.helper()
+
+        with patch('sig2srv.logging.BraceMessage') as BraceMessageMock:
+            Caller(logger=mock_logger).test()
+            BraceMessageMock.assert_called_once_with("Caller().test(): abc")
+
     @pytest.fixture
     def with_log(self, mock_logger):
         return WithLog(logger=mock_logger)
@@ -0,0 +1,129 @@
+import logging
+from logging import Handler, INFO, WARNING, getLogger
+from queue import Queue
+from threading import Event, Timer, enumerate as threads
+from time import monotonic
+
+import pytest
+
+from sig2srv import logqueue
+from sig2srv.logqueue import DroppingQueueHandler, queued_handler
+
+
+class ListHandler(Handler):
+    """Collect the messages of records, optionally blocking until released."""
+
+    def __init__(self, blocked=False):
+        super().__init__()
+        self.messages = []
+        self.released = Event()
+        if not blocked:
+            self.released.set()
+
+    def emit(self, record):
+        self.released.wait()
+        self.messages.append(record.getMessage())
+
+
+@pytest.fixture
+def test_logger():
+    logger = getLogger(__name__)
+    logger.setLevel(INFO)
+    logger.propagate = False
+    yield logger
+    logger.handlers.clear()
+
+
+class TestDroppingQueueHandler:
+
+    def test_drops_and_counts_records_over_capacity(self, test_logger):
+        queue = Queue(2)
+        handler = DroppingQueueHandler(queue)
+        test_logger.addHandler(handler)
+        for i in range(5):
+            test_logger.info("%d", i)
+        assert handler.dropped == 3
+        assert [queue.get_nowait().getMessage() for i in range(2)] == [
+            '0', '1']
+
+    def test_formats_on_the_logging_thread(self, test_logger):
+        queue = Queue()
+        test_logger.addHandler(DroppingQueueHandler(queue))
+        args = ['a']
+        test_logger.info("%s", args)
+        args.append('b')
+        assert queue.get_nowait().getMessage() == "['a']"
+
+
+class TestQueuedHandler:
+
+    def test_writes_records_in_order(self, test_logger):
+        target = ListHandler()
+        with queued_handler(target) as handler:
+            test_logger.addHandler(handler)
+            for i in range(100):
+                test_logger.info("%d", i)
+        assert target.messages == [str(i) for i in range(100)]
+
+    def test_does_not_block_on_a_slow_handler(self, test_logger):
+        target = ListHandler(blocked=True)
+        with queued_handler(target, capacity=10) as handler:
+            test_logger.addHandler(handler)
+            for i in range(100):
+                test_logger.info("%d", i)
+            dropped = handler.dropped
+            assert dropped >= 89
+            target.released.set()
+        written, report = target.messages[:-1], target.messages[-1]
+        assert len(written) + dropped == 100
+        assert written == sorted(written, key=int)
+        assert report == ("dropped {} log records because the log queue "
+                          "was full".format(dropped))
+
+    def test_reports_nothing_if_nothing_dropped(self, test_logger):
+        target = ListHandler()
+        with queued_handler(target, capacity=1) as handler:
+            test_logger.addHandler(handler)
+            test_logger.warning("omg")
+        assert target.messages == ['omg']
+
+    def test_stops_with_a_full_queue(self, test_logger):
+        target = ListHandler(blocked=True)
+        with queued_handler(target, capacity=1) as handler:
+            test_logger.addHandler(handler)
+            for i in range(3):
+                test_logger.log(WARNING, "%d", i)
+            # Release the handler only after stopping has begun.
+            Timer(0.1, target.released.set).start()
+        assert target.messages[-1].startswith("dropped ")
+
+    def test_abandons_a_stuck_handler_after_timeout(self, test_logger,
+                                                    monkeypatch):
+        errors = []
+        monitor = logqueue._QueueListener._monitor
+
+        def checked_monitor(self):
+            try:
+                monitor(self)
+            except BaseException as e:
+                errors.append(e)
+                raise
+        monkeypatch.setattr(logqueue._QueueListener, '_monitor',
+                            checked_monitor)
+        before = set(threads())
+        target = ListHandler(blocked=True)
+        start = monotonic()
+        with queued_handler(target, capacity=1, timeout=0.2) as handler:
+            test_logger.addHandler(handler)
+            for i in range(3):
+                test_logger.warning("%d", i)
+        assert 0.2 <= monotonic() - start < 1
+        # logging.shutdown() no longer waits for the handler.
+        assert all(ref() is not target for ref in logging._handlerList)
+        target.released.set()
+        for thread in set(threads()) - before:
+            thread.join(1)
+            assert not thread.is_alive()
+        assert not errors
+        # The abandoned thread dropped the rest of the records.
+        assert target.messages == ['0']
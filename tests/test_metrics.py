@@ -0,0 +1,139 @@
+from asyncio import coroutine, open_connection, open_unix_connection
+
+import pytest
+
+from sig2srv.metrics import (Counter, Histogram, Metrics, MetricsServer,
+                             Registry, write_textfile)
+from tests.eventloopfixture import event_loop
+
+
+class TestCounter:
+
+    def test_inc_and_value(self):
+        counter = Counter('omg_total', "OMG.", ('a', 'b'))
+        counter.inc('x', 'y')
+        counter.inc('x', 'y', amount=2)
+        assert counter.value('x', 'y') == 3
+        assert counter.value('x', 'z') == 0
+
+    def test_inc_requires_all_labels(self):
+        counter = Counter('omg_total', "OMG.", ('a', 'b'))
+        with pytest.raises(AssertionError):
+            counter.inc('x')
+
+    def test_render_escapes_label_values(self):
+        counter = Counter('omg_total', "OMG.", ('a',))
+        counter.inc('x"y\\z\n')
+        assert list(counter.render(counter.snapshot())) == [
+            r'omg_total{a="x\"y\\z\n"} 1',
+        ]
+
+    def test_snapshot_is_a_copy(self):
+        counter = Counter('omg_total', "OMG.")
+        counter.inc()
+        snapshot = counter.snapshot()
+        counter.inc()
+        assert list(counter.render(snapshot)) == ['omg_total 1']
+
+
+class TestHistogram:
+
+    def test_observe_and_render(self):
+        histogram = Histogram('omg_seconds', "OMG.", ('a',),
+                              buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value, 'x')
+        assert histogram.count('x') == 4
+        assert histogram.sum('x') == pytest.approx(2.65)
+        assert list(histogram.render(histogram.snapshot())) == [
+            'omg_seconds_bucket{a="x",le="0.1"} 2',
+            'omg_seconds_bucket{a="x",le="1.0"} 3',
+            'omg_seconds_bucket{a="x",le="+Inf"} 4',
+            'omg_seconds_sum{a="x"} 2.65',
+            'omg_seconds_count{a="x"} 4',
+        ]
+
+    def test_empty(self):
+        histogram = Histogram('omg_seconds', "OMG.", ('a',))
+        assert histogram.count('x') == 0
+        assert histogram.sum('x') == 0
+        assert list(histogram.render(histogram.snapshot())) == []
+
+
+def test_registry_render():
+    registry = Registry()
+    counter = registry.register(Counter('omg_total', "OMG\nWTF."))
+    counter.inc()
+    assert registry.render() == ('# HELP omg_total OMG\\nWTF.\n'
+                                 '# TYPE omg_total counter\n'
+                                 'omg_total 1\n')
+
+
+def test_metrics_families():
+    text = Metrics().render()
+    for name in ('sig2srv_command_duration_seconds', 'sig2srv_commands_total',
+                 'sig2srv_lock_wait_seconds', 'sig2srv_status_checks_total',
+                 'sig2srv_state_transitions_total'):
+        assert '# TYPE {} '.format(name) in text
+
+
+@pytest.mark.timeout(5)
+class TestMetricsServer:
+
+    @pytest.fixture
+    def metrics(self):
+        metrics = Metrics()
+        metrics.commands.inc('omg', 'status', 'ok')
+        return metrics
+
+    def scrape(self, event_loop, server, connect):
+        @coroutine
+        def scrape():
+            yield from server.start()
+            try:
+                reader, writer = yield from connect()
+                writer.write(b'GET /metrics HTTP/1.0\r\n'
+                             b'Host: localhost\r\n\r\n')
+                response = yield from reader.read()
+                writer.close()
+                return response.decode()
+            finally:
+                yield from server.close()
+        return event_loop.run_until_complete(scrape())
+
+    def test_unix_socket(self, event_loop, metrics, tmpdir):
+        path = str(tmpdir.join('metrics.sock'))
+        server = MetricsServer(registry=metrics, path=path, loop=event_loop)
+        response = self.scrape(event_loop, server, lambda: (
+            open_unix_connection(path, loop=event_loop)))
+        head, body = response.split('\r\n\r\n', 1)
+        assert head.startswith('HTTP/1.0 200 OK\r\n')
+        assert 'Content-Type: text/plain; version=0.0.4' in head
+        assert 'Content-Length: {}'.format(len(body)) in head
+        assert body == metrics.render()
+        assert not tmpdir.join('metrics.sock').exists()
+
+    def test_tcp(self, event_loop, metrics):
+        server = MetricsServer(registry=metrics, port=0, loop=event_loop)
+        @coroutine
+        def connect():
+            host, port = server.sockets[0].getsockname()[:2]
+            return (yield from open_connection(host, port, loop=event_loop))
+        response = self.scrape(event_loop, server, connect)
+        assert response.endswith(metrics.render())
+        assert ('sig2srv_commands_total{service="omg",verb="status",'
+                'outcome="ok"} 1') in response
+
+    def test_requires_path_or_port(self, metrics):
+        with pytest.raises(AssertionError):
+            MetricsServer(registry=metrics)
+
+
+def test_write_textfile(event_loop, tmpdir):
+    metrics = Metrics()
+    metrics.status_checks.inc('omg', 'failed')
+    path = tmpdir.join('sig2srv.prom')
+    event_loop.run_until_complete(
+        write_textfile(metrics, str(path), loop=event_loop))
+    assert path.read() == metrics.render()
+    assert tmpdir.listdir() == [path]
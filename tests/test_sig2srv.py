@@ -3,8 +3,10 @@
 
 """Tests for `sig2srv` package."""
 
-from asyncio import coroutine, get_event_loop
-from logging import StreamHandler, DEBUG
+from asyncio import (coroutine, create_subprocess_exec, gather,
+                     get_event_loop, set_event_loop, sleep)
+from contextlib import contextmanager
+from logging import StreamHandler, DEBUG, WARNING
 from os import getpid, kill
 from signal import SIGHUP, SIGTERM
 from unittest.mock import MagicMock, PropertyMock, call, patch, ANY
@@ -12,14 +14,50 @@ from unittest.mock import MagicMock, PropertyMock, call, patch, ANY
 from asynciotimemachine import TimeMachine
 import pytest
 
-from sig2srv.sig2srv import ServiceCommandRunner, Sig2Srv, FatalError
+from sig2srv.asynchelper import SignalFanOut, periodic_calls, stable_phase
+from sig2srv.capture import OutputMode
+from sig2srv.histogram import LogHistogram
+from sig2srv.metrics import Metrics
+from sig2srv.sig2srv import (ServiceCommandRunner, Sig2Srv, FatalError,
+                             find_init_script, service_env, SERVICE_PATH,
+                             TIMED_OUT, RestartStrategy, ServiceBackend)
 from tests.eventloopfixture import event_loop
+from tests.test_coproc import process_alive
 
 from sig2srv.logging import logger
 logger.setLevel(DEBUG)
 logger.addHandler(StreamHandler())
 
 
+class TestServiceBackend:
+
+    class Backend(ServiceBackend):
+
+        name = 'omg'
+
+        @coroutine
+        def run(self, *args):
+            return args
+
+    def test_is_abstract(self, event_loop):
+        with pytest.raises(TypeError):
+            ServiceBackend(loop=event_loop)
+
+    @pytest.mark.parametrize('verb',
+                             ['start', 'stop', 'restart', 'reload', 'status'])
+    def test_verb_shorthands(self, verb, event_loop):
+        backend = self.Backend(loop=event_loop)
+        assert event_loop.run_until_complete(
+            getattr(backend, verb)()) == (verb,)
+
+    def test_close_does_nothing_by_default(self, event_loop):
+        event_loop.run_until_complete(self.Backend(loop=event_loop).close())
+
+    def test_runner_is_a_backend(self, event_loop):
+        assert isinstance(ServiceCommandRunner(name='omg', loop=event_loop),
+                          ServiceBackend)
+
+
 class TestServiceCommandRunner:
 
     SERVICE_NAME = 'omg'
@@ -66,7 +104,449 @@ class TestServiceCommandRunner:
             assert result is status
 
     def test_lock_is_in_the_same_loop(self, runner, event_loop):
-        assert runner._ServiceCommandRunner__lock._loop is event_loop
+        assert runner._ServiceCommandRunner__lock.loop is event_loop
+
+    @pytest.fixture
+    def slow_procs(self, event_loop):
+        """Patch create_subprocess_exec() to log commands that take a tick.
+
+        Yield the list of commands run."""
+        ran = []
+        @coroutine
+        def cse(*args, **kwargs):
+            ran.append(args[2:])
+            proc = MagicMock(spec_set=['wait'])
+            @coroutine
+            def wait():
+                yield from sleep(0, loop=event_loop)
+                return len(ran)
+            proc.wait.side_effect = wait
+            return proc
+        with patch('sig2srv.sig2srv.create_subprocess_exec', side_effect=cse):
+            yield ran
+
+    def test_queued_stop_goes_before_queued_status(self, runner, event_loop,
+                                                   slow_procs):
+        event_loop.run_until_complete(gather(
+            runner.run('start'), runner.run('status', 'a'),
+            runner.run('status', 'b'), runner.run('stop'), loop=event_loop))
+        assert slow_procs == [('start',), ('stop',), ('status', 'a'),
+                              ('status', 'b')]
+
+    def test_queued_statuses_are_merged(self, runner, event_loop,
+                                        slow_procs):
+        results = event_loop.run_until_complete(gather(
+            runner.run('start'), runner.run('status'), runner.run('status'),
+            runner.run('status'), loop=event_loop))
+        assert slow_procs == [('start',), ('status',)]
+        assert results == [1, 2, 2, 2]
+
+    def test_metrics(self, event_loop, slow_procs):
+        metrics = Metrics()
+        runner = ServiceCommandRunner(name=self.SERVICE_NAME,
+                                      metrics=metrics, loop=event_loop)
+        event_loop.run_until_complete(gather(
+            runner.run('start'), runner.run('status'), loop=event_loop))
+        # slow_procs commands return nonzero.
+        assert metrics.commands.value(self.SERVICE_NAME, 'start',
+                                      'failed') == 1
+        assert metrics.commands.value(self.SERVICE_NAME, 'status',
+                                      'failed') == 1
+        assert metrics.command_duration.count(self.SERVICE_NAME,
+                                              'start') == 1
+        assert metrics.lock_wait.count(self.SERVICE_NAME) == 2
+        assert metrics.lock_wait.sum(self.SERVICE_NAME) > 0
+
+    def test_latency(self, event_loop, slow_procs):
+        latencies = {}
+        runner = ServiceCommandRunner(name=self.SERVICE_NAME,
+                                      latencies=latencies, loop=event_loop)
+        assert runner.latency('start') is None
+        event_loop.run_until_complete(gather(
+            runner.run('start'), runner.run('status'), runner.run('status'),
+            loop=event_loop))
+        event_loop.run_until_complete(runner.run('status'))
+        assert runner.latency('start').count == 1
+        assert runner.latency('status').count == 2
+        assert runner.latency('status').max >= 0
+        assert runner.latencies is latencies
+        assert sorted(latencies) == ['start', 'status']
+
+    def test_latency_is_not_recorded_by_default(self, runner, event_loop,
+                                                slow_procs):
+        event_loop.run_until_complete(runner.run('start'))
+        assert runner.latencies is None
+        assert runner.latency('start') is None
+
+    def test_latencies_may_be_shared(self, event_loop, slow_procs):
+        latencies = {}
+        runners = [ServiceCommandRunner(name=name, latencies=latencies,
+                                        loop=event_loop)
+                   for name in ('a', 'b')]
+        event_loop.run_until_complete(gather(
+            *(runner.run('start') for runner in runners), loop=event_loop))
+        assert list(latencies) == ['start']
+        assert latencies['start'].count == 2
+
+    def test_running_status_is_not_merged(self, runner, event_loop,
+                                          slow_procs):
+        @coroutine
+        def status_twice():
+            first = event_loop.create_task(runner.run('status'))
+            yield from sleep(0, loop=event_loop)  # let it start
+            return (yield from gather(first, runner.run('status'),
+                                      loop=event_loop))
+        assert event_loop.run_until_complete(status_twice()) == [1, 2]
+        assert slow_procs == [('status',), ('status',)]
+
+    def test_init_script_defaults_to_none(self, runner):
+        assert runner.init_script is None
+
+    def test_run_init_script(self, event_loop):
+        runner = ServiceCommandRunner(name=self.SERVICE_NAME,
+                                      init_script='/etc/init.d/omg',
+                                      loop=event_loop)
+        proc = MagicMock(spec_set=['wait'])
+        proc.wait.side_effect = coroutine(lambda: 0)
+        with patch('sig2srv.sig2srv.create_subprocess_exec',
+                   side_effect=coroutine(lambda *a, **kw: proc)) as cse:
+            result = event_loop.run_until_complete(runner.run('foo', 'bar'))
+        cse.assert_called_once_with('/etc/init.d/omg', 'foo', 'bar',
+                                    loop=event_loop, env=ANY)
+        assert cse.call_args[1]['env']['PATH'] == SERVICE_PATH
+        assert result == 0
+        assert runner.init_script == '/etc/init.d/omg'
+
+    def test_run_init_script_falls_back_to_service(self, event_loop):
+        runner = ServiceCommandRunner(name=self.SERVICE_NAME,
+                                      init_script='/etc/init.d/omg',
+                                      loop=event_loop)
+        proc = MagicMock(spec_set=['wait'])
+        proc.wait.side_effect = coroutine(lambda: 0)
+        @coroutine
+        def cse(*args, **kwargs):
+            if args[0] != 'service':
+                raise FileNotFoundError(args[0])
+            return proc
+        with patch('sig2srv.sig2srv.create_subprocess_exec',
+                   side_effect=cse) as cse:
+            event_loop.run_until_complete(runner.run('foo'))
+            event_loop.run_until_complete(runner.run('bar'))
+        assert cse.call_args_list == [
+            call('/etc/init.d/omg', 'foo', loop=event_loop, env=ANY),
+            call('service', self.SERVICE_NAME, 'foo', loop=event_loop),
+            call('service', self.SERVICE_NAME, 'bar', loop=event_loop),
+        ]
+        assert runner.init_script is None
+
+    def test_fallback_refreshes_log_header(self, event_loop, caplog):
+        runner = ServiceCommandRunner(name=self.SERVICE_NAME,
+                                      init_script='/etc/init.d/omg',
+                                      loop=event_loop)
+        proc = MagicMock(spec_set=['wait'])
+        proc.wait.side_effect = coroutine(lambda: 0)
+        @coroutine
+        def cse(*args, **kwargs):
+            if args[0] != 'service':
+                raise FileNotFoundError(args[0])
+            return proc
+        caplog.set_level(DEBUG, logger=logger.name)
+        with patch('sig2srv.sig2srv.create_subprocess_exec', side_effect=cse):
+            event_loop.run_until_complete(runner.run('foo'))
+        messages = [r.getMessage() for r in caplog.records]
+        assert "init_script='/etc/init.d/omg'" in messages[0]
+        assert "init_script=None" in messages[-1]
+
+    def test_run_uses_launcher(self, event_loop):
+        proc = MagicMock(spec_set=['wait'])
+        proc.wait.side_effect = coroutine(lambda: 0)
+        launcher = MagicMock(side_effect=coroutine(lambda *a, **kw: proc))
+        runner = ServiceCommandRunner(name=self.SERVICE_NAME,
+                                      launcher=launcher, loop=event_loop)
+        with patch('sig2srv.sig2srv.create_subprocess_exec') as cse:
+            event_loop.run_until_complete(runner.run('foo'))
+        assert not cse.call_args_list
+        launcher.assert_called_once_with('service', self.SERVICE_NAME, 'foo',
+                                         loop=event_loop)
+
+    @pytest.fixture
+    def shell(self):
+        with patch('sig2srv.coproc.ShellCoprocess') as cls:
+            shell = cls.return_value
+            shell.run.side_effect = coroutine(lambda *args: 3)
+            shell.close.side_effect = coroutine(lambda: None)
+            yield shell
+
+    def test_run_status_in_coprocess(self, event_loop, shell):
+        runner = ServiceCommandRunner(name=self.SERVICE_NAME, coprocess=True,
+                                      loop=event_loop)
+        with patch('sig2srv.sig2srv.create_subprocess_exec') as cse:
+            assert event_loop.run_until_complete(runner.run('status')) == 3
+            assert event_loop.run_until_complete(runner.run('status')) == 3
+        assert not cse.call_args_list
+        assert shell.run.call_args_list == [
+            call('service', self.SERVICE_NAME, 'status'),
+        ] * 2
+        event_loop.run_until_complete(runner.close())
+        shell.close.assert_called_once_with()
+
+    def test_run_other_verbs_not_in_coprocess(self, event_loop, shell):
+        runner = ServiceCommandRunner(name=self.SERVICE_NAME, coprocess=True,
+                                      loop=event_loop)
+        proc = MagicMock(spec_set=['wait'])
+        proc.wait.side_effect = coroutine(lambda: 0)
+        with patch('sig2srv.sig2srv.create_subprocess_exec',
+                   side_effect=coroutine(lambda *a, **kw: proc)) as cse:
+            assert event_loop.run_until_complete(runner.run('start')) == 0
+        cse.assert_called_once_with('service', self.SERVICE_NAME, 'start',
+                                    loop=event_loop)
+        assert not shell.run.call_args_list
+
+    def test_run_status_in_coprocess_uses_init_script(self, event_loop,
+                                                      shell, tmpdir):
+        script = tmpdir.join('omg')
+        script.write('#!/bin/sh\n')
+        script.chmod(0o755)
+        runner = ServiceCommandRunner(name=self.SERVICE_NAME, coprocess=True,
+                                      init_script=str(script),
+                                      loop=event_loop)
+        event_loop.run_until_complete(runner.run('status'))
+        script.chmod(0o644)
+        event_loop.run_until_complete(runner.run('status'))
+        assert shell.run.call_args_list == [
+            call(str(script), 'status'),
+            call('service', self.SERVICE_NAME, 'status'),
+        ]
+
+    def test_fallback_closes_only_the_coprocess(self, event_loop, shell,
+                                                tmpdir):
+        script = tmpdir.join('omg')
+        script.write('#!/bin/sh\n')
+        script.chmod(0o755)
+        runner = ServiceCommandRunner(name=self.SERVICE_NAME, coprocess=True,
+                                      init_script=str(script),
+                                      loop=event_loop)
+        event_loop.run_until_complete(runner.run('status'))
+        script.chmod(0o644)
+        with patch.object(runner, 'close') as close:
+            event_loop.run_until_complete(runner.run('status'))
+        assert not close.called
+        shell.close.assert_called_once_with()
+
+
+@pytest.mark.timeout(5)
+class TestServiceCommandRunnerTimeouts:
+
+    SCRIPT = """#!/bin/sh
+echo $$ > "$0.$1.pid"
+case "$1" in
+status) exec sleep 30 ;;
+stubborn) trap '' TERM; while :; do sleep 0.05; done ;;
+esac
+exit 0
+"""
+
+    @pytest.fixture
+    def loop(self, event_loop):
+        """Event loop to which the child watcher is attached."""
+        old_loop = get_event_loop()
+        set_event_loop(event_loop)
+        try:
+            yield event_loop
+        finally:
+            set_event_loop(old_loop)
+
+    @pytest.fixture
+    def script(self, tmpdir):
+        script = tmpdir.join('omg')
+        script.write(self.SCRIPT)
+        script.chmod(0o755)
+        return str(script)
+
+    def pid(self, script, verb):
+        with open('{}.{}.pid'.format(script, verb)) as f:
+            return int(f.read())
+
+    def run(self, loop, runner, *verbs):
+        @coroutine
+        def run_all():
+            results = []
+            for verb in verbs:
+                results.append((yield from runner.run(verb)))
+            return results
+        return loop.run_until_complete(run_all())
+
+    def test_timeout_kills_command(self, loop, script):
+        runner = ServiceCommandRunner(name='omg', init_script=script,
+                                      timeouts=dict(status=0.2),
+                                      kill_grace=0.2, loop=loop)
+        assert self.run(loop, runner, 'status', 'start') == [TIMED_OUT, 0]
+        loop.run_until_complete(runner.close())
+        assert not process_alive(self.pid(script, 'status'))
+
+    def test_timeout_escalates_to_sigkill(self, loop, script):
+        runner = ServiceCommandRunner(name='omg', init_script=script,
+                                      timeouts=dict(stubborn=0.2),
+                                      kill_grace=0.2, loop=loop)
+        assert self.run(loop, runner, 'stubborn') == [TIMED_OUT]
+        loop.run_until_complete(runner.close())
+        assert not process_alive(self.pid(script, 'stubborn'))
+
+    def test_timeout_releases_lock_before_kill(self, loop, script):
+        runner = ServiceCommandRunner(name='omg', init_script=script,
+                                      timeouts=dict(stubborn=0.2),
+                                      kill_grace=2, loop=loop)
+        start = loop.time()
+        assert self.run(loop, runner, 'stubborn', 'stop') == [TIMED_OUT, 0]
+        assert loop.time() - start < 1
+        loop.run_until_complete(runner.close())
+
+    def test_timeout_is_per_verb(self, loop, script):
+        runner = ServiceCommandRunner(name='omg', init_script=script,
+                                      timeouts=dict(start=0.2), loop=loop)
+        with patch('sig2srv.sig2srv.create_subprocess_exec',
+                   wraps=create_subprocess_exec) as cse:
+            assert self.run(loop, runner, 'start', 'stop') == [0, 0]
+        assert cse.call_args_list == [
+            call(script, 'start', loop=loop, env=ANY,
+                 start_new_session=True),
+            call(script, 'stop', loop=loop, env=ANY),
+        ]
+
+    def test_timeout_kills_coprocess(self, loop, script):
+        runner = ServiceCommandRunner(name='omg', init_script=script,
+                                      coprocess=True,
+                                      timeouts=dict(status=0.2),
+                                      kill_grace=0.2, loop=loop)
+        assert self.run(loop, runner, 'status') == [TIMED_OUT]
+        loop.run_until_complete(runner.close())
+        assert not process_alive(self.pid(script, 'status'))
+
+
+@pytest.mark.timeout(5)
+class TestServiceCommandRunnerOutput:
+
+    SCRIPT = """#!/bin/sh
+echo "$1 out"
+echo "$1 err" >&2
+case "$1" in
+fail) exit 3 ;;
+noisy) yes noise | head -n 10000 ;;
+esac
+exit 0
+"""
+
+    @pytest.fixture
+    def loop(self, event_loop):
+        """Event loop to which the child watcher is attached."""
+        old_loop = get_event_loop()
+        set_event_loop(event_loop)
+        try:
+            yield event_loop
+        finally:
+            set_event_loop(old_loop)
+
+    @pytest.fixture
+    def script(self, tmpdir):
+        script = tmpdir.join('omg')
+        script.write(self.SCRIPT)
+        script.chmod(0o755)
+        return str(script)
+
+    def run(self, loop, runner, verb):
+        try:
+            return loop.run_until_complete(runner.run(verb))
+        finally:
+            loop.run_until_complete(runner.close())
+
+    def test_status_output_discarded_by_default(self, loop, script, capfd):
+        runner = ServiceCommandRunner(name='omg', init_script=script,
+                                      loop=loop)
+        assert self.run(loop, runner, 'status') == 0
+        out, err = capfd.readouterr()
+        assert 'status' not in out + err
+
+    def test_other_output_inherited_by_default(self, loop, script, capfd):
+        runner = ServiceCommandRunner(name='omg', init_script=script,
+                                      loop=loop)
+        assert self.run(loop, runner, 'start') == 0
+        out, err = capfd.readouterr()
+        assert out == 'start out\n'
+        assert err == 'start err\n'
+
+    def test_output_inherit_overrides_default(self, loop, script, capfd):
+        runner = ServiceCommandRunner(name='omg', init_script=script,
+                                      output=dict(status='inherit'),
+                                      loop=loop)
+        assert self.run(loop, runner, 'status') == 0
+        out, err = capfd.readouterr()
+        assert out == 'status out\n'
+
+    def test_output_logged(self, loop, script, caplog):
+        runner = ServiceCommandRunner(name='omg', init_script=script,
+                                      output=dict(start=OutputMode.LOG),
+                                      loop=loop)
+        assert self.run(loop, runner, 'start') == 0
+        messages = [r.getMessage() for r in caplog.records]
+        assert any(m.endswith('start: start out') for m in messages)
+        assert any(m.endswith('start: start err') for m in messages)
+
+    def test_output_tail_logged_on_failure(self, loop, script, caplog):
+        runner = ServiceCommandRunner(name='omg', init_script=script,
+                                      output=dict(fail='log'), loop=loop)
+        assert self.run(loop, runner, 'fail') == 3
+        warnings = [r.getMessage() for r in caplog.records
+                    if r.levelno == WARNING]
+        assert len(warnings) == 1
+        assert warnings[0].endswith(
+            "('fail',) returned 3, last output:\nfail out\nfail err\n")
+
+    def test_output_rate_limited(self, loop, script, caplog):
+        runner = ServiceCommandRunner(name='omg', init_script=script,
+                                      output=dict(noisy='log'),
+                                      output_rate=0, output_burst=5,
+                                      loop=loop)
+        assert self.run(loop, runner, 'noisy') == 0
+        messages = [r.getMessage() for r in caplog.records
+                    if ': noisy: ' in r.getMessage()]
+        assert len(messages) == 6
+        assert messages[-1].endswith('(9997 lines suppressed)')
+
+    def test_coprocess_status_output_discarded(self, loop, script, capfd):
+        runner = ServiceCommandRunner(name='omg', init_script=script,
+                                      coprocess=True, loop=loop)
+        assert self.run(loop, runner, 'status') == 0
+        out, err = capfd.readouterr()
+        assert 'status' not in out + err
+
+
+class TestFindInitScript:
+
+    @pytest.fixture
+    def dirs(self, tmpdir):
+        dirs = [tmpdir.mkdir('d1'), tmpdir.mkdir('d2')]
+        for name, mode in [('exe', 0o755), ('noexe', 0o644)]:
+            script = dirs[1].join(name)
+            script.write('#!/bin/sh\n')
+            script.chmod(mode)
+        dirs[1].mkdir('dir').chmod(0o755)
+        return [str(dir) for dir in dirs]
+
+    def test_finds_executable(self, dirs):
+        assert find_init_script('exe', dirs) == dirs[1] + '/exe'
+
+    @pytest.mark.parametrize('name', [
+        'missing', 'noexe', 'dir', '', '.', '..', '../d2/exe',
+    ])
+    def test_returns_none_if_not_found(self, dirs, name):
+        assert find_init_script(name, dirs) is None
+
+
+def test_service_env():
+    env = service_env(dict(HOME='/root', LANG='C', LC_ALL='C.UTF-8',
+                           PATH='/omg', TERM='dumb', OMG='wtf'))
+    assert env == dict(LANG='C', LC_ALL='C.UTF-8', TERM='dumb',
+                       PATH=SERVICE_PATH)
 
 
 @pytest.mark.timeout(5)
@@ -261,5 +741,399 @@ class TestSig2Srv:
                 call('start'),
         ]
 
+    def test_status_timeout_does_not_abort_run(self, sig2srv, event_loop):
+        tm = TimeMachine(event_loop=sig2srv.runner.loop)
+        @coroutine
+        def run(verb, *args):
+            if verb == 'start':
+                tm.advance_by(5)
+            elif verb == 'status':
+                if sig2srv.runner.run.call_count == 2:
+                    tm.advance_by(5)
+                    return TIMED_OUT
+                kill(getpid(), SIGTERM)
+            return 0
+        sig2srv.runner.run.side_effect = run
+        event_loop.run_until_complete(sig2srv.run())
+        assert sig2srv.runner.run.call_args_list == [
+                call('start'),
+                call('status'),
+                call('status'),
+                call('stop'),
+        ]
+
+    def test_start_timeout_aborts_run(self, sig2srv, event_loop):
+        @coroutine
+        def run(verb, *args):
+            return TIMED_OUT
+        sig2srv.runner.run.side_effect = run
+        with pytest.raises(FatalError, match='timed out'):
+            event_loop.run_until_complete(sig2srv.run())
+
+    def test_stop_timeout_aborts_run(self, sig2srv, event_loop):
+        @coroutine
+        def run(verb, *args):
+            if verb == 'start':
+                kill(getpid(), SIGTERM)
+            return TIMED_OUT if verb == 'stop' else 0
+        sig2srv.runner.run.side_effect = run
+        with pytest.raises(FatalError, match='timed out'):
+            event_loop.run_until_complete(sig2srv.run())
+        assert sig2srv.state is Sig2Srv.State.UNKNOWN
+
+    def restart_with(self, runner, event_loop, strategy, failing=()):
+        """Run a bridge, SIGHUP it once and then SIGTERM it.
+
+        Return the commands run, and the state during each of them."""
+        sig2srv = Sig2Srv(runner=runner, restart_strategy=strategy)
+        states = []
+        @coroutine
+        def run(verb, *args):
+            states.append(sig2srv.state)
+            if verb in ('start', 'restart', 'reload'):
+                if len(states) == 1:
+                    kill(getpid(), SIGHUP)
+                elif verb not in failing:
+                    kill(getpid(), SIGTERM)
+            return 1 if verb in failing else 0
+        runner.run.side_effect = run
+        event_loop.run_until_complete(sig2srv.run())
+        return ([args[0] for args, kwargs in runner.run.call_args_list],
+                states)
+
+    def test_restart_strategy_defaults_to_stop_start(self, sig2srv):
+        assert 'restart_strategy=<RestartStrategy.STOP_START' in repr(sig2srv)
+
+    def test_restart_strategy_restart(self, runner, event_loop):
+        verbs, states = self.restart_with(runner, event_loop, 'restart')
+        assert verbs == ['start', 'restart', 'stop']
+        assert states[1] is Sig2Srv.State.RESTARTING
+
+    def test_restart_strategy_reload(self, runner, event_loop):
+        verbs, states = self.restart_with(runner, event_loop,
+                                          RestartStrategy.RELOAD)
+        assert verbs == ['start', 'reload', 'stop']
+        assert states[1] is Sig2Srv.State.RELOADING
+
+    def test_restart_strategy_reload_failure_keeps_running(self, runner,
+                                                           event_loop):
+        sig2srv = Sig2Srv(runner=runner, restart_strategy='reload')
+        @coroutine
+        def run(verb, *args):
+            if verb == 'start':
+                kill(getpid(), SIGHUP)
+            elif verb == 'reload':
+                event_loop.call_soon(kill, getpid(), SIGTERM)
+                return 1
+            return 0
+        runner.run.side_effect = run
+        event_loop.run_until_complete(sig2srv.run())
+        assert runner.run.call_args_list == [call('start'), call('reload'),
+                                             call('stop')]
+
+    def test_restart_strategy_reload_or_restart(self, runner, event_loop):
+        verbs, states = self.restart_with(runner, event_loop,
+                                          'reload-or-restart')
+        assert verbs == ['start', 'reload', 'stop']
+
+    def test_restart_strategy_reload_or_restart_falls_back(self, runner,
+                                                           event_loop):
+        verbs, states = self.restart_with(runner, event_loop,
+                                          'reload-or-restart',
+                                          failing=['reload'])
+        assert verbs == ['start', 'reload', 'restart', 'stop']
+        assert states[2] is Sig2Srv.State.RESTARTING
+
+    def test_restart_failure_aborts_run(self, runner, event_loop):
+        with pytest.raises(FatalError):
+            self.restart_with(runner, event_loop, 'restart',
+                              failing=['restart'])
+        assert [args[0] for args, kwargs in runner.run.call_args_list] == [
+            'start', 'restart']
+
+    def test_init_rejects_bad_restart_strategy(self, runner):
+        with pytest.raises(ValueError):
+            Sig2Srv(runner=runner, restart_strategy='omg')
+
+    def test_metrics(self, runner, event_loop):
+        metrics = Metrics()
+        sig2srv = Sig2Srv(runner=runner, status_period=1, metrics=metrics)
+        tm = TimeMachine(event_loop=event_loop)
+        @coroutine
+        def run(verb, *args):
+            if verb == 'start':
+                tm.advance_by(1)
+            elif verb == 'status':
+                if sig2srv.runner.run.call_count == 2:
+                    tm.advance_by(1)
+                    return TIMED_OUT
+                kill(getpid(), SIGTERM)
+            return 0
+        runner.run.side_effect = run
+        event_loop.run_until_complete(sig2srv.run())
+        checks = metrics.status_checks
+        assert checks.value(self.SERVICE_NAME, 'timed_out') == 1
+        assert checks.value(self.SERVICE_NAME, 'ok') == 1
+        transitions = metrics.state_transitions
+        assert [transitions.value(self.SERVICE_NAME, state)
+                for state in ('stopped', 'starting', 'running', 'stopping')
+                ] == [2, 1, 1, 1]
+
+    def test_status_lateness_defaults_to_none(self, runner):
+        assert Sig2Srv(runner=runner).status_lateness is None
+
+    def test_status_lateness(self, runner, event_loop):
+        sig2srv = Sig2Srv(runner=runner, status_period=1,
+                          status_lateness=LogHistogram())
+        @coroutine
+        def run(verb, *args):
+            if verb == 'status' and sig2srv.runner.run.call_count == 3:
+                kill(getpid(), SIGTERM)
+            return 0
+        runner.run.side_effect = run
+        assert sig2srv.status_lateness.count == 0
+        event_loop.run_until_complete(sig2srv.run())
+        assert sig2srv.status_lateness.count == 2
+        assert 0 <= sig2srv.status_lateness.max < 0.5
+
     def test_finished_event_is_in_the_same_loop(self, sig2srv, event_loop):
         assert sig2srv._Sig2Srv__finished._loop is event_loop
+
+    def test_sigterm_stops_all_bridges_sharing_signals(self, runner,
+                                                       event_loop):
+        signals = SignalFanOut(loop=event_loop)
+        bridges = [Sig2Srv(runner=runner, signals=signals) for i in range(3)]
+        started = 0
+        @coroutine
+        def run(verb, *args):
+            nonlocal started
+            if verb == 'start':
+                started += 1
+                if started == len(bridges):
+                    kill(getpid(), SIGTERM)
+            return 0
+        runner.run.side_effect = run
+        event_loop.run_until_complete(
+            gather(*(bridge.run() for bridge in bridges), loop=event_loop))
+        assert runner.run.call_args_list == [call('start')] * 3 + \
+            [call('stop')] * 3
+        for bridge in bridges:
+            assert bridge.state is Sig2Srv.State.STOPPED
+
+    BURST = 5000
+
+    def burst(self, signals, signum, number=BURST):
+        """Deliver *number* of *signum* through *signals* back to back."""
+        for i in range(number):
+            signals._SignalFanOut__dispatch(signum)
+
+    def test_sighup_burst_causes_one_restart(self, runner, event_loop):
+        signals = SignalFanOut(loop=event_loop)
+        sig2srv = Sig2Srv(runner=runner, signals=signals)
+        starts = 0
+        @coroutine
+        def run(verb, *args):
+            nonlocal starts
+            if verb == 'start':
+                starts += 1
+                if starts == 1:
+                    self.burst(signals, SIGHUP)
+                elif starts == 3:
+                    self.burst(signals, SIGTERM, 1)
+            elif verb == 'stop' and starts == 1:
+                # Arrive during the restart.
+                self.burst(signals, SIGHUP)
+            return 0
+        runner.run.side_effect = run
+        event_loop.run_until_complete(sig2srv.run())
+        assert runner.run.call_args_list == [
+                call('start'),
+                call('stop'), call('start'),
+                call('stop'), call('start'),
+                call('stop'),
+        ]
+
+    def test_sigterm_overrides_pending_restarts(self, runner, event_loop):
+        signals = SignalFanOut(loop=event_loop)
+        sig2srv = Sig2Srv(runner=runner, signals=signals, restart_debounce=1)
+        @coroutine
+        def run(verb, *args):
+            if verb == 'start':
+                self.burst(signals, SIGHUP)
+                self.burst(signals, SIGTERM, 1)
+                self.burst(signals, SIGHUP)
+            return 0
+        runner.run.side_effect = run
+        event_loop.run_until_complete(sig2srv.run())
+        assert runner.run.call_args_list == [call('start'), call('stop')]
+
+    def test_restart_debounce(self, runner, event_loop):
+        signals = SignalFanOut(loop=event_loop)
+        sig2srv = Sig2Srv(runner=runner, signals=signals, status_period=60,
+                          restart_debounce=1)
+        tm = TimeMachine(event_loop=event_loop)
+        times = []
+        @coroutine
+        def run(verb, *args):
+            times.append((verb, round(event_loop.time() - start, 6)))
+            if len(times) == 3:
+                self.burst(signals, SIGTERM, 1)
+            return 0
+        runner.run.side_effect = run
+        start = event_loop.time()
+        task = event_loop.create_task(sig2srv.run())
+        for i in range(8):
+            # Bursts every half a second, for 4 seconds.
+            self.run_for(event_loop, tm, 0.5)
+            self.burst(signals, SIGHUP, self.BURST // 8)
+        last = round(event_loop.time() - start, 6)
+        self.run_for(event_loop, tm, 2)
+        event_loop.run_until_complete(task)
+        assert [verb for verb, t in times] == ['start', 'stop', 'start',
+                                               'stop']
+        # The restart waits for a second of quiet after the last burst.
+        assert times[1][1] - last == pytest.approx(1, abs=0.3)
+
+    @pytest.fixture
+    def watched(self):
+        """Patch process_exit_watched() to record the (pid, handler) pairs."""
+        watched = []
+        @contextmanager
+        def process_exit_watched(pid, handler, *, loop=None):
+            watched.append((pid, handler))
+            yield
+        with patch('sig2srv.sig2srv.process_exit_watched',
+                   side_effect=process_exit_watched):
+            yield watched
+
+    @pytest.fixture
+    def pidfile(self, tmpdir):
+        pidfile = tmpdir.join('omg.pid')
+        pidfile.write('1234\n')
+        return str(pidfile)
+
+    def test_main_process_exit_aborts_run(self, runner, event_loop, pidfile,
+                                          watched):
+        sig2srv = Sig2Srv(runner=runner, pidfile=pidfile)
+        tm = TimeMachine(event_loop=event_loop)
+        @coroutine
+        def run(verb, *args):
+            if verb == 'start':
+                event_loop.call_soon(tm.advance_by, 60)
+                event_loop.call_soon(lambda: watched[-1][1]())
+            return 0
+        runner.run.side_effect = run
+        with pytest.raises(FatalError):
+            event_loop.run_until_complete(sig2srv.run())
+        assert [pid for pid, handler in watched] == [1234]
+        assert runner.run.call_args_list == [call('start')]
+
+    def test_main_process_is_rewatched_after_restart(self, runner,
+                                                     event_loop, pidfile,
+                                                     watched):
+        sig2srv = Sig2Srv(runner=runner, pidfile=pidfile)
+        started = 0
+        @coroutine
+        def run(verb, *args):
+            nonlocal started
+            if verb == 'start':
+                started += 1
+                kill(getpid(), SIGHUP if started == 1 else SIGTERM)
+            return 0
+        runner.run.side_effect = run
+        event_loop.run_until_complete(sig2srv.run())
+        assert [pid for pid, handler in watched] == [1234, 1234]
+
+    def test_unreadable_pidfile_falls_back_to_status(self, runner,
+                                                     event_loop, tmpdir,
+                                                     watched):
+        sig2srv = Sig2Srv(runner=runner, pidfile=str(tmpdir.join('none')))
+        tm = TimeMachine(event_loop=event_loop)
+        @coroutine
+        def run(verb, *args):
+            tm.advance_by(5)
+            return 1 if verb == 'status' else 0
+        runner.run.side_effect = run
+        with pytest.raises(FatalError):
+            event_loop.run_until_complete(sig2srv.run())
+        assert not watched
+        assert runner.run.call_args_list == [call('start'), call('status')]
+
+    def run_for(self, event_loop, tm, duration, step=0.25):
+        for i in range(int(duration / step)):
+            tm.advance_by(step)
+            event_loop.run_until_complete(sleep(0, loop=event_loop))
+
+    def test_status_period_backs_off(self, runner, event_loop):
+        sig2srv = Sig2Srv(runner=runner, status_period=1, status_max_period=4)
+        tm = TimeMachine(event_loop=event_loop)
+        times = []
+        @coroutine
+        def run(verb, *args):
+            if verb == 'status':
+                times.append(event_loop.time())
+            return 0
+        runner.run.side_effect = run
+        start = event_loop.time()
+        task = event_loop.create_task(sig2srv.run())
+        self.run_for(event_loop, tm, 12.5)
+        kill(getpid(), SIGTERM)
+        event_loop.run_until_complete(task)
+        assert ([t - start for t in times] ==
+                pytest.approx([1, 2, 4, 8, 12], abs=0.3))
+
+    def test_status_period_drops_after_restart(self, runner, event_loop):
+        sig2srv = Sig2Srv(runner=runner, status_period=1, status_max_period=8)
+        tm = TimeMachine(event_loop=event_loop)
+        times = []
+        @coroutine
+        def run(verb, *args):
+            if verb == 'status':
+                times.append(event_loop.time())
+            return 0
+        runner.run.side_effect = run
+        start = event_loop.time()
+        task = event_loop.create_task(sig2srv.run())
+        self.run_for(event_loop, tm, 10)
+        kill(getpid(), SIGHUP)
+        self.run_for(event_loop, tm, 0.25)
+        restart = event_loop.time()
+        self.run_for(event_loop, tm, 3.5)
+        kill(getpid(), SIGTERM)
+        event_loop.run_until_complete(task)
+        assert ([t - start for t in times[:4]] ==
+                pytest.approx([1, 2, 4, 8], abs=0.3))
+        assert ([t - restart for t in times[4:]] ==
+                pytest.approx([1, 2], abs=0.3))
+
+    def test_stalled_status_checks_are_coalesced(self, runner, event_loop):
+        sig2srv = Sig2Srv(runner=runner)
+        tm = TimeMachine(event_loop=event_loop)
+        times = []
+        @coroutine
+        def run(verb, *args):
+            if verb == 'status':
+                times.append(event_loop.time())
+                if len(times) == 1:
+                    tm.advance_by(22)
+            return 0
+        runner.run.side_effect = run
+        start = event_loop.time()
+        task = event_loop.create_task(sig2srv.run())
+        self.run_for(event_loop, tm, 10)
+        kill(getpid(), SIGTERM)
+        event_loop.run_until_complete(task)
+        assert ([t - start for t in times] ==
+                pytest.approx([5, 27.5, 30], abs=0.3))
+
+    def test_status_spread_offsets_by_service_name(self, runner, event_loop):
+        sig2srv = Sig2Srv(runner=runner, status_spread=True)
+        with patch('sig2srv.sig2srv.periodic_calls',
+                   wraps=periodic_calls) as pc:
+            @coroutine
+            def run(verb, *args):
+                return 1
+            runner.run.side_effect = run
+            with pytest.raises(FatalError):
+                event_loop.run_until_complete(sig2srv.run())
+        assert pc.call_args[1]['phase'] == stable_phase(self.SERVICE_NAME, 5)
@@ -0,0 +1,100 @@
+from asyncio import coroutine, get_event_loop, set_event_loop
+from asyncio.subprocess import DEVNULL, PIPE, STDOUT
+import os
+from signal import SIGTERM
+from unittest.mock import patch
+
+import pytest
+
+from sig2srv.spawn import (SpawnedProcess, posix_spawn_exec,
+                           posix_spawn_supported)
+from tests.eventloopfixture import event_loop
+
+
+class TestSpawnedProcess:
+
+    @pytest.fixture
+    def proc(self, event_loop):
+        return SpawnedProcess(pid=1234, loop=event_loop)
+
+    def test_init_takes_and_avails_pid(self, proc):
+        assert proc.pid == 1234
+
+    def test_returncode_is_none_while_running(self, proc):
+        assert proc.returncode is None
+
+    def test_wait_returns_returncode(self, proc, event_loop):
+        event_loop.call_soon(proc._handle_exit, 1234, 3)
+        assert event_loop.run_until_complete(proc.wait()) == 3
+        assert proc.returncode == 3
+
+    def test_send_signal(self, proc):
+        with patch('sig2srv.spawn.os.kill') as kill:
+            proc.terminate()
+            kill.assert_called_once_with(1234, SIGTERM)
+
+    def test_send_signal_does_nothing_after_exit(self, proc):
+        proc._handle_exit(1234, 0)
+        with patch('sig2srv.spawn.os.kill') as kill:
+            proc.kill()
+            assert not kill.call_args_list
+
+
+@pytest.mark.skipif(not posix_spawn_supported(),
+                    reason="posix_spawn() not supported")
+@pytest.mark.timeout(5)
+class TestPosixSpawnExec:
+
+    @pytest.fixture
+    def loop(self, event_loop):
+        """Event loop to which the child watcher is attached."""
+        old_loop = get_event_loop()
+        set_event_loop(event_loop)
+        try:
+            yield event_loop
+        finally:
+            set_event_loop(old_loop)
+
+    def run(self, loop, *args, **kwargs):
+        @coroutine
+        def spawn_and_wait():
+            proc = yield from posix_spawn_exec(*args, loop=loop, **kwargs)
+            assert proc.pid > 0
+            return (yield from proc.wait())
+        return loop.run_until_complete(spawn_and_wait())
+
+    def test_returns_exit_status(self, loop):
+        assert self.run(loop, 'sh', '-c', 'exit 3') == 3
+
+    def test_passes_env(self, loop):
+        assert self.run(loop, 'sh', '-c', 'test "$OMG" = wtf',
+                        env=dict(os.environ, OMG='wtf')) == 0
+
+    def test_reports_signal_as_negative(self, loop):
+        assert self.run(loop, 'sh', '-c', 'kill -TERM $$') == -SIGTERM
+
+    def test_starts_new_session(self, loop):
+        script = '[ "$(cut -d" " -f6 /proc/$$/stat)" = $$ ]'
+        assert self.run(loop, 'sh', '-c', script) != 0
+        assert self.run(loop, 'sh', '-c', script,
+                        start_new_session=True) == 0
+
+    def test_pipes_stdout_and_stderr(self, loop):
+        @coroutine
+        def spawn_and_read():
+            proc = yield from posix_spawn_exec(
+                'sh', '-c', 'echo out; echo err >&2', loop=loop,
+                stdout=PIPE, stderr=STDOUT)
+            output = yield from proc.stdout.read()
+            return output, (yield from proc.wait())
+        assert loop.run_until_complete(spawn_and_read()) == (b'out\nerr\n',
+                                                             0)
+
+    def test_discards_output(self, loop, capfd):
+        assert self.run(loop, 'sh', '-c', 'echo out; echo err >&2',
+                        stdout=DEVNULL, stderr=DEVNULL) == 0
+        assert capfd.readouterr() == ('', '')
+
+    def test_raises_oserror_if_not_found(self, loop):
+        with pytest.raises(OSError):
+            self.run(loop, '/nonexistent')